@@ -1,15 +1,58 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from http import HTTPStatus
 
-import requests
-from rest_framework.exceptions import ValidationError
+from django.conf import settings
+from django.http import JsonResponse
+from django.views import View
+from rest_framework.exceptions import APIException, ValidationError
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from apps.rakuten.utils import URLRakutenAdapter
+from apps.rakuten.cache import make_cache_key, rakuten_response_cache
+from apps.rakuten.client import get_async_rakuten_client, get_rakuten_client
+from apps.rakuten.ratelimit import get_rakuten_rate_limiter
+from apps.rakuten.utils import ProductRakutenAdapter, URLRakutenAdapter
+from utils.singleflight import SingleFlight
+
+
+class RakutenAPIError(APIException):
+    status_code = HTTPStatus.BAD_GATEWAY
+    default_detail = 'Rakuten API lỗi.'
+    default_code = 'rakuten_api_error'
+
+
+class RakutenProductNotFound(APIException):
+    status_code = HTTPStatus.NOT_FOUND
+    default_detail = 'Không tìm thấy sản phẩm.'
+    default_code = 'rakuten_product_not_found'
+
+
+class RakutenAPIThrottled(APIException):
+    status_code = HTTPStatus.SERVICE_UNAVAILABLE
+    default_detail = 'Rakuten API đang giới hạn request, vui lòng thử lại sau.'
+    default_code = 'rakuten_api_throttled'
 
 
 def send_request_to_rakuten_api(enpoint):
-    with requests.Session() as s:
-        return s.get(enpoint)
+    # Dùng client chung để giữ connection (keep-alive) giữa các request
+    limiter = get_rakuten_rate_limiter()
+    if limiter is None:
+        return get_rakuten_client().get(enpoint)
+    # Chờ tới lượt theo giới hạn của applicationId rồi mới gửi
+    with limiter.acquire() as permit:
+        response = get_rakuten_client().get(permit.apply(enpoint))
+        permit.status_code = response.status_code
+    return response
+
+
+async def async_send_request_to_rakuten_api(enpoint):
+    # Không block worker trong lúc chờ Rakuten trả về
+    limiter = get_rakuten_rate_limiter()
+    if limiter is None:
+        return await get_async_rakuten_client().get(enpoint)
+    with await limiter.acquire_async() as permit:
+        response = await get_async_rakuten_client().get(permit.apply(enpoint))
+        permit.status_code = response.status_code
+    return response
 
 
 def is_response_success(response):
@@ -17,55 +60,244 @@ def is_response_success(response):
         return True
 
 
-class RakutenSearchAPIView(APIView):
-    # START GET METHOD
-    def get(self, request, *args, **kwargs):
-        endpoint = self.get_endpoint(request, *args, **kwargs)
-        rakuten_response = send_request_to_rakuten_api(endpoint)
-        if is_response_success(rakuten_response):
-            handled_response = self.handle_response(rakuten_response)
-            return Response(data=handled_response, status=HTTPStatus.OK)
-        # Return error response
+rakuten_single_flight = SingleFlight()
 
-    def get_endpoint(self, request, *args, **kwargs):
+
+def get_rakuten_content(endpoint, cache_key=None):
+    """
+    Lấy nội dung response của Rakuten, ưu tiên lấy từ cache.
+    - Các request giống nhau tới cùng lúc chỉ gọi sang Rakuten một lần (single-flight)
+    - Chỉ cache response thành công, trả về None nếu Rakuten lỗi.
+    - cache_key: lấy từ ``RakutenEndpointSpec.cache_key`` nếu có, không thì tính từ endpoint
+    """
+    cache_key = cache_key or make_cache_key(endpoint)
+    content = rakuten_response_cache.get(cache_key)
+    if content is not None:
+        return content
+    return rakuten_single_flight.do(cache_key, _fetch_rakuten_content, endpoint, cache_key)
+
+
+def _fetch_rakuten_content(endpoint, cache_key):
+    rakuten_response = send_request_to_rakuten_api(endpoint)
+    return _handle_rakuten_response(rakuten_response, cache_key)
+
+
+def _handle_rakuten_response(rakuten_response, cache_key):
+    if is_response_success(rakuten_response):
+        rakuten_response_cache.set(cache_key, rakuten_response.content)
+        return rakuten_response.content
+    if rakuten_response.status_code == HTTPStatus.TOO_MANY_REQUESTS:
+        raise RakutenAPIThrottled()
+
+
+async def async_get_rakuten_content(endpoint, cache_key=None):
+    cache_key = cache_key or make_cache_key(endpoint)
+    content = rakuten_response_cache.get(cache_key)
+    if content is not None:
+        return content
+    return await rakuten_single_flight.do_async(cache_key, _async_fetch_rakuten_content, endpoint, cache_key)
+
+
+async def _async_fetch_rakuten_content(endpoint, cache_key):
+    rakuten_response = await async_send_request_to_rakuten_api(endpoint)
+    return _handle_rakuten_response(rakuten_response, cache_key)
+
+
+class RakutenSearchMixin:
+    def get_spec(self, request, *args, **kwargs):
         url = URLRakutenAdapter(request)
         if self._is_endpoint_valid(url):
             query_param_name_list = [
                 'applicationId', 'keyword', 'hits', 'page', 'minPrice', 'maxPrice']
-            return url.host + url.product_api + "?" + url.merge_query_params_to_string(query_param_name_list)
+            return url.get_spec(query_param_name_list)
         raise ValidationError('Query params không đúng. Yêu cầu có q=...')
 
-    def handle_response(self, rakuten_response):
-        pass
+    def get_endpoint(self, request, *args, **kwargs):
+        return self.get_spec(request, *args, **kwargs).url
+
+    def handle_response(self, rakuten_content):
+        return ProductRakutenAdapter(rakuten_content).to_representation()
 
     def _is_endpoint_valid(self, url):
         if url.applicationId and url.keyword:
             return True
-    # END GET METHOD
-
-
-rakuten_search_api_view = RakutenSearchAPIView.as_view()
-
 
-class RakutenDetailAPIView(APIView):
-    # START GET METHOD
-    def get(self, request, *args, **kwargs):
-        endpoint = self.get_endpoint(request, *args, **kwargs)
-        rakuten_response = send_request_to_rakuten_api(endpoint)
-        if is_response_success(rakuten_response):
-            handled_response = self.handle_response(rakuten_response)
-            return Response(data=handled_response, status=HTTPStatus.OK)
-        # Return error response
 
-    def get_endpoint(self, request, *args, **kwargs):
+class RakutenDetailMixin:
+    def get_spec(self, request, *args, **kwargs):
         url = URLRakutenAdapter(request)
         if self._is_endpoint_valid(url):
             query_param_name_list = [
                 "applicationId", "productId"
             ]
-            return url.host + url.product_api + "?" + url.merge_query_params_to_string(query_param_name_list)
+            return url.get_spec(query_param_name_list)
+        raise ValidationError('Đường dẫn không đúng. Yêu cầu có productId')
+
+    def get_endpoint(self, request, *args, **kwargs):
+        return self.get_spec(request, *args, **kwargs).url
+
+    def handle_response(self, rakuten_content):
+        for product in ProductRakutenAdapter(rakuten_content):
+            return product.to_dict()
+
+    def get_product(self, rakuten_content):
+        # Rakuten trả về 200 với Products rỗng khi không có sản phẩm
+        product = self.handle_response(rakuten_content)
+        if product is None:
+            raise RakutenProductNotFound()
+        return product
 
-    def _is_endpoint_valid(url):
+    def _is_endpoint_valid(self, url):
         if url.productId:
             return True
+
+
+class RakutenSearchAPIView(RakutenSearchMixin, APIView):
+    # START GET METHOD
+    def get(self, request, *args, **kwargs):
+        spec = self.get_spec(request, *args, **kwargs)
+        rakuten_content = get_rakuten_content(spec.url, spec.cache_key)
+        if rakuten_content is not None:
+            handled_response = self.handle_response(rakuten_content)
+            return Response(data=handled_response, status=HTTPStatus.OK)
+        raise RakutenAPIError()
+    # END GET METHOD
+
+
+rakuten_search_api_view = RakutenSearchAPIView.as_view()
+
+
+class RakutenDetailAPIView(RakutenDetailMixin, APIView):
+    # START GET METHOD
+    def get(self, request, *args, **kwargs):
+        spec = self.get_spec(request, *args, **kwargs)
+        rakuten_content = get_rakuten_content(spec.url, spec.cache_key)
+        if rakuten_content is not None:
+            return Response(data=self.get_product(rakuten_content), status=HTTPStatus.OK)
+        raise RakutenAPIError()
+    # END GET METHOD
+
+
+rakuten_detail_api_view = RakutenDetailAPIView.as_view()
+
+
+class RakutenBatchDetailAPIView(RakutenDetailMixin, APIView):
+    """
+    Lấy chi tiết nhiều sản phẩm trong một request: ?ids=id1,id2,...
+    - Sản phẩm có trong cache thì trả về luôn
+    - Các sản phẩm còn lại gọi sang Rakuten song song, tối đa RAKUTEN_BATCH_CONCURRENCY request cùng lúc
+    - Sản phẩm nào lỗi thì trả lỗi riêng cho sản phẩm đó trong ``errors``, các sản phẩm khác vẫn trả về bình thường
+    """
+
+    # START GET METHOD
+    def get(self, request, *args, **kwargs):
+        product_ids = self.get_product_ids(request)
+        specs = {
+            product_id: URLRakutenAdapter(request, product_id=product_id).get_spec(["applicationId", "productId"])
+            for product_id in product_ids
+        }
+        results = {}
+        errors = {}
+        missing = {}
+        for product_id, spec in specs.items():
+            rakuten_content = rakuten_response_cache.get(spec.cache_key)
+            if rakuten_content is not None:
+                self._add_result(product_id, rakuten_content, results, errors)
+            else:
+                missing[product_id] = spec
+
+        if missing:
+            max_workers = min(getattr(settings, 'RAKUTEN_BATCH_CONCURRENCY', 8), len(missing))
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {
+                    executor.submit(
+                        rakuten_single_flight.do, spec.cache_key, _fetch_rakuten_content, spec.url, spec.cache_key
+                    ): product_id
+                    for product_id, spec in missing.items()
+                }
+                for future in as_completed(futures):
+                    product_id = futures[future]
+                    try:
+                        rakuten_content = future.result()
+                    except APIException as e:
+                        errors[product_id] = str(e.detail)
+                        continue
+                    except Exception as e:
+                        errors[product_id] = f'Không kết nối được Rakuten: {e.__class__.__name__}'
+                        continue
+                    if rakuten_content is None:
+                        errors[product_id] = 'Rakuten API lỗi'
+                    else:
+                        self._add_result(product_id, rakuten_content, results, errors)
+
+        data = {
+            'items': [results[product_id] for product_id in product_ids if product_id in results],
+            'errors': errors,
+        }
+        return Response(data=data, status=HTTPStatus.OK)
+
+    def get_product_ids(self, request):
+        product_ids = []
+        for product_id in request.query_params.get('ids', '').split(','):
+            product_id = product_id.strip()
+            if product_id and product_id not in product_ids:
+                product_ids.append(product_id)
+        if not product_ids:
+            raise ValidationError('Query params không đúng. Yêu cầu có ids=...')
+        max_ids = getattr(settings, 'RAKUTEN_BATCH_MAX_IDS', 50)
+        if len(product_ids) > max_ids:
+            raise ValidationError(f'Chỉ lấy được tối đa {max_ids} sản phẩm một lần')
+        return product_ids
+
+    def _add_result(self, product_id, rakuten_content, results, errors):
+        try:
+            product = self.handle_response(rakuten_content)
+        except ValueError:
+            errors[product_id] = 'Response Rakuten không đúng định dạng'
+            return
+        if product is None:
+            errors[product_id] = 'Không tìm thấy sản phẩm'
+        else:
+            results[product_id] = product
+    # END GET METHOD
+
+
+rakuten_batch_detail_api_view = RakutenBatchDetailAPIView.as_view()
+
+
+class AsyncRakutenView(View):
+    """
+    View bất đồng bộ cho ASGI.
+    rest_framework chưa hỗ trợ async nên dùng View của django và trả về JsonResponse.
+    """
+
+    # START GET METHOD
+    async def get(self, request, *args, **kwargs):
+        try:
+            spec = self.get_spec(request, *args, **kwargs)
+            rakuten_content = await async_get_rakuten_content(spec.url, spec.cache_key)
+            if rakuten_content is None:
+                raise RakutenAPIError()
+            handled_response = self.get_data(rakuten_content)
+        except APIException as e:
+            return JsonResponse({'detail': e.detail}, status=e.status_code)
+        return JsonResponse(handled_response, status=HTTPStatus.OK, safe=False)
     # END GET METHOD
+
+    def get_data(self, rakuten_content):
+        return self.handle_response(rakuten_content)
+
+
+class AsyncRakutenSearchView(RakutenSearchMixin, AsyncRakutenView):
+    pass
+
+
+async_rakuten_search_view = AsyncRakutenSearchView.as_view()
+
+
+class AsyncRakutenDetailView(RakutenDetailMixin, AsyncRakutenView):
+    def get_data(self, rakuten_content):
+        return self.get_product(rakuten_content)
+
+
+async_rakuten_detail_view = AsyncRakutenDetailView.as_view()
@@ -0,0 +1,102 @@
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from utils.lru import MISSING, LRUCache
+
+
+def make_cache_key(endpoint):
+    """
+    Tạo key cache từ endpoint do ``URLRakutenAdapter.merge_query_params_to_string`` tạo ra.
+    - Thứ tự các query param không ảnh hưởng tới key
+    - Bỏ ``applicationId`` ra khỏi key (cùng một truy vấn dù dùng applicationId nào cũng như nhau)
+    - Hash lại để key luôn hợp lệ với memcached (không có khoảng trắng, không quá 250 ký tự)
+
+    VD: .../Product/Search/20170426?applicationId=1&keyword=a&page=1
+        và .../Product/Search/20170426?page=1&keyword=a&applicationId=2 cho cùng một key
+    """
+    api, _, query_string = endpoint.partition('?')
+    params = sorted(
+        param for param in query_string.split('&')
+        if param and not param.startswith('applicationId=')
+    )
+    normalized = api.rstrip('/').rsplit('/services/api/', 1)[-1] + '?' + '&'.join(params)
+    return 'rakuten:' + hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+
+class RakutenResponseCache:
+    """
+    Cache nội dung response của Rakuten gồm 2 tầng:
+    - Tầng 1: LRU trong process (TTL, giới hạn số phần tử và số byte)
+    - Tầng 2: cache framework của django (dùng chung giữa các process)
+
+    Tầng 2 lưu kèm thời điểm hết hạn để khi đưa lên tầng 1 thì tầng 1 chỉ giữ trong thời gian còn lại.
+    """
+
+    def __init__(self, timeout=None, max_entries=None, max_bytes=None, cache_alias=None):
+        self.timeout = timeout or getattr(settings, 'RAKUTEN_CACHE_TIMEOUT', 300)
+        self.local = LRUCache(
+            max_entries=max_entries or getattr(settings, 'RAKUTEN_CACHE_MAX_ENTRIES', 1024),
+            max_bytes=max_bytes or getattr(settings, 'RAKUTEN_CACHE_MAX_BYTES', 32 * 1024 * 1024),
+            default_ttl=self.timeout,
+        )
+        self.cache_alias = cache_alias or getattr(settings, 'RAKUTEN_CACHE_ALIAS', 'default')
+        self._lock = threading.Lock()
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+    @property
+    def shared(self):
+        return caches[self.cache_alias]
+
+    def get(self, key):
+        content = self.local.get(key)
+        if content is not MISSING:
+            self._record('local_hits', content)
+            return content
+        try:
+            entry = self.shared.get(key)
+        except Exception:
+            entry = None
+        if entry is not None:
+            expires_at, content = entry
+            ttl = expires_at - time.time()
+            if ttl > 0:
+                self.local.set(key, content, size=len(content), ttl=ttl)
+                self._record('shared_hits', content)
+                return content
+        self._record('misses')
+        return None
+
+    def set(self, key, content):
+        self.local.set(key, content, size=len(content))
+        try:
+            self.shared.set(key, (time.time() + self.timeout, content), self.timeout)
+        except Exception:
+            pass
+
+    def stats(self):
+        with self._lock:
+            total = self.local_hits + self.shared_hits + self.misses
+            return {
+                'local_hits': self.local_hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'hit_ratio': (self.local_hits + self.shared_hits) / total if total else 0.0,
+                'bytes_saved': self.bytes_saved,
+                'local': self.local.stats(),
+            }
+
+    def _record(self, counter, content=None):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+            if content is not None:
+                self.bytes_saved += len(content)
+
+
+rakuten_response_cache = RakutenResponseCache()
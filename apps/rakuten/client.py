@@ -0,0 +1,193 @@
+import asyncio
+import itertools
+import os
+import threading
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+
+class PoolStats:
+    """
+    Đếm số lần lấy connection từ pool:
+    - hits: dùng lại connection còn mở (keep-alive, không cần bắt tay TCP/TLS)
+    - misses: phải mở connection mới
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, reused):
+        with self._lock:
+            if reused:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def as_dict(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+
+class _CountingPoolMixin:
+    stats = None
+
+    def _get_conn(self, timeout=None):
+        conn = super()._get_conn(timeout=timeout)
+        # Connection đã bị đóng (hoặc mới tạo) sẽ không có socket
+        self.stats.record(reused=getattr(conn, 'sock', None) is not None)
+        return conn
+
+
+class _CountingHTTPConnectionPool(_CountingPoolMixin, HTTPConnectionPool):
+    pass
+
+
+class _CountingHTTPSConnectionPool(_CountingPoolMixin, HTTPSConnectionPool):
+    pass
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter giữ connection theo từng host.
+    - pool_connections: số host được giữ pool cùng lúc
+    - pool_maxsize: số connection tối đa cho mỗi host
+    - pool_block=True: hết connection thì chờ chứ không mở thêm
+    """
+
+    def __init__(self, stats, **kwargs):
+        self.stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        super().init_poolmanager(connections, maxsize, block=block, **pool_kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': type('HTTPPool', (_CountingHTTPConnectionPool,), {'stats': self.stats}),
+            'https': type('HTTPSPool', (_CountingHTTPSConnectionPool,), {'stats': self.stats}),
+        }
+
+
+class RakutenHTTPClient:
+    """
+    HTTP client dùng chung trong process để gọi Rakuten API.
+    Thay vì mỗi request mở một ``requests.Session`` mới (bắt tay TCP + TLS lại từ đầu)
+    thì giữ lại một session với connection pool có giới hạn.
+    """
+
+    def __init__(self, connect_timeout=None, read_timeout=None,
+                 pool_connections=None, pool_maxsize=None, max_retries=None):
+        self.connect_timeout = connect_timeout or getattr(settings, 'RAKUTEN_CONNECT_TIMEOUT', 3.05)
+        self.read_timeout = read_timeout or getattr(settings, 'RAKUTEN_READ_TIMEOUT', 10)
+        self.stats = PoolStats()
+        adapter = PooledHTTPAdapter(
+            self.stats,
+            pool_connections=pool_connections or getattr(settings, 'RAKUTEN_POOL_CONNECTIONS', 4),
+            pool_maxsize=pool_maxsize or getattr(settings, 'RAKUTEN_POOL_MAXSIZE', 20),
+            max_retries=max_retries if max_retries is not None else getattr(settings, 'RAKUTEN_MAX_RETRIES', 0),
+            pool_block=True,
+        )
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    @property
+    def timeout(self):
+        return (self.connect_timeout, self.read_timeout)
+
+    def get(self, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.get(url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_rakuten_client():
+    """
+    Trả về client dùng chung.
+    Client được tạo lại nếu process bị fork (connection của process cha không được dùng chung).
+    """
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                _client = RakutenHTTPClient()
+                _client_pid = pid
+    return _client
+
+
+def get_pool_stats():
+    return get_rakuten_client().stats.as_dict()
+
+
+class AsyncRakutenClientPool:
+    """
+    Nhóm các ``httpx.AsyncClient`` nhỏ, request được chia lần lượt (round-robin) cho từng client.
+    Pool của httpx duyệt toàn bộ request đang chờ và connection mỗi khi có request xong,
+    nên một client với hàng trăm connection tốn CPU hơn nhiều so với nhiều client nhỏ có cùng tổng số connection.
+    """
+
+    def __init__(self, max_connections, connections_per_client, timeout):
+        connections_per_client = max(1, min(connections_per_client, max_connections))
+        limits = httpx.Limits(
+            max_connections=connections_per_client,
+            max_keepalive_connections=connections_per_client,
+        )
+        # Dùng chung một SSLContext, mỗi client tự nạp CA riêng thì tạo pool rất chậm
+        ssl_context = httpx.create_ssl_context()
+        self.clients = [
+            httpx.AsyncClient(limits=limits, timeout=timeout, verify=ssl_context)
+            for _ in range(max(1, -(-max_connections // connections_per_client)))
+        ]
+        self._next_client = itertools.cycle(self.clients)
+
+    @property
+    def is_closed(self):
+        return any(client.is_closed for client in self.clients)
+
+    async def get(self, url, **kwargs):
+        return await next(self._next_client).get(url, **kwargs)
+
+    async def aclose(self):
+        for client in self.clients:
+            await client.aclose()
+
+
+_async_clients = {}
+
+
+def get_async_rakuten_client():
+    """
+    Client bất đồng bộ (httpx) dùng cho các view chạy trên ASGI.
+    - Mỗi event loop có một client riêng vì connection của httpx gắn với loop tạo ra nó
+    - Một worker ASGI giữ được tới RAKUTEN_ASYNC_MAX_CONNECTIONS request tới Rakuten cùng lúc mà không bị block,
+      chia thành các client nhỏ RAKUTEN_ASYNC_CONNECTIONS_PER_CLIENT connection (xem ``AsyncRakutenClientPool``)
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        timeout = httpx.Timeout(
+            getattr(settings, 'RAKUTEN_READ_TIMEOUT', 10),
+            connect=getattr(settings, 'RAKUTEN_CONNECT_TIMEOUT', 3.05),
+        )
+        client = AsyncRakutenClientPool(
+            max_connections=getattr(settings, 'RAKUTEN_ASYNC_MAX_CONNECTIONS', 200),
+            connections_per_client=getattr(settings, 'RAKUTEN_ASYNC_CONNECTIONS_PER_CLIENT', 4),
+            timeout=timeout,
+        )
+        # Bỏ client của các loop đã đóng
+        for old_loop in [old_loop for old_loop in _async_clients if old_loop.is_closed()]:
+            del _async_clients[old_loop]
+        _async_clients[loop] = client
+    return client
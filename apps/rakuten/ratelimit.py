@@ -0,0 +1,345 @@
+import asyncio
+import collections
+import hashlib
+import os
+import re
+import struct
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:
+    # Windows không có fcntl, khi đó bucket chỉ dùng chung được trong 1 process
+    fcntl = None
+
+APPLICATION_ID_PATTERN = re.compile(r'applicationId=([^&]*)')
+
+
+class TokenBucket:
+    """
+    Token bucket cho một applicationId, dùng chung giữa các worker process trên cùng máy.
+    - Trạng thái (số token, thời điểm cập nhật) lưu trong một file nhỏ, mỗi lần lấy token thì khoá file bằng flock
+    - rate: số request mỗi giây, burst: số token tối đa được tích luỹ
+    """
+    _STATE = struct.Struct('dd')
+
+    def __init__(self, application_id, rate, burst, directory):
+        self.application_id = application_id
+        self.rate = rate
+        self.burst = burst
+        name = hashlib.sha1(application_id.encode('utf-8')).hexdigest()[:16]
+        self.path = os.path.join(directory, f'{name}.bucket')
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        """Lấy 1 token. Trả về 0 nếu lấy được, ngược lại trả về số giây cần chờ."""
+        with self._lock:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                now = time.time()
+                data = os.pread(fd, self._STATE.size, 0)
+                if len(data) == self._STATE.size:
+                    tokens, updated_at = self._STATE.unpack(data)
+                    tokens = min(self.burst, tokens + max(0.0, now - updated_at) * self.rate)
+                else:
+                    tokens = self.burst
+                if tokens >= 1:
+                    tokens -= 1
+                    wait = 0.0
+                else:
+                    wait = (1 - tokens) / self.rate
+                os.pwrite(fd, self._STATE.pack(tokens, now), 0)
+                return wait
+            finally:
+                # Đóng file cũng nhả khoá flock
+                os.close(fd)
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Giới hạn số request đang gọi sang Rakuten cùng lúc theo kiểu AIMD:
+    - Thành công: tăng dần giới hạn (+1 sau mỗi ``limit`` request thành công)
+    - Bị 429 hoặc lỗi 5xx / mất kết nối: giảm giới hạn theo cấp số nhân (``decrease_factor``)
+    """
+
+    def __init__(self, initial_limit, min_limit, max_limit, decrease_factor=0.5):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    def try_acquire(self):
+        with self._condition:
+            if self._has_capacity():
+                self.in_flight += 1
+                return True
+            return False
+
+    def acquire(self, timeout=None):
+        with self._condition:
+            if not self._condition.wait_for(self._has_capacity, timeout=timeout):
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, success):
+        with self._condition:
+            self.in_flight -= 1
+            self._adjust(success)
+            self._condition.notify_all()
+
+    def _has_capacity(self):
+        return self.in_flight < max(self.min_limit, int(self.limit))
+
+    def _adjust(self, success):
+        if success:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        else:
+            self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+
+
+class AsyncAdaptiveConcurrencyLimiter(AdaptiveConcurrencyLimiter):
+    """
+    ``AdaptiveConcurrencyLimiter`` cho các coroutine trong cùng một event loop.
+    Chờ bằng future của asyncio (không polling, không block loop), chỉ được gọi từ thread của loop.
+    """
+
+    def __init__(self, initial_limit, min_limit, max_limit, decrease_factor=0.5):
+        super().__init__(initial_limit, min_limit, max_limit, decrease_factor)
+        self._waiters = collections.deque()
+
+    def try_acquire(self):
+        if self._has_capacity():
+            self.in_flight += 1
+            return True
+        return False
+
+    async def acquire(self):
+        while not self._has_capacity():
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                elif waiter.done() and not waiter.cancelled():
+                    # Đã được đánh thức nhưng bị huỷ, nhường lượt cho coroutine khác
+                    self._wake_up()
+                raise
+        self.in_flight += 1
+        return True
+
+    def release(self, success):
+        self.in_flight -= 1
+        self._adjust(success)
+        self._wake_up()
+
+    def _wake_up(self):
+        free = max(self.min_limit, int(self.limit)) - self.in_flight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+
+class RateLimitPermit:
+    """Quyền gửi một request, phải gọi ``release`` (hoặc dùng ``with``) sau khi có response."""
+
+    def __init__(self, limiter, application_id, concurrency=None):
+        self.limiter = limiter
+        self.application_id = application_id
+        self.concurrency = concurrency
+        self.status_code = None
+
+    def apply(self, endpoint):
+        # Thay applicationId trong endpoint bằng applicationId được cấp token
+        return APPLICATION_ID_PATTERN.sub(f'applicationId={self.application_id}', endpoint, count=1)
+
+    def release(self, status_code=None):
+        self.limiter.release(status_code, concurrency=self.concurrency)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release(self.status_code)
+
+
+class RakutenRateLimiter:
+    """
+    Giới hạn request gửi sang Rakuten theo từng applicationId.
+    - Mỗi applicationId có một ``TokenBucket`` (dùng chung giữa các process)
+    - Nếu cấu hình nhiều applicationId (RAKUTEN_APPLICATION_IDS) thì lần lượt xoay vòng, lấy id nào còn token
+    - Số request đồng thời được điều chỉnh bởi ``AdaptiveConcurrencyLimiter``
+    - ``stats`` trả về số request đang chờ, tổng / lớn nhất thời gian chờ, số lần bị Rakuten chặn (429)
+    """
+
+    def __init__(self, application_ids, rate, burst, directory,
+                 initial_concurrency, max_concurrency, min_concurrency=1):
+        os.makedirs(directory, exist_ok=True)
+        self.buckets = [TokenBucket(application_id, rate, burst, directory) for application_id in application_ids]
+        self.concurrency = AdaptiveConcurrencyLimiter(initial_concurrency, min_concurrency, max_concurrency)
+        self._concurrency_args = (initial_concurrency, min_concurrency, max_concurrency)
+        self._async_concurrency = {}
+        self._lock = threading.Lock()
+        self._next_bucket = 0
+        self.queue_depth = 0
+        self.waits = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+        self.throttled = 0
+        self.server_errors = 0
+
+    def acquire(self):
+        started_at = time.monotonic()
+        self._enter_queue()
+        try:
+            self.concurrency.acquire()
+            try:
+                while True:
+                    application_id, wait = self._try_buckets()
+                    if application_id is not None:
+                        break
+                    time.sleep(wait)
+            except BaseException:
+                self.concurrency.release(True)
+                raise
+        finally:
+            self._leave_queue(time.monotonic() - started_at)
+        return RateLimitPermit(self, application_id)
+
+    async def acquire_async(self):
+        """
+        Như ``acquire`` nhưng không block event loop:
+        - Số request đồng thời giới hạn bằng ``AsyncAdaptiveConcurrencyLimiter`` riêng của từng event loop
+        - Token bucket (đọc / ghi file, flock) chạy trong thread qua ``asyncio.to_thread``
+        """
+        started_at = time.monotonic()
+        concurrency = self._get_async_concurrency()
+        self._enter_queue()
+        try:
+            await concurrency.acquire()
+            try:
+                while True:
+                    application_id, wait = await asyncio.to_thread(self._try_buckets)
+                    if application_id is not None:
+                        break
+                    await asyncio.sleep(wait)
+            except BaseException:
+                concurrency.release(True)
+                raise
+        finally:
+            self._leave_queue(time.monotonic() - started_at)
+        return RateLimitPermit(self, application_id, concurrency)
+
+    def release(self, status_code, concurrency=None):
+        # status_code None nghĩa là không nhận được response (timeout, mất kết nối)
+        success = status_code is not None and status_code != 429 and status_code < 500
+        if not success:
+            with self._lock:
+                if status_code == 429:
+                    self.throttled += 1
+                else:
+                    self.server_errors += 1
+        (concurrency or self.concurrency).release(success)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'queue_depth': self.queue_depth,
+                'waits': self.waits,
+                'total_wait_time': self.total_wait_time,
+                'max_wait_time': self.max_wait_time,
+                'throttled': self.throttled,
+                'server_errors': self.server_errors,
+                'concurrency_limit': self.concurrency.limit,
+                'in_flight': self.concurrency.in_flight,
+            }
+
+    def _get_async_concurrency(self):
+        # Mỗi event loop một limiter vì future của asyncio gắn với loop tạo ra nó
+        loop = asyncio.get_running_loop()
+        concurrency = self._async_concurrency.get(loop)
+        if concurrency is None:
+            with self._lock:
+                for old_loop in [old_loop for old_loop in self._async_concurrency if old_loop.is_closed()]:
+                    del self._async_concurrency[old_loop]
+                concurrency = self._async_concurrency[loop] = AsyncAdaptiveConcurrencyLimiter(
+                    *self._concurrency_args
+                )
+        return concurrency
+
+    def _try_buckets(self):
+        # Xoay vòng các applicationId, trả về id đầu tiên còn token hoặc thời gian chờ ngắn nhất
+        with self._lock:
+            start = self._next_bucket
+            self._next_bucket = (start + 1) % len(self.buckets)
+        min_wait = None
+        for i in range(len(self.buckets)):
+            bucket = self.buckets[(start + i) % len(self.buckets)]
+            wait = bucket.try_acquire()
+            if not wait:
+                return bucket.application_id, 0
+            min_wait = wait if min_wait is None else min(min_wait, wait)
+        return None, min_wait
+
+    def _enter_queue(self):
+        with self._lock:
+            self.queue_depth += 1
+
+    def _leave_queue(self, waited):
+        with self._lock:
+            self.queue_depth -= 1
+            self.waits += 1
+            self.total_wait_time += waited
+            self.max_wait_time = max(self.max_wait_time, waited)
+
+
+def get_application_ids():
+    """
+    Danh sách applicationId dùng để gọi Rakuten.
+    RAKUTEN_APPLICATION_IDS = ['id1', 'id2'] để xoay vòng nhiều id, không có thì dùng RAKUTEN_ID.
+    """
+    application_ids = getattr(settings, 'RAKUTEN_APPLICATION_IDS', None)
+    if application_ids:
+        return list(application_ids)
+    from apps.rakuten.utils import URLRakutenAdapter
+    default = getattr(settings, 'RAKUTEN_ID', URLRakutenAdapter.DEFAULT_APPLICATION_ID)
+    return [default.split('=', 1)[-1]]
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_rakuten_rate_limiter():
+    """Trả về limiter dùng chung, None nếu tắt giới hạn (RAKUTEN_RATE_LIMIT_PER_SECOND = None)."""
+    global _limiter
+    rate = getattr(settings, 'RAKUTEN_RATE_LIMIT_PER_SECOND', None)
+    if not rate:
+        return None
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = RakutenRateLimiter(
+                    get_application_ids(),
+                    rate=rate,
+                    burst=getattr(settings, 'RAKUTEN_RATE_LIMIT_BURST', rate),
+                    directory=getattr(
+                        settings, 'RAKUTEN_RATE_LIMIT_DIR',
+                        os.path.join(tempfile.gettempdir(), 'rakuten_rate_limit')
+                    ),
+                    initial_concurrency=getattr(settings, 'RAKUTEN_INITIAL_CONCURRENCY', 10),
+                    max_concurrency=getattr(settings, 'RAKUTEN_POOL_MAXSIZE', 20),
+                )
+    return _limiter
@@ -1,5 +1,27 @@
+import asyncio
+import json
+import re
+import shutil
+import tempfile
+import time
+
+import requests
 from django.test import TestCase
 from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from unittest.mock import patch
+from rest_framework.test import APIRequestFactory
+from .api.views import (
+    async_rakuten_detail_view,
+    get_rakuten_content,
+    rakuten_batch_detail_api_view,
+    rakuten_detail_api_view,
+    rakuten_search_api_view
+)
+from .client import AsyncRakutenClientPool
+from .cache import RakutenResponseCache, make_cache_key, rakuten_response_cache
+from .ratelimit import RakutenRateLimiter, TokenBucket
 from .utils import ProductRakutenAdapter, URLRakutenAdapter
 # Create your tests here.
 
@@ -8,3 +30,304 @@ Request = namedtuple('Request', ('path', 'query_params'))
 
 class TestURLRakutenAdapter(TestCase):
     def setUp(self):
+        self.request = Request(
+            path='/api/rakuten/product/iphone-13-pro-1234',
+            query_params={'q': 'iphone', 'page': '2', 'filter': 'p:[10..20]'}
+        )
+        self.url = URLRakutenAdapter(self.request)
+
+    def test_keyword(self):
+        self.assertEqual(self.url.keyword, 'keyword=iphone')
+
+    def test_page(self):
+        self.assertEqual(self.url.page, 'page=2')
+
+    def test_min_max_price(self):
+        self.assertEqual(self.url.minPrice, 'minPrice=10')
+        self.assertEqual(self.url.maxPrice, 'maxPrice=20')
+
+    def test_product_id(self):
+        self.assertEqual(self.url.productId, 'productId=1234')
+
+    def test_merge_query_params_to_string(self):
+        self.assertEqual(
+            self.url.merge_query_params_to_string(['keyword', 'page']),
+            'keyword=iphone&page=2&formatVersion=2'
+        )
+
+
+class TestRakutenCacheKey(TestCase):
+    def test_param_order_does_not_matter(self):
+        self.assertEqual(
+            make_cache_key('https://app.rakuten.co.jp/services/api/Product/Search/20170426?keyword=a&page=1'),
+            make_cache_key('https://app.rakuten.co.jp/services/api/Product/Search/20170426?page=1&keyword=a')
+        )
+
+    def test_application_id_is_ignored(self):
+        self.assertEqual(
+            make_cache_key('https://app.rakuten.co.jp/services/api/Product/Search/20170426?applicationId=1&keyword=a'),
+            make_cache_key('https://app.rakuten.co.jp/services/api/Product/Search/20170426?applicationId=2&keyword=a')
+        )
+
+    def test_different_query(self):
+        self.assertNotEqual(
+            make_cache_key('https://app.rakuten.co.jp/services/api/Product/Search/20170426?keyword=a&page=1'),
+            make_cache_key('https://app.rakuten.co.jp/services/api/Product/Search/20170426?keyword=a&page=2')
+        )
+
+
+class TestRakutenResponseCache(TestCase):
+    def setUp(self):
+        self.cache = RakutenResponseCache(timeout=60, max_entries=2, max_bytes=10)
+        self.cache.shared.clear()
+
+    def test_hit_and_bytes_saved(self):
+        self.assertIsNone(self.cache.get('a'))
+        self.cache.set('a', b'12345')
+        self.assertEqual(self.cache.get('a'), b'12345')
+        stats = self.cache.stats()
+        self.assertEqual(stats['local_hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['bytes_saved'], 5)
+
+    def test_local_tier_respects_max_bytes(self):
+        self.cache.set('a', b'123456')
+        self.cache.set('b', b'123456')
+        self.assertEqual(self.cache.local.stats()['entries'], 1)
+        # Tầng 1 đã bỏ 'a' nhưng vẫn lấy được từ tầng 2
+        self.assertEqual(self.cache.get('a'), b'123456')
+        self.assertEqual(self.cache.stats()['shared_hits'], 1)
+
+
+class TestGetRakutenContent(TestCase):
+    def setUp(self):
+        rakuten_response_cache.local.clear()
+        rakuten_response_cache.shared.clear()
+
+    def test_concurrent_identical_requests_share_one_upstream_call(self):
+        calls = []
+
+        def fake_send(endpoint):
+            calls.append(endpoint)
+            time.sleep(0.1)
+            return SimpleNamespace(status_code=200, content=b'{"Products": []}')
+
+        endpoint = 'https://app.rakuten.co.jp/services/api/Product/Search/20170426?keyword=a'
+        with patch('apps.rakuten.api.views.send_request_to_rakuten_api', fake_send):
+            with ThreadPoolExecutor(max_workers=5) as executor:
+                results = list(executor.map(get_rakuten_content, [endpoint] * 5))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [b'{"Products": []}'] * 5)
+
+
+class TestProductRakutenAdapter(TestCase):
+    def setUp(self):
+        self.page = {
+            'count': 1234,
+            'page': 2,
+            'Products': [
+                {'productId': 'a1', 'productName': 'ソニー ヘッドホン', 'salesMinPrice': 12800,
+                 'maxPrice': 15000, 'mediumImageUrl': 'https://img/a1.jpg', 'genreId': '564500',
+                 'reviewAverage': 4.25, 'productCaption': '長い説明' * 50},
+                {'productId': 'b2', 'productName': 'iPhone', 'minPrice': 98000, 'brandName': 'Apple'},
+            ],
+            'pageCount': 100,
+            'GenreInformation': [],
+        }
+        self.content = json.dumps(self.page, ensure_ascii=False).encode('utf-8')
+
+    def test_to_representation(self):
+        data = ProductRakutenAdapter(self.content, chunk_size=7).to_representation()
+        self.assertEqual(data['total'], 1234)
+        self.assertEqual(data['page'], 2)
+        self.assertEqual(data['pageCount'], 100)
+        self.assertEqual([item['itemId'] for item in data['items']], ['a1', 'b2'])
+        self.assertEqual(data['items'][0]['title'], 'ソニー ヘッドホン')
+        self.assertEqual(data['items'][0]['price']['value'], 12800)
+        self.assertEqual(data['items'][1]['price']['value'], 98000)
+        self.assertEqual(data['items'][1]['brand'], 'Apple')
+
+    def test_chunk_size_does_not_change_result(self):
+        expected = [product.to_dict() for product in ProductRakutenAdapter(self.content)]
+        for chunk_size in (1, 3, 64):
+            self.assertEqual(
+                [product.to_dict() for product in ProductRakutenAdapter(self.content, chunk_size=chunk_size)],
+                expected
+            )
+
+    def test_empty_products(self):
+        data = ProductRakutenAdapter(b'{"count": 0, "Products": []}').to_representation()
+        self.assertEqual(data['items'], [])
+        self.assertEqual(data['total'], 0)
+
+    def test_invalid_json(self):
+        with self.assertRaises(ValueError):
+            ProductRakutenAdapter(b'{"Products": [{"productId": "a"').to_representation()
+
+
+class TestRakutenEndpointSpec(TestCase):
+    def test_spec_is_hashable_and_memoized(self):
+        request = Request(path='/', query_params={'q': 'iphone', 'filter': 'p:[10..20]'})
+        params = ['applicationId', 'keyword', 'page', 'minPrice', 'maxPrice']
+        spec = URLRakutenAdapter(request).get_spec(params)
+        same_spec = URLRakutenAdapter(request).get_spec(params)
+        self.assertEqual(spec, same_spec)
+        self.assertEqual(hash(spec), hash(same_spec))
+        self.assertIs(spec.url, same_spec.url)
+        self.assertEqual(
+            spec.url,
+            spec.host + spec.api + '?' + URLRakutenAdapter(request).merge_query_params_to_string(params)
+        )
+        self.assertEqual(spec.cache_key, make_cache_key(spec.url))
+
+
+class TestRakutenBatchDetailAPIView(TestCase):
+    def setUp(self):
+        rakuten_response_cache.local.clear()
+        rakuten_response_cache.shared.clear()
+        self.factory = APIRequestFactory()
+
+    def fake_send(self, endpoint):
+        product_id = re.search(r'productId=(\w+)', endpoint)[1]
+        if product_id == 'down':
+            raise requests.ConnectionError()
+        if product_id == 'error':
+            return SimpleNamespace(status_code=500, content=b'')
+        if product_id == 'empty':
+            return SimpleNamespace(status_code=200, content=b'{"Products": []}')
+        content = json.dumps({'Products': [{'productId': product_id, 'productName': product_id}]})
+        return SimpleNamespace(status_code=200, content=content.encode())
+
+    def test_partial_results_with_errors(self):
+        request = self.factory.get('/api/rakuten/products/', {'ids': 'a1,down,error,empty,b2,a1'})
+        with patch('apps.rakuten.api.views.send_request_to_rakuten_api', self.fake_send):
+            response = rakuten_batch_detail_api_view(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['itemId'] for item in response.data['items']], ['a1', 'b2'])
+        self.assertEqual(set(response.data['errors']), {'down', 'error', 'empty'})
+
+    def test_served_from_cache(self):
+        request = self.factory.get('/api/rakuten/products/', {'ids': 'a1'})
+        with patch('apps.rakuten.api.views.send_request_to_rakuten_api', self.fake_send):
+            rakuten_batch_detail_api_view(request)
+        with patch('apps.rakuten.api.views.send_request_to_rakuten_api') as send:
+            response = rakuten_batch_detail_api_view(request)
+        send.assert_not_called()
+        self.assertEqual(response.data['items'][0]['itemId'], 'a1')
+
+    def test_ids_required(self):
+        response = rakuten_batch_detail_api_view(self.factory.get('/api/rakuten/products/'))
+        self.assertEqual(response.status_code, 400)
+
+
+class TestRakutenDetailAPIView(TestCase):
+    def setUp(self):
+        rakuten_response_cache.local.clear()
+        rakuten_response_cache.shared.clear()
+        self.factory = APIRequestFactory()
+
+    def fake_send(self, endpoint):
+        product_id = re.search(r'productId=(\w+)', endpoint)[1]
+        products = [] if product_id == 'missing' else [{'productId': product_id, 'productName': product_id}]
+        return SimpleNamespace(status_code=200, content=json.dumps({'Products': products}).encode())
+
+    async def async_fake_send(self, endpoint):
+        return self.fake_send(endpoint)
+
+    def test_found(self):
+        request = self.factory.get('/api/rakuten/product/iphone-a1')
+        with patch('apps.rakuten.api.views.send_request_to_rakuten_api', self.fake_send):
+            response = rakuten_detail_api_view(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['itemId'], 'a1')
+
+    def test_not_found(self):
+        request = self.factory.get('/api/rakuten/product/iphone-missing')
+        with patch('apps.rakuten.api.views.send_request_to_rakuten_api', self.fake_send):
+            response = rakuten_detail_api_view(request)
+        self.assertEqual(response.status_code, 404)
+
+    def test_async_not_found(self):
+        request = self.factory.get('/api/rakuten/product/iphone-missing')
+        with patch('apps.rakuten.api.views.async_send_request_to_rakuten_api', self.async_fake_send):
+            response = asyncio.run(async_rakuten_detail_view(request))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(json.loads(response.content)['detail'], 'Không tìm thấy sản phẩm.')
+
+
+class TestRakutenRateLimiter(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_token_bucket_is_shared_through_the_state_file(self):
+        bucket = TokenBucket('app', rate=1, burst=2, directory=self.directory)
+        other_process_bucket = TokenBucket('app', rate=1, burst=2, directory=self.directory)
+        self.assertEqual(bucket.try_acquire(), 0)
+        self.assertEqual(other_process_bucket.try_acquire(), 0)
+        self.assertGreater(bucket.try_acquire(), 0)
+
+    def test_rotates_application_ids(self):
+        limiter = RakutenRateLimiter(['a', 'b'], rate=1, burst=1, directory=self.directory,
+                                     initial_concurrency=5, max_concurrency=5)
+        permits = [limiter.acquire(), limiter.acquire()]
+        self.assertEqual(sorted(permit.application_id for permit in permits), ['a', 'b'])
+        self.assertEqual(
+            permits[0].apply('https://x/?applicationId=default&keyword=a'),
+            f'https://x/?applicationId={permits[0].application_id}&keyword=a'
+        )
+        for permit in permits:
+            permit.release(200)
+        self.assertEqual(limiter.stats()['queue_depth'], 0)
+
+    def test_backs_off_on_429(self):
+        limiter = RakutenRateLimiter(['a'], rate=100, burst=100, directory=self.directory,
+                                     initial_concurrency=8, max_concurrency=8)
+        limiter.acquire().release(429)
+        self.assertEqual(limiter.concurrency.limit, 4)
+        self.assertEqual(limiter.stats()['throttled'], 1)
+        limiter.acquire().release(200)
+        self.assertEqual(limiter.concurrency.limit, 4.25)
+
+    def test_acquire_async_waits_for_release(self):
+        limiter = RakutenRateLimiter(['a'], rate=1000, burst=1000, directory=self.directory,
+                                     initial_concurrency=1, max_concurrency=1)
+
+        async def run():
+            first = await limiter.acquire_async()
+            second = asyncio.ensure_future(limiter.acquire_async())
+            await asyncio.sleep(0.05)
+            self.assertFalse(second.done())
+            first.release(200)
+            permit = await asyncio.wait_for(second, timeout=1)
+            permit.release(200)
+            # Coroutine bị huỷ trong lúc chờ không giữ chỗ
+            first = await limiter.acquire_async()
+            cancelled = asyncio.ensure_future(limiter.acquire_async())
+            await asyncio.sleep(0)
+            cancelled.cancel()
+            first.release(200)
+            (await asyncio.wait_for(limiter.acquire_async(), timeout=1)).release(200)
+
+        asyncio.run(run())
+        self.assertEqual(limiter.stats()['queue_depth'], 0)
+        # Concurrency của luồng đồng bộ không bị ảnh hưởng
+        self.assertEqual(limiter.concurrency.in_flight, 0)
+
+    def test_429_returns_service_unavailable(self):
+        rakuten_response_cache.local.clear()
+        rakuten_response_cache.shared.clear()
+        request = APIRequestFactory().get('/api/rakuten/search/', {'q': 'iphone'})
+        with patch('apps.rakuten.api.views.send_request_to_rakuten_api',
+                   return_value=SimpleNamespace(status_code=429, content=b'')):
+            response = rakuten_search_api_view(request)
+        self.assertEqual(response.status_code, 503)
+
+
+class TestAsyncRakutenClientPool(TestCase):
+    def test_splits_connections_across_clients(self):
+        pool = AsyncRakutenClientPool(max_connections=10, connections_per_client=4, timeout=1)
+        self.assertEqual(len(pool.clients), 3)
+        self.assertEqual([next(pool._next_client) for _ in range(4)], pool.clients + pool.clients[:1])
+        asyncio.run(pool.aclose())
+        self.assertTrue(pool.is_closed)
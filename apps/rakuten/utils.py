@@ -1,13 +1,50 @@
+from collections import namedtuple
 from django.conf import settings
+import codecs
+import functools
+import json
 import re
 
+from apps.rakuten.cache import make_cache_key
+
+
+class RakutenEndpointSpec(namedtuple('RakutenEndpointSpec', ('host', 'api', 'params'))):
+    """
+    Thông tin đã parse xong của một endpoint Rakuten, không đổi được và hash được.
+    - params: tuple các query đã ghép sẵn dạng "key=value" theo thứ tự ghép vào URL
+    - url và cache_key được tính một lần cho mỗi spec khác nhau (memoize theo spec)
+    """
+    __slots__ = ()
+
+    @property
+    def url(self):
+        return _build_endpoint(self)[0]
+
+    @property
+    def cache_key(self):
+        return _build_endpoint(self)[1]
+
+
+@functools.lru_cache(maxsize=4096)
+def _build_endpoint(spec):
+    url = spec.host + spec.api + "?" + '&'.join(spec.params)
+    return url, make_cache_key(url)
+
 
 class URLRakutenAdapter:
-    PRICE_FILTER_STRING_PATTERN = r'\d+\.\.\d+'
+    PRICE_FILTER_STRING_PATTERN = re.compile(r'(\d+)\.\.(\d+)')
+    DEFAULT_HOST = 'https://app.rakuten.co.jp/services/api/'
+    DEFAULT_APPLICATION_ID = 'applicationId=1014989523353184170'
 
     def __init__(self, request, **kwargs):
         self.request = request
         self.query_params = self._get_query_params()
+        # product_id truyền vào trực tiếp (VD: lấy chi tiết nhiều sản phẩm cùng lúc) thì không lấy từ URL
+        self._product_id = kwargs.get('product_id')
+        # Đọc settings và parse filter giá một lần cho mỗi request
+        self._host = getattr(settings, 'RAKUTEN_ENV', self.DEFAULT_HOST)
+        self._application_id = getattr(settings, 'RAKUTEN_ID', self.DEFAULT_APPLICATION_ID)
+        self.min_max_list = self._get_min_max_from_filter_price()
 
     def merge_query_params_to_string(self, list_params_to_merge):
         """
@@ -16,19 +53,28 @@ class URLRakutenAdapter:
 
         Argument list_params_to_merge = [str, str, str]
         """
+        return '&'.join(self._get_params(list_params_to_merge))
+
+    def get_spec(self, list_params_to_merge):
+        """
+        Trả về ``RakutenEndpointSpec`` để lấy url và cache_key của endpoint
+
+        Argument list_params_to_merge = [str, str, str]
+        """
+        return RakutenEndpointSpec(self.host, self.product_api, self._get_params(list_params_to_merge))
+
+    def _get_params(self, list_params_to_merge):
         rv = []
         for param in list_params_to_merge:
             if (value := getattr(self, param, None)):
                 rv.append(value)
         # Sử dụng version 2 của rakuten cho nhẹ hơn
         rv.append("formatVersion=2")
-        return rv.join('&')
+        return tuple(rv)
 
     @property
     def host(self):
-        if hasattr(settings, 'RAKUTEN_ENV'):
-            return settings.RAKUTEN_ENV
-        return 'https://app.rakuten.co.jp/services/api/'
+        return self._host
 
     @property
     def product_api(self):
@@ -37,24 +83,22 @@ class URLRakutenAdapter:
 
     @property
     def applicationId(self):
-        if hasattr(settings, 'RAKUTEN_ID'):
-            return settings.RAKUTEN_ID
-        return 'applicationId=1014989523353184170'
+        return self._application_id
 
     @property
     def keyword(self):
         # Từ khóa tìm kiếm
-        if self.query_params.get('q', None):
-            return f"keyword={self.query_params.get('q')}"
+        if (q := self.query_params.get('q', None)):
+            return f"keyword={q}"
 
     @property
     def genreId(self):
-        if self.query_params.get('', None):
-            return f""
+        if (genre_id := self.query_params.get('genre_id', None)):
+            return f"genreId={genre_id}"
 
     @property
     def productId(self):
-        product_id = self._get_product_id_from_url()
+        product_id = self._product_id or self._get_product_id_from_url()
         if product_id:
             return f"productId={product_id}"
 
@@ -67,23 +111,19 @@ class URLRakutenAdapter:
     @property
     def hits(self):
         # Số lượng sản phẩm trả về
-        if self.query_params.get('limit', None):
-            return f"hits={self.query_params.get('')}"
+        if (limit := self.query_params.get('limit', None)):
+            return f"hits={limit}"
         return "hits=10"
 
     @property
     def page(self):
-        if self.query_params.get('page', None):
-            return f"page={self.query_params.get('page')}"
+        if (page := self.query_params.get('page', None)):
+            return f"page={page}"
         return "page=1"
 
-    @property
-    def min_max_list(self):
-        # Min = min_max_list[0], Max = min_max_list[1]
-        return self._get_min_max_from_filter_price()
-
     @property
     def minPrice(self):
+        # Min = min_max_list[0], Max = min_max_list[1]
         if self.min_max_list:
             return f"minPrice={self.min_max_list[0]}"
 
@@ -94,9 +134,9 @@ class URLRakutenAdapter:
     # END QUERY PARAM
 
     def _get_min_max_from_filter_price(self):
-        filter_string = self.query_params('filter', None)
-        if filter_string and (match := re.search(self.PRICE_FILTER_STRING_PATTERN, filter_string)):
-            return match[0].split('..')
+        filter_string = self.query_params.get('filter', None)
+        if filter_string and (match := self.PRICE_FILTER_STRING_PATTERN.search(filter_string)):
+            return match.groups()
 
     def _get_query_params(self):
         """
@@ -109,6 +149,193 @@ class URLRakutenAdapter:
             return self.request.GET
 
 
+class RakutenProduct:
+    """
+    Một sản phẩm của Rakuten (Product Search API, formatVersion=2) sau khi chuyển về dạng sản phẩm của mình.
+    Dùng __slots__ thay cho dict để mỗi sản phẩm tốn ít bộ nhớ, chỉ giữ lại những trường cần dùng.
+    """
+    __slots__ = (
+        'product_id', 'title', 'brand', 'price', 'max_price', 'average_price',
+        'image', 'url', 'genre_id', 'genre_name', 'review_count', 'review_average',
+    )
+
+    def __init__(self, item):
+        self.product_id = item.get('productId')
+        self.title = item.get('productName')
+        self.brand = item.get('brandName') or item.get('makerName')
+        # Giá bán thấp nhất hiện tại, không có thì lấy giá thấp nhất từng có
+        self.price = item.get('salesMinPrice') or item.get('minPrice')
+        self.max_price = item.get('salesMaxPrice') or item.get('maxPrice')
+        self.average_price = item.get('averagePrice')
+        self.image = item.get('mediumImageUrl') or item.get('smallImageUrl')
+        self.url = item.get('productUrlPC')
+        self.genre_id = item.get('genreId')
+        self.genre_name = item.get('genreName')
+        self.review_count = item.get('reviewCount')
+        self.review_average = item.get('reviewAverage')
+
+    def to_dict(self):
+        return {
+            'itemId': self.product_id,
+            'title': self.title,
+            'brand': self.brand,
+            'image': {'imageUrl': self.image},
+            'price': {'value': self.price, 'currency': 'JPY'},
+            'maxPrice': {'value': self.max_price, 'currency': 'JPY'},
+            'averagePrice': {'value': self.average_price, 'currency': 'JPY'},
+            'itemWebUrl': self.url,
+            'categoryId': self.genre_id,
+            'categoryName': self.genre_name,
+            'reviewCount': self.review_count,
+            'reviewAverage': self.review_average,
+        }
+
+
 class ProductRakutenAdapter:
-    def __init__(self, **kwargs):
-        pass
+    """
+    Chuyển response của Rakuten (formatVersion=2) thành danh sách ``RakutenProduct``.
+    - content: bytes hoặc iterable các chunk bytes (VD: ``response.iter_content()``)
+    - Đọc dần từng chunk, mỗi sản phẩm trong mảng ``Products`` được decode xong thì chuyển
+      ngay thành ``RakutenProduct``, không giữ lại cả cây dict của trang kết quả.
+    - Các view truyền vào bytes của cả response (đã lưu trong cache và dùng chung qua single-flight),
+      nên ở đó không phải đọc stream từ network: lợi ích là không tạo cây dict của cả trang, không phải giảm
+      thời gian chờ response.
+    - Các trường cấp 1 khác (count, page, pageCount, ...) được lưu vào ``meta``.
+
+    VD: adapter = ProductRakutenAdapter(content)
+        items = [product.to_dict() for product in adapter]
+        adapter.meta['count']
+    """
+    PRODUCTS_KEY = 'Products'
+    META_KEYS = ('count', 'page', 'first', 'last', 'hits', 'pageCount')
+    WHITESPACE = ' \t\n\r'
+
+    def __init__(self, content, chunk_size=16 * 1024, **kwargs):
+        self.content = content
+        self.chunk_size = chunk_size
+        self.meta = {}
+        self._decoder = json.JSONDecoder()
+
+    def __iter__(self):
+        return self._iter_products()
+
+    def to_representation(self):
+        items = [product.to_dict() for product in self]
+        return {
+            'total': self.meta.get('count', 0),
+            'page': self.meta.get('page', 1),
+            'pageCount': self.meta.get('pageCount', 0),
+            'items': items,
+        }
+
+    def _iter_chunks(self):
+        if isinstance(self.content, (bytes, bytearray)):
+            view = memoryview(self.content)
+            for start in range(0, len(view), self.chunk_size):
+                yield view[start:start + self.chunk_size]
+        else:
+            yield from self.content
+
+    def _iter_products(self):
+        reader = _StreamReader(self._iter_chunks())
+        reader.expect('{')
+        if reader.peek() == '}':
+            return
+        while True:
+            key = reader.decode(self._decoder)
+            reader.expect(':')
+            if key == self.PRODUCTS_KEY:
+                yield from self._iter_array(reader)
+            else:
+                value = reader.decode(self._decoder)
+                if key in self.META_KEYS:
+                    self.meta[key] = value
+            separator = reader.next_char()
+            if separator == '}':
+                return
+            if separator != ',':
+                raise ValueError(f'Response Rakuten không đúng định dạng JSON: {separator!r}')
+
+    def _iter_array(self, reader):
+        reader.expect('[')
+        if reader.peek() == ']':
+            reader.next_char()
+            return
+        while True:
+            yield RakutenProduct(reader.decode(self._decoder))
+            separator = reader.next_char()
+            if separator == ']':
+                return
+            if separator != ',':
+                raise ValueError(f'Response Rakuten không đúng định dạng JSON: {separator!r}')
+
+
+class _StreamReader:
+    """
+    Đọc JSON dạng text từ các chunk bytes.
+    Chỉ giữ lại phần chưa decode trong buffer, phần đã decode xong được bỏ đi.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self):
+        if self._eof:
+            return False
+        # Bỏ phần đã đọc xong để buffer không lớn dần theo response
+        self._buffer = self._buffer[self._pos:]
+        self._pos = 0
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            self._buffer += self._text_decoder.decode(b'', final=True)
+            self._eof = True
+            return False
+        self._buffer += self._text_decoder.decode(bytes(chunk))
+        return True
+
+    def _skip_whitespace(self):
+        while True:
+            buffer = self._buffer
+            pos = self._pos
+            while pos < len(buffer) and buffer[pos] in ProductRakutenAdapter.WHITESPACE:
+                pos += 1
+            self._pos = pos
+            if pos < len(buffer) or not self._fill():
+                return
+
+    def peek(self):
+        self._skip_whitespace()
+        if self._pos >= len(self._buffer):
+            raise ValueError('Response Rakuten bị thiếu dữ liệu')
+        return self._buffer[self._pos]
+
+    def next_char(self):
+        char = self.peek()
+        self._pos += 1
+        return char
+
+    def expect(self, char):
+        found = self.next_char()
+        if found != char:
+            raise ValueError(f'Response Rakuten không đúng định dạng JSON: cần {char!r}, gặp {found!r}')
+
+    def decode(self, decoder):
+        self._skip_whitespace()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                # Giá trị chưa nhận đủ, đọc thêm chunk rồi thử lại
+                if not self._fill():
+                    raise
+                continue
+            # Số ở cuối buffer có thể chưa đủ chữ số (VD: "12" của "1234")
+            if end == len(self._buffer) and not self._eof and self._fill():
+                continue
+            self._pos = end
+            return value
@@ -0,0 +1,77 @@
+"""
+So sánh ``add_product_all`` lưu từng sản phẩm với chế độ ``bulk_upsert_products`` khi import 1k và 10k sản phẩm
+của một danh mục (một nửa đã có trong DB). Chạy trên database test (tạo mới rồi xoá khi xong),
+translator là ``StubTranslator`` nên không gọi API dịch thật (chỉ chế độ bulk dịch tiêu đề sản phẩm mới).
+Cần project có app ``product`` (model Product).
+
+    python benchmarks/bench_add_product_all.py --sizes 1000 10000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'rakutenApi.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection, reset_queries  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+
+import ebay_view  # noqa: E402
+from product.models import Product  # noqa: E402
+from translation import StubTranslator, Translation  # noqa: E402
+
+CATEGORY_ID = 9355
+
+
+def make_items(total, prefix):
+    return [{
+        'itemId': f'v1|{prefix}{i}|0',
+        'title': f'Apple iPhone 13 Pro {i} 256GB Unlocked',
+        'image': {'imageUrl': f'https://i.ebayimg.com/images/g/{i}/s-l1600.jpg'},
+        'price': {'value': f'{100 + i % 900}.99', 'currency': 'USD'},
+        'shortDescription': 'Used, good condition',
+        'categories': [{'categoryId': str(CATEGORY_ID)}],
+    } for i in range(total)]
+
+
+def run(total, bulk):
+    Product.objects.all().delete()
+    # Một nửa sản phẩm đã có trong DB (cập nhật), một nửa là sản phẩm mới (thêm)
+    ebay_view.add_product_all(make_items(total // 2, 'old'), CATEGORY_ID, bulk=True)
+    items = make_items(total // 2, 'old') + make_items(total - total // 2, 'new')
+
+    reset_queries()
+    start = time.perf_counter()
+    ebay_view.add_product_all(items, CATEGORY_ID, bulk=bulk)
+    elapsed = time.perf_counter() - start
+    assert Product.objects.count() == total
+    return elapsed, len(connection.queries)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    connection.force_debug_cursor = True
+    stub = StubTranslator()
+    ebay_view.translation = Translation(translator=stub, timeout=30)
+    try:
+        for total in args.sizes:
+            single_time, single_queries = run(total, bulk=False)
+            bulk_time, bulk_queries = run(total, bulk=True)
+            print(f'{total:6d} items  per item {single_time:8.3f} s ({single_queries:6d} queries)   '
+                  f'bulk {bulk_time:8.3f} s ({bulk_queries:4d} queries)   x{single_time / bulk_time:6.1f}')
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
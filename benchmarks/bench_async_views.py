@@ -0,0 +1,144 @@
+"""
+So sánh requests/sec giữa view đồng bộ (WSGI) và view bất đồng bộ (ASGI) của Rakuten.
+
+Rakuten được giả lập bằng một HTTP server local trả về sau ``--latency`` giây,
+nên kết quả chỉ phản ánh chi phí chờ upstream chứ không phụ thuộc mạng thật.
+
+    python benchmarks/bench_async_views.py --requests 800 --workers 8 --concurrency 200 --latency 0.1
+
+Trên 1 CPU (chung với Rakuten giả lập) phía ASGI bị giới hạn bởi CPU: middleware đồng bộ của django
+(mỗi middleware một lần chuyển sang thread qua sync_to_async) và chi phí của httpx.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'rakutenApi.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.test import AsyncClient, Client  # noqa: E402
+
+# Mỗi request một từ khoá khác nhau để không bị cache / single-flight gộp lại
+PATH = '/api/rakuten/search/?q=iphone{}'
+ASYNC_PATH = '/api/rakuten/async/search/?q=iphone{}'
+
+
+def _serve_fake_rakuten(latency, port_queue):
+    body = b'{"count": 0, "page": 1, "Products": []}'
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+        request_queue_size = 1024
+
+    server = Server(('127.0.0.1', 0), Handler)
+    port_queue.put(server.server_port)
+    server.serve_forever()
+
+
+def start_fake_rakuten(latency):
+    # Chạy ở process riêng để không tranh GIL với phía Django đang được đo
+    port_queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_serve_fake_rakuten, args=(latency, port_queue), daemon=True)
+    process.start()
+    return process, port_queue.get()
+
+
+def bench_wsgi(total, workers):
+    # Mỗi worker WSGI chỉ xử lý được một request tại một thời điểm
+    def worker(worker_id, n):
+        client = Client()
+        for i in range(n):
+            client.get(PATH.format(f'{worker_id}-{i}'))
+
+    per_worker = total // workers
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(worker, range(workers), [per_worker] * workers))
+    return per_worker * workers / (time.perf_counter() - start)
+
+
+def bench_asgi(total, concurrency):
+    async def run():
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(i):
+            async with semaphore:
+                await client.get(ASYNC_PATH.format(i))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        return total / (time.perf_counter() - start)
+
+    return asyncio.run(run())
+
+
+def bench_async_fetch(total, concurrency, port):
+    # Chỉ đo lớp gọi Rakuten (async_get_rakuten_content), không qua middleware / test client của django
+    from apps.rakuten.api.views import async_get_rakuten_content
+
+    async def run():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(i):
+            async with semaphore:
+                await async_get_rakuten_content(f'http://127.0.0.1:{port}/?q=fetch{i}')
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        return total / (time.perf_counter() - start)
+
+    return asyncio.run(run())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=800)
+    parser.add_argument('--workers', type=int, default=8, help='số worker WSGI')
+    parser.add_argument('--concurrency', type=int, default=200, help='số request đồng thời trên 1 worker ASGI')
+    parser.add_argument('--latency', type=float, default=0.1, help='độ trễ giả lập của Rakuten (giây)')
+    args = parser.parse_args()
+
+    server, port = start_fake_rakuten(args.latency)
+    settings.ALLOWED_HOSTS = ['testserver']
+    settings.RAKUTEN_RATE_LIMIT_PER_SECOND = None
+    settings.RAKUTEN_ENV = f'http://127.0.0.1:{port}/'
+    settings.RAKUTEN_POOL_MAXSIZE = args.workers
+    settings.RAKUTEN_ASYNC_MAX_CONNECTIONS = args.concurrency
+
+    wsgi_rps = bench_wsgi(args.requests, args.workers)
+    asgi_rps = bench_asgi(args.requests, args.concurrency)
+    print(f'WSGI ({args.workers} workers):            {wsgi_rps:8.1f} req/s')
+    fetch_rps = bench_async_fetch(args.requests, args.concurrency, port)
+    print(f'ASGI (1 worker, {args.concurrency} in flight): {asgi_rps:8.1f} req/s')
+    print(f'async fetch ({args.concurrency} in flight):    {fetch_rps:8.1f} req/s  (không qua middleware)')
+    server.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+So sánh lưu dict vào cache bằng pickle (cách cũ) với ``utils.cache_serializer.CacheSerializer``
+(serializer của ``ProductDetailCache`` và của dữ liệu ship, thêm một bản có nén zlib để so sánh):
+số byte mỗi phần tử và thời gian set / get qua cache framework của django (LocMemCache, cũng pickle như redis),
+trên dữ liệu mẫu trong ``benchmarks/fixtures`` (chi tiết sản phẩm và dữ liệu ship GetShippingCosts).
+
+    python benchmarks/bench_cache_serializer.py
+"""
+import argparse
+import glob
+import json
+import os
+import pickle
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'rakutenApi.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.cache.backends.locmem import LocMemCache  # noqa: E402
+
+from ebay_detail_fields import product_detail_serializer  # noqa: E402
+from ebay_shipping import parse_get_shipping_costs, shipping_data_serializer  # noqa: E402
+from utils.cache_serializer import CacheSerializer, prune  # noqa: E402
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def load_fixtures():
+    with open(os.path.join(FIXTURES_DIR, 'item_detail.json'), encoding='utf-8') as f:
+        data = json.load(f)
+    yield 'item_detail', data, product_detail_serializer
+    yield 'item_detail (zlib)', data, CacheSerializer(fields=product_detail_serializer.fields, compress_threshold=0)
+    # Chi tiết có description dài, lớn hơn PRODUCT_DETAIL_COMPRESS_THRESHOLD nên được nén
+    large = dict(data, description=data.get('description', '') * 4)
+    yield 'item_detail (long description)', large, product_detail_serializer
+    yield 'item_detail (long, no zlib)', large, CacheSerializer(fields=product_detail_serializer.fields)
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, 'get_shipping_costs_*.xml'))):
+        with open(path, 'rb') as f:
+            yield os.path.basename(path)[:-4], parse_get_shipping_costs(f.read()), shipping_data_serializer
+
+
+def best_time(fn, number, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / number
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', type=int, default=2000)
+    args = parser.parse_args()
+
+    cache = LocMemCache('bench', {})
+    for name, data, serializer in load_fixtures():
+        assert serializer.loads(serializer.dumps(data)) == prune(data, serializer.fields)
+
+        pickle_bytes = len(pickle.dumps(data, pickle.HIGHEST_PROTOCOL))
+        compact_bytes = len(pickle.dumps(serializer.dumps(data), pickle.HIGHEST_PROTOCOL))
+
+        pickle_set = best_time(lambda: cache.set('pickle', data), args.number)
+        compact_set = best_time(lambda: cache.set('compact', serializer.dumps(data)), args.number)
+        pickle_get = best_time(lambda: cache.get('pickle'), args.number)
+        compact_get = best_time(lambda: serializer.loads(cache.get('compact')), args.number)
+
+        print(f'{name:32s} bytes {pickle_bytes:6d} -> {compact_bytes:6d}   '
+              f'set {pickle_set * 1e6:7.1f} -> {compact_set * 1e6:7.1f} us   '
+              f'get {pickle_get * 1e6:7.1f} -> {compact_get * 1e6:7.1f} us')
+
+
+if __name__ == '__main__':
+    main()
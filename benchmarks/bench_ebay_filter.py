@@ -0,0 +1,145 @@
+"""
+Đo tốc độ đổi chuỗi filter viết tắt sang filter của eBay:
+cách cũ (split theo ',' và ':', duyệt bảng từ viết tắt) so với ``ebay_filter.FilterCompiler``
+khi chưa có cache (mỗi chuỗi chỉ gặp một lần) và khi đã cache.
+
+    python benchmarks/bench_ebay_filter.py
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'rakutenApi.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from ebay_filter import FilterCompiler  # noqa: E402
+
+# Bảng từ viết tắt mẫu (bảng thật nằm trong ebay.utils)
+KEYS = {
+    'p': 'price', 'pC': 'priceCurrency', 'bO': 'buyingOptions', 'c': 'conditions',
+    'iL': 'itemLocationCountry', 'dC': 'deliveryCountry', 's': 'sellers', 'cI': 'conditionIds',
+}
+VALUES = {
+    'buyingOptions': {'f': 'FIXED_PRICE', 'a': 'AUCTION', 'b': 'BEST_OFFER'},
+    'conditions': {'n': 'NEW', 'u': 'USED', 'un': 'UNSPECIFIED'},
+    'itemLocationCountry': {'us': 'US', 'jp': 'JP', 'gb': 'GB'},
+}
+
+
+def get_key_filter(abbreviation):
+    return KEYS.get(abbreviation, abbreviation)
+
+
+def legacy_filter(raw):
+    # Cách cũ trong ebay_search_result (rút gọn, cùng cách duyệt bảng)
+    filter = '&filter=buyingOptions:{FIXED_PRICE|AUCTION|BEST_OFFER},'
+    if 'bO' in raw:
+        filter = '&filter='
+    for obj_filter in raw.split(','):
+        keys = obj_filter.split(':')
+        key = get_key_filter(keys[0])
+        if key in ('sellers', 'conditionIds'):
+            filter += key + ':' + keys[1] + ','
+        if keys[1][0] == '[' and keys[1][-1] == ']':
+            value_param = key + ':' + keys[1] + ','
+        elif keys[1][0] == '{' and keys[1][-1] == '}':
+            arr = []
+            if key in VALUES.keys():
+                for value in keys[1][1:-1].split('|'):
+                    for k, v in VALUES[key].items():
+                        if value == k:
+                            arr.append(v)
+            if not arr:
+                value_param = 'buyingOptions:{FIXED_PRICE|AUCTION|BEST_OFFER},' if keys[0] == 'bO' else ''
+            else:
+                value_param = key + ':{' + '|'.join(arr[:3]) + '},'
+        else:
+            if key in VALUES.keys():
+                for k, v in VALUES[key].items():
+                    if k == keys[1]:
+                        keys[1] = v
+            value_param = key + ':' + keys[1] + ','
+        filter += value_param
+    return filter
+
+
+def make_filters(count, seed=0):
+    rng = random.Random(seed)
+    filters = []
+    for _ in range(count):
+        conditions = [f'p:[{rng.randint(0, 50)}..{rng.randint(51, 500)}]', 'pC:USD']
+        if rng.random() < 0.7:
+            conditions.append('bO:{' + '|'.join(rng.sample(['f', 'a', 'b'], rng.randint(1, 3))) + '}')
+        if rng.random() < 0.5:
+            conditions.append('c:{' + '|'.join(rng.sample(['n', 'u', 'un'], rng.randint(1, 3))) + '}')
+        if rng.random() < 0.5:
+            conditions.append('iL:' + rng.choice(['us', 'jp', 'gb']))
+        rng.shuffle(conditions)
+        filters.append(','.join(conditions))
+    return filters
+
+
+def best_time(fn, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=20000)
+    parser.add_argument('--distinct', type=int, default=500, help='số chuỗi filter khác nhau')
+    args = parser.parse_args()
+
+    distinct = make_filters(args.distinct)
+    filters = [distinct[i % len(distinct)] for i in range(args.count)]
+
+    def run_legacy():
+        for raw in filters:
+            legacy_filter(raw)
+
+    # Chưa có cache: mỗi chuỗi filter chỉ gặp một lần (như filter do người dùng nhập, nhiều giá trị khác nhau)
+    unique = make_filters(args.count, seed=1)
+
+    def run_unique_legacy():
+        for raw in unique:
+            legacy_filter(raw)
+
+    def run_cold():
+        compiler = FilterCompiler(get_key_filter, VALUES)
+        for raw in unique:
+            compiler.compile(raw)
+
+    # Chưa có cache, kể cả kết quả của từng điều kiện
+    def run_cold_conditions():
+        compiler = FilterCompiler(get_key_filter, VALUES)
+        for raw in unique:
+            compiler._conditions.clear()
+            compiler.compile(raw)
+
+    warm = FilterCompiler(get_key_filter, VALUES)
+
+    def run_warm():
+        for raw in filters:
+            warm.compile(raw)
+
+    for legacy_fn, cases in ((run_unique_legacy, (('cold', run_cold), ('cold-cond', run_cold_conditions))), (run_legacy, (('memoized', run_warm),))):
+        legacy = best_time(legacy_fn)
+        print(f'legacy      {args.count / legacy:12,.0f} filter/s')
+        for name, fn in cases:
+            elapsed = best_time(fn)
+            print(f'{name:<11} {args.count / elapsed:12,.0f} filter/s  x{legacy / elapsed:.2f}')
+
+
+if __name__ == '__main__':
+    main()
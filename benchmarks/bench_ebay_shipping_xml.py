@@ -0,0 +1,202 @@
+"""
+So sánh đọc response GetShippingCosts bằng ``xmltodict.parse`` + ``json.dumps`` + ``json.loads`` (cách cũ)
+với ``ebay_shipping.parse_get_shipping_costs`` trên các response mẫu trong ``benchmarks/fixtures``.
+Nếu không cài xmltodict thì cách cũ được thay bằng đổi toàn bộ cây ElementTree sang dict (cùng dạng xmltodict).
+Cột iterparse là cách đọc theo sự kiện (start / end, ``clear`` từng element), cột XMLParser target là đọc theo
+sự kiện không tạo element (callback của expat), cả hai cho cùng kết quả, để so sánh.
+
+    python benchmarks/bench_ebay_shipping_xml.py
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import xml.etree.ElementTree as ElementTree
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ebay_shipping import GET_SHIPPING_COSTS_FIELDS, _leaf_to_value, _local_name, parse_get_shipping_costs  # noqa
+
+try:
+    import xmltodict
+except ImportError:
+    xmltodict = None
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def _full_to_dict(element):
+    children = list(element)
+    text = element.text.strip() if element.text else ''
+    if not children and not element.attrib:
+        return text or None
+    value = {'@' + name: attribute for name, attribute in element.attrib.items()}
+    for child in children:
+        name = child.tag.rpartition('}')[2]
+        child_value = _full_to_dict(child)
+        if name in value:
+            if not isinstance(value[name], list):
+                value[name] = [value[name]]
+            value[name].append(child_value)
+        else:
+            value[name] = child_value
+    if text:
+        value['#text'] = text
+    return value
+
+
+def old_parse(content):
+    if xmltodict is not None:
+        parse = xmltodict.parse(content)
+    else:
+        root = ElementTree.fromstring(content)
+        parse = {root.tag.rpartition('}')[2]: _full_to_dict(root)}
+    return json.loads(json.dumps(parse))
+
+
+def _add_value(result, name, value):
+    if name not in result:
+        result[name] = value
+    elif isinstance(result[name], list):
+        result[name].append(value)
+    else:
+        result[name] = [result[name], value]
+
+
+def stream_parse(content):
+    # Giống parse_get_shipping_costs nhưng đọc theo sự kiện, bỏ qua nhánh không cần và clear element đã đọc xong
+    parser = ElementTree.XMLPullParser(('start', 'end'))
+    parser.feed(content)
+    parser.close()
+    stack = []
+    skip = 0
+    for event, element in parser.read_events():
+        if event == 'start':
+            if skip:
+                skip += 1
+            elif not stack:
+                stack.append((GET_SHIPPING_COSTS_FIELDS, {}))
+            else:
+                fields = stack[-1][0]
+                name = _local_name(element.tag)
+                if fields is None or name not in fields:
+                    skip = 1
+                else:
+                    stack.append((fields[name], None if fields[name] is None else {}))
+            continue
+        if skip:
+            skip -= 1
+        else:
+            fields, value = stack.pop()
+            if not stack:
+                return {_local_name(element.tag): value}
+            _add_value(stack[-1][1], _local_name(element.tag), _leaf_to_value(element) if fields is None else value)
+        element.clear()
+
+
+class _StreamTarget:
+    # Target của ``XMLParser``: expat gọi thẳng start / data / end, không tạo element nào, bỏ qua nhánh không cần
+    def __init__(self):
+        self.root = None
+        self.stack = [(GET_SHIPPING_COSTS_FIELDS, {}, None)]
+        self.skip = 0
+        self.text = []
+
+    def start(self, tag, attrib):
+        if self.skip:
+            self.skip += 1
+        elif self.root is None:
+            self.root = _local_name(tag)
+        else:
+            fields = self.stack[-1][0]
+            name = _local_name(tag)
+            if fields is None or name not in fields:
+                self.skip = 1
+            else:
+                self.stack.append((fields[name], None if fields[name] is None else {}, attrib))
+                self.text = []
+
+    def data(self, data):
+        if not self.skip:
+            self.text.append(data)
+
+    def end(self, tag):
+        if self.skip:
+            self.skip -= 1
+            return
+        if len(self.stack) == 1:
+            return
+        fields, value, attrib = self.stack.pop()
+        if fields is None:
+            text = ''.join(self.text).strip()
+            if attrib:
+                value = {'@' + name: attribute for name, attribute in attrib.items()}
+                if text:
+                    value['#text'] = text
+            else:
+                value = text or None
+        _add_value(self.stack[-1][1], _local_name(tag), value)
+        self.text = []
+
+    def close(self):
+        return {self.root: self.stack[0][1]}
+
+
+def target_parse(content):
+    parser = ElementTree.XMLParser(target=_StreamTarget())
+    parser.feed(content)
+    return parser.close()
+
+
+def _assert_subset(pruned, full):
+    # Mọi trường của kết quả mới phải giống hệt trường tương ứng của cách cũ
+    if isinstance(pruned, dict):
+        for key, value in pruned.items():
+            _assert_subset(value, full[key])
+    elif isinstance(pruned, list):
+        assert len(pruned) == len(full)
+        for pruned_item, full_item in zip(pruned, full):
+            _assert_subset(pruned_item, full_item)
+    else:
+        assert pruned == full, (pruned, full)
+
+
+def best_time(fn, contents, number, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            for content in contents:
+                fn(content)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', type=int, default=2000)
+    args = parser.parse_args()
+
+    fixtures = sorted(glob.glob(os.path.join(FIXTURES_DIR, 'get_shipping_costs_*.xml')))
+    baseline = 'xmltodict + json' if xmltodict is not None else 'ElementTree full dict + json'
+    for path in fixtures:
+        with open(path, 'rb') as f:
+            content = f.read()
+        _assert_subset(parse_get_shipping_costs(content), old_parse(content))
+        assert stream_parse(content) == parse_get_shipping_costs(content)
+        assert target_parse(content) == parse_get_shipping_costs(content)
+        old_time = best_time(old_parse, [content], args.number)
+        new_time = best_time(parse_get_shipping_costs, [content], args.number)
+        stream_time = best_time(stream_parse, [content], args.number)
+        target_time = best_time(target_parse, [content], args.number)
+        print(f'{os.path.basename(path):42s} {baseline} {old_time / args.number * 1e6:8.1f} us   '
+              f'parse_get_shipping_costs {new_time / args.number * 1e6:8.1f} us   x{old_time / new_time:5.2f}   '
+              f'iterparse {stream_time / args.number * 1e6:8.1f} us   '
+              f'XMLParser target {target_time / args.number * 1e6:8.1f} us')
+
+
+if __name__ == '__main__':
+    main()
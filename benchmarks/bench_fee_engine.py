@@ -0,0 +1,112 @@
+"""
+So sánh tính phí bằng float (``fee.get_fee``) với hàm tính phí đã biên dịch của ``fee_engine`` (số nguyên / Decimal).
+Bảng phí là dữ liệu giả lập nạp thẳng vào ``FeeRuleIndex`` nên không cần DB.
+
+    python benchmarks/bench_fee_engine.py
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from decimal import Decimal
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'rakutenApi.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+import fee  # noqa: E402
+import fee_engine  # noqa: E402
+
+COUNTRY_CODE = 'VN'
+PARTNER = 'ebay'
+CATEGORIES = [str(category) for category in range(200)]
+CONDITIONS = ['1000', '3000', '7000']
+
+
+def make_index():
+    warehouses = [
+        SimpleNamespace(country_code='US', state='OR', tax=0),
+        SimpleNamespace(country_code=COUNTRY_CODE, state='', tax=10),
+    ]
+    attribute_values = []
+    for category in CATEGORIES:
+        attribute_values.append(SimpleNamespace(
+            code='category', value=category, country_code=COUNTRY_CODE, partner=PARTNER,
+            type='PERCENT', fee=Decimal(random.choice(['3', '5.5', '8'])), minimum=random.choice([None, 5, 20]),
+        ))
+    for condition in CONDITIONS:
+        attribute_values.append(SimpleNamespace(
+            code='condition', value=condition, country_code='', partner=PARTNER,
+            type='FIXED', fee=Decimal(random.choice(['1', '2.25'])), minimum=None,
+        ))
+    attribute_values.append(SimpleNamespace(
+        code='price', value='', country_code=COUNTRY_CODE, partner=PARTNER,
+        type='PERCENT', fee=Decimal('2'), minimum=10,
+    ))
+    return fee.FeeRuleIndex(warehouses, attribute_values)
+
+
+def make_items(total):
+    prices = [round(random.uniform(1, 2000), 2) for _ in range(total)]
+    usa_ship_prices = [random.choice([0, 5.99, 12.5]) for _ in range(total)]
+    params_list = [
+        {'category': random.choice(CATEGORIES), 'condition': random.choice(CONDITIONS), 'price': price}
+        for price in prices
+    ]
+    return prices, usa_ship_prices, params_list
+
+
+def best_time(fn, *args, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def float_path(prices, usa_ship_prices, params_list):
+    return [
+        fee.get_fee(price, usa_ship_price, COUNTRY_CODE, PARTNER, params=params)
+        for price, usa_ship_price, params in zip(prices, usa_ship_prices, params_list)
+    ]
+
+
+def engine_path(prices, usa_ship_prices, params_list):
+    # Một request chỉ lấy hàm tính phí một lần rồi dùng cho tất cả sản phẩm
+    price_item = fee_engine.get_pricing_function(COUNTRY_CODE, PARTNER)
+    return [
+        price_item(price, usa_ship_price, params)
+        for price, usa_ship_price, params in zip(prices, usa_ship_prices, params_list)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[50, 500, 50000])
+    args = parser.parse_args()
+
+    random.seed(0)
+    fee._fee_rule_index = make_index()
+    fee._fee_rule_index_checked_at = time.monotonic()
+
+    for total in args.sizes:
+        items = make_items(total)
+        for expected, result in zip(float_path(*items), engine_path(*items)):
+            assert abs(Decimal(str(expected[1])) - result[1]) < Decimal('0.0001')
+            assert abs(Decimal(str(expected[2])) - result[2]) < Decimal('0.0001')
+
+        float_time = best_time(float_path, *items)
+        engine_time = best_time(engine_path, *items)
+        print(f'{total:6d} items  get_fee {float_time * 1000:9.3f} ms   '
+              f'fee_engine {engine_time * 1000:9.3f} ms   x{float_time / engine_time:5.2f}')
+
+
+if __name__ == '__main__':
+    main()
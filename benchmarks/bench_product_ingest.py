@@ -0,0 +1,71 @@
+"""
+Đo thời gian từng bước và peak RSS của ``ebay_view.ingest_products`` khi import 1k, 100k và 1M sản phẩm.
+Mỗi kích thước chạy trong một process riêng (peak RSS của process không bị ảnh hưởng bởi lần chạy trước),
+trên database test tạo mới rồi xoá khi xong. Cần project có app ``product`` (model Product).
+
+    python benchmarks/bench_product_ingest.py --sizes 1000 100000 1000000
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'rakutenApi.settings')
+
+PAGE_SIZE = 200
+
+
+def make_pages(total):
+    # Generator: mỗi lần chỉ tạo một trang, giống lấy lần lượt từng trang từ eBay API
+    for start in range(0, total, PAGE_SIZE):
+        yield [{
+            'itemId': f'v1|{i}|0',
+            'title': f'Apple iPhone 13 Pro {i} 256GB Unlocked',
+            'image': {'imageUrl': f'https://i.ebayimg.com/images/g/{i}/s-l1600.jpg'},
+            'price': {'value': f'{100 + i % 900}.99', 'currency': 'USD'},
+            'shortDescription': 'Used, good condition ' * 20,
+            'categories': [{'categoryId': '9355'}],
+        } for i in range(start, min(total, start + PAGE_SIZE))]
+
+
+def run(total):
+    import django
+
+    django.setup()
+
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    import ebay_view
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        start = time.perf_counter()
+        stats = ebay_view.ingest_products(make_pages(total), None, translate=False)
+        elapsed = time.perf_counter() - start
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+    timings = '  '.join(f'{stage} {seconds:7.2f} s' for stage, seconds in stats.timings.items())
+    print(f'{total:8d} items  total {elapsed:7.2f} s  {timings}  peak RSS {peak_rss:5d} MiB')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000, 1000000])
+    parser.add_argument('--run', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run is not None:
+        run(args.run)
+        return
+    for total in args.sizes:
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--run', str(total)], check=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Đo chi phí dựng endpoint Rakuten cho mỗi request:
+- merge + make_cache_key: ghép query string rồi hash lại để lấy cache key mỗi lần
+- get_spec (memoize): parse một lần thành ``RakutenEndpointSpec``, url và cache_key lấy từ memoize
+
+    python benchmarks/bench_rakuten_endpoint.py --number 100000
+"""
+import argparse
+import os
+import sys
+import timeit
+from collections import namedtuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'rakutenApi.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.http import QueryDict  # noqa: E402
+
+from apps.rakuten.cache import make_cache_key  # noqa: E402
+from apps.rakuten.utils import URLRakutenAdapter  # noqa: E402
+
+Request = namedtuple('Request', ('path', 'GET'))
+PARAMS = ['applicationId', 'keyword', 'hits', 'page', 'minPrice', 'maxPrice']
+REQUEST = Request(path='/api/rakuten/search/', GET=QueryDict('q=iphone&page=2&filter=p:[10..20],pC:JPY'))
+
+
+def merge_and_hash():
+    url = URLRakutenAdapter(REQUEST)
+    endpoint = url.host + url.product_api + "?" + url.merge_query_params_to_string(PARAMS)
+    return endpoint, make_cache_key(endpoint)
+
+
+def spec():
+    endpoint_spec = URLRakutenAdapter(REQUEST).get_spec(PARAMS)
+    return endpoint_spec.url, endpoint_spec.cache_key
+
+
+def parse_only():
+    return URLRakutenAdapter(REQUEST)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', type=int, default=100000)
+    args = parser.parse_args()
+
+    assert merge_and_hash() == spec()
+    for name, fn in (
+        ('URLRakutenAdapter(request)', parse_only),
+        ('merge + make_cache_key', merge_and_hash),
+        ('get_spec (memoize)', spec),
+    ):
+        best = min(timeit.repeat(fn, number=args.number, repeat=5))
+        print(f'{name:28s} {best / args.number * 1e6:7.2f} us/request')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+So sánh bộ nhớ và CPU khi chuyển một trang kết quả Rakuten (formatVersion=2) sang dạng sản phẩm của mình:
+- naive: ``json.loads`` cả trang rồi copy từng item sang dict mới
+- adapter: ``ProductRakutenAdapter`` decode dần từng item thành ``RakutenProduct``
+
+    python benchmarks/bench_rakuten_products.py --hits 30 --rounds 200
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'rakutenApi.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from apps.rakuten.utils import ProductRakutenAdapter  # noqa: E402
+
+
+def make_page(hits):
+    # Gần giống response thật: mỗi item có khoảng 40 trường, productCaption khá dài
+    products = []
+    for i in range(hits):
+        item = {
+            'productId': f'{i:032x}',
+            'productName': f'サンプル商品 {i} ワイヤレス イヤホン Bluetooth 5.3',
+            'productNo': f'NO-{i}',
+            'brandName': 'ブランド',
+            'makerName': 'メーカー',
+            'productUrlPC': f'https://product.rakuten.co.jp/product/-/{i:032x}/',
+            'productUrlMobile': f'https://product.rakuten.co.jp/m/product/-/{i:032x}/',
+            'affiliateUrl': '',
+            'smallImageUrl': f'https://thumbnail.image.rakuten.co.jp/{i}.jpg?_ex=64x64',
+            'mediumImageUrl': f'https://thumbnail.image.rakuten.co.jp/{i}.jpg?_ex=128x128',
+            'productCaption': '商品説明テキスト。' * 60,
+            'releaseDate': '2022-01-01',
+            'averagePrice': 12345 + i,
+            'maxPrice': 15000 + i,
+            'minPrice': 9800 + i,
+            'salesMaxPrice': 14800 + i,
+            'salesMinPrice': 9980 + i,
+            'usedExcludeCount': 10,
+            'usedExcludeSalesItemCount': 8,
+            'usedMaxPrice': 8000,
+            'usedMinPrice': 5000,
+            'reviewCount': 120 + i,
+            'reviewAverage': 4.32,
+            'pointRate': 1,
+            'pointRateStartTime': '',
+            'pointRateEndTime': '',
+            'rankTargetGenreId': '564500',
+            'rankTargetProductCount': 2000,
+            'rank': i + 1,
+            'genreId': '564500',
+            'genreName': 'イヤホン・ヘッドホン',
+            'ProductDetails': [{'name': f'detail{j}', 'value': 'x' * 20} for j in range(10)],
+        }
+        products.append(item)
+    page = {
+        'count': 3000, 'page': 1, 'first': 1, 'last': hits, 'hits': hits, 'pageCount': 100,
+        'Products': products,
+        'GenreInformation': [],
+    }
+    return json.dumps(page, ensure_ascii=False).encode('utf-8')
+
+
+NAIVE_KEYS = (
+    'productId', 'productName', 'brandName', 'salesMinPrice', 'salesMaxPrice', 'averagePrice',
+    'mediumImageUrl', 'productUrlPC', 'genreId', 'genreName', 'reviewCount', 'reviewAverage',
+)
+
+
+def naive(content):
+    data = json.loads(content)
+    return [{key: item.get(key) for key in NAIVE_KEYS} for item in data['Products']]
+
+
+def adapter(content):
+    return list(ProductRakutenAdapter(content))
+
+
+def measure(fn, content, rounds):
+    tracemalloc.start()
+    fn(content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.process_time()
+    for _ in range(rounds):
+        fn(content)
+    cpu = (time.process_time() - start) / rounds
+    return peak, cpu
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--hits', type=int, default=30)
+    parser.add_argument('--rounds', type=int, default=200)
+    args = parser.parse_args()
+
+    content = make_page(args.hits)
+    print(f'page: {args.hits} hits, {len(content) / 1024:.1f} KiB')
+    for name, fn in (('naive json.loads + dict copy', naive), ('ProductRakutenAdapter', adapter)):
+        peak, cpu = measure(fn, content, args.rounds)
+        print(f'{name:30s} peak {peak / 1024:8.1f} KiB   cpu {cpu * 1000:7.3f} ms/page')
+
+
+if __name__ == '__main__':
+    main()
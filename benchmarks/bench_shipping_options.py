@@ -0,0 +1,92 @@
+"""
+So sánh chọn option ship rẻ nhất theo cách cũ của ``handle_from_ship_data_after_get``
+(duyệt nhiều lần, gọi ``float()`` trên ``#text``) với ``select_cheapest_option``
+(tạo ``ShippingOption`` cho mọi option, so sánh giá Decimal) trên các list option lớn.
+
+    python benchmarks/bench_shipping_options.py
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ebay_shipping import select_cheapest_option  # noqa: E402
+
+SERVICE_NAMES = ['USPS First Class Package', 'USPS Priority Mail', 'UPS Ground', 'FedEx 2Day',
+                 'Local Pickup', 'Freight']
+CURRENCIES = ['USD', 'USD', 'EUR', 'GBP']
+
+
+def make_options(total):
+    options = []
+    for _ in range(total):
+        option = {
+            'ShippingServiceName': random.choice(SERVICE_NAMES),
+            'ShippingServiceCost': {
+                '@currencyID': random.choice(CURRENCIES), '#text': f'{random.uniform(0, 80):.2f}',
+            },
+        }
+        if random.random() < 0.7:
+            option['EstimatedDeliveryMinTime'] = '2022-09-24T07:00:00.000Z'
+            option['EstimatedDeliveryMaxTime'] = '2022-09-28T07:00:00.000Z'
+        options.append(option)
+    return options
+
+
+def old_select(shipping_options):
+    flag = False
+    minimum_shipping_obj = None
+    for obj in shipping_options:
+        if 'ShippingServiceCost' in obj:
+            if '@currencyID' not in obj['ShippingServiceCost']:
+                continue
+            else:
+                if obj['ShippingServiceCost']['@currencyID'] == 'USD':
+                    if obj['ShippingServiceName'] not in ['Local Pickup', 'Freight']:
+                        flag = True
+                        minimum_shipping_obj = obj
+                        break
+    if flag:
+        us_ship_price = float(minimum_shipping_obj['ShippingServiceCost']['#text'])
+        for obj in shipping_options:
+            if obj['ShippingServiceName'] not in ['Local Pickup', 'Freight'] \
+                    and obj['ShippingServiceCost']['@currencyID'] == 'USD':
+                if us_ship_price > float(obj['ShippingServiceCost']['#text']):
+                    us_ship_price = float(obj['ShippingServiceCost']['#text'])
+                    minimum_shipping_obj = obj
+    return minimum_shipping_obj
+
+
+def best_time(fn, options, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(options)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 1000, 100000])
+    args = parser.parse_args()
+
+    random.seed(0)
+    for total in args.sizes:
+        options = make_options(total)
+        old = old_select(options)
+        new = select_cheapest_option(options)
+        assert (old is None and new is None) or old['ShippingServiceCost']['#text'] == str(new.cost)
+
+        old_time = best_time(old_select, options)
+        new_time = best_time(select_cheapest_option, options)
+        print(f'{total:7d} options  old {old_time * 1000:9.3f} ms   '
+              f'select_cheapest_option {new_time * 1000:9.3f} ms   x{old_time / new_time:5.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+Giả lập search eBay bằng từ khoá đã dịch rồi search lại bằng từ khoá gốc (khi không có kết quả):
+gọi tuần tự (cách cũ) so với ``utils.speculation.Speculation`` (gọi song song),
+theo tỉ lệ từ khoá đã dịch không có kết quả.
+
+    python benchmarks/bench_speculation.py --latency 0.2 --miss-rate 0.3
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.speculation import Speculation  # noqa: E402
+
+
+def is_acceptable(result):
+    return 'errors' in result or 'itemSummaries' in result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--latency', type=float, default=0.05, help='thời gian mỗi lần gọi eBay (giây)')
+    parser.add_argument('--miss-rate', type=float, default=0.3, help='tỉ lệ từ khoá đã dịch không có kết quả')
+    parser.add_argument('--count', type=int, default=40)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    misses = [rng.random() < args.miss_rate for _ in range(args.count)]
+
+    def fetch(found):
+        time.sleep(args.latency)
+        return {'itemSummaries': []} if found else {'total': 0}
+
+    start = time.perf_counter()
+    for miss in misses:
+        result = fetch(not miss)
+        if not is_acceptable(result):
+            fetch(True)
+    sequential = time.perf_counter() - start
+
+    speculation = Speculation(max_workers=4)
+    start = time.perf_counter()
+    for miss in misses:
+        speculation.run(lambda: fetch(not miss), lambda: fetch(True), is_acceptable)
+    speculative = time.perf_counter() - start
+
+    print(f'sequential   {sequential / args.count * 1000:8.1f} ms/search')
+    print(f'speculative  {speculative / args.count * 1000:8.1f} ms/search  x{sequential / speculative:.2f}')
+    print(speculation.stats())
+
+
+if __name__ == '__main__':
+    main()
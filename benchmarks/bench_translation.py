@@ -0,0 +1,76 @@
+"""
+So sánh thời gian dịch tiêu đề của một trang kết quả:
+- Cách cũ: gửi lần lượt từng batch 50 tiêu đề
+- ``translation.Translation``: bỏ tiêu đề trùng, các batch gửi song song, lần sau lấy từ cache
+Translator là ``StubTranslator`` có độ trễ giả lập nên không cần gọi API thật.
+
+    python benchmarks/bench_translation.py --latency 0.3
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'rakutenApi.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from translation import StubTranslator, Translation  # noqa: E402
+
+WORDS = ['Apple', 'iPhone', '13', 'Pro', 'Max', '256GB', 'Unlocked', 'Graphite', 'Sony', 'Camera', 'Lens',
+         'Nikon', 'Vintage', 'Watch', 'Seiko', 'Automatic', 'New', 'Used', 'Sealed', 'Box']
+
+
+def make_titles(total, distinct):
+    pool = [' '.join(random.choices(WORDS, k=8)) + f' #{i}' for i in range(distinct)]
+    return [random.choice(pool) for _ in range(total)]
+
+
+def serial(translator, titles, batch_size=50):
+    translated = []
+    for i in range(0, len(titles), batch_size):
+        batch = titles[i:i + batch_size]
+        translated.extend(translator.translate('\n'.join(batch), dest='vi').text.split('\n'))
+    return translated
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--latency', type=float, default=0.3)
+    parser.add_argument('--titles', type=int, default=200)
+    parser.add_argument('--distinct', type=int, default=150)
+    args = parser.parse_args()
+
+    random.seed(0)
+    titles = make_titles(args.titles, args.distinct)
+
+    stub = StubTranslator(latency=args.latency)
+    start = time.perf_counter()
+    serial(stub, titles)
+    print(f'serial batches        {time.perf_counter() - start:7.3f} s   requests {len(stub.calls)}')
+
+    stub = StubTranslator(latency=args.latency)
+    translation = Translation(translator=stub, max_workers=4, timeout=30, cache_alias='default')
+    translation.shared.clear()
+    start = time.perf_counter()
+    result = translation.translate_many(titles)
+    print(f'Translation (cold)    {time.perf_counter() - start:7.3f} s   requests {len(stub.calls)}')
+    assert result == [f'[vi] {title}' for title in titles]
+
+    start = time.perf_counter()
+    translation.translate_many(titles)
+    print(f'Translation (warm)    {time.perf_counter() - start:7.3f} s   requests {len(stub.calls)}')
+
+    # Trang tiếp theo có một nửa tiêu đề đã dịch ở trang trước
+    next_page = titles[:args.titles // 2] + make_titles(args.titles // 2, args.distinct)
+    start = time.perf_counter()
+    translation.translate_many(next_page)
+    print(f'Translation (half)    {time.perf_counter() - start:7.3f} s   requests {len(stub.calls)}')
+
+
+if __name__ == '__main__':
+    main()
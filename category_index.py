@@ -0,0 +1,177 @@
+import gc
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models.signals import post_delete, post_save
+
+from external.models import External
+
+CATEGORY_INDEX_VERSION_CACHE_NAME = 'category_index_version'
+
+
+class CategoryIndex:
+    """
+    Chỉ mục danh mục trong bộ nhớ lấy từ bảng External: id danh mục -> tên và id danh mục cha.
+    - Tra tên danh mục, chuỗi danh mục cha (breadcrumb) bằng dict, không query DB mỗi request
+    - Nạp toàn bộ bảng khi dùng lần đầu, hoặc trước khi fork worker (``preload``, VD: gunicorn --preload)
+      để các worker dùng chung bộ nhớ (copy-on-write)
+    - External thay đổi trong process thì cập nhật từng danh mục (signal, kết nối trong ``AppConfig.ready``)
+      và tăng version trong cache, các process khác thấy version khác (kiểm tra mỗi ``check_interval`` giây)
+      thì nạp lại toàn bộ
+    - Trường danh mục cha lấy theo setting CATEGORY_INDEX_PARENT_FIELD, model không có trường đó thì không có cha
+    """
+
+    def __init__(self, parent_field=None, check_interval=None):
+        self.parent_field = parent_field or getattr(settings, 'CATEGORY_INDEX_PARENT_FIELD', 'parent')
+        self.check_interval = check_interval or getattr(settings, 'CATEGORY_INDEX_CHECK_INTERVAL', 30)
+        self._names = None
+        self._parents = {}
+        self._categories = {}
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.RLock()
+        self._signals_connected = False
+        self.loads = 0
+        self.updates = 0
+
+    def get_name(self, category_id):
+        return self._get_names().get(str(category_id))
+
+    def get_parent_chain(self, category_id):
+        """Danh sách id từ danh mục hiện tại lên tới danh mục gốc."""
+        names = self._get_names()
+        category_id = str(category_id)
+        chain = []
+        while category_id in names and category_id not in chain:
+            chain.append(category_id)
+            category_id = self._parents.get(category_id)
+        return chain
+
+    def get_breadcrumb(self, category_id):
+        """Danh sách (id, tên) từ danh mục gốc tới danh mục hiện tại."""
+        names = self._get_names()
+        return [(category, names[category]) for category in reversed(self.get_parent_chain(category_id))]
+
+    def load(self):
+        """Nạp lại toàn bộ bảng External."""
+        with self._lock:
+            # Lấy version trước khi đọc bảng: thay đổi trong lúc đang đọc sẽ được nạp ở lần kiểm tra sau
+            version = self._get_shared_version()
+            parent_lookup = self._get_parent_lookup()
+            fields = ('pk', 'category', 'name') + ((parent_lookup,) if parent_lookup else ())
+            names, parents, categories = {}, {}, {}
+            for row in External.objects.values_list(*fields).iterator():
+                category = str(row[1])
+                names[category] = row[2]
+                categories[row[0]] = category
+                if parent_lookup and row[3] is not None:
+                    parents[category] = str(row[3])
+            self._names, self._parents, self._categories = names, parents, categories
+            self._version = version
+            self._checked_at = time.monotonic()
+            self.loads += 1
+
+    def preload(self):
+        """Nạp trước khi fork worker, đưa các object đã nạp ra khỏi GC để worker không ghi vào các trang bộ nhớ đó."""
+        self.load()
+        gc.collect()
+        gc.freeze()
+
+    def invalidate(self, **kwargs):
+        # Các process khác sẽ nạp lại khi thấy version thay đổi
+        try:
+            cache.add(CATEGORY_INDEX_VERSION_CACHE_NAME, 0, None)
+            version = cache.incr(CATEGORY_INDEX_VERSION_CACHE_NAME)
+        except Exception:
+            version = None
+        with self._lock:
+            if version is not None and self._version is not None and version == self._version + 1:
+                self._version = version
+            else:
+                # Process khác đã đổi version trước đó (hoặc không đọc được cache) thì bảng trong process
+                # có thể thiếu thay đổi của process đó, lần tra tiếp theo kiểm tra version và nạp lại
+                self._version = None
+                self._checked_at = 0.0
+
+    def stats(self):
+        return {
+            'categories': len(self._names or ()),
+            'loads': self.loads,
+            'updates': self.updates,
+        }
+
+    def _get_names(self):
+        names = self._names
+        if names is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return names
+        # Chỉ một thread kiểm tra version / nạp lại, các thread khác chờ rồi dùng bảng vừa nạp
+        with self._lock:
+            if self._names is None:
+                self.load()
+            elif time.monotonic() - self._checked_at >= self.check_interval:
+                self._checked_at = time.monotonic()
+                if self._get_shared_version() != self._version:
+                    self.load()
+            return self._names
+
+    def _get_parent_lookup(self):
+        try:
+            field = External._meta.get_field(self.parent_field)
+        except FieldDoesNotExist:
+            return None
+        # Khoá ngoại tới chính External thì lấy id danh mục của bản ghi cha
+        return f'{self.parent_field}__category' if field.is_relation else self.parent_field
+
+    def _get_shared_version(self):
+        try:
+            return cache.get(CATEGORY_INDEX_VERSION_CACHE_NAME)
+        except Exception:
+            return None
+
+    def _on_save(self, instance, **kwargs):
+        if self._names is not None:
+            parent = None
+            parent_lookup = self._get_parent_lookup()
+            if parent_lookup:
+                parent = External.objects.filter(pk=instance.pk).values_list(parent_lookup, flat=True).first()
+            category = str(instance.category)
+            with self._lock:
+                old_category = self._categories.get(instance.pk)
+                if old_category is not None and old_category != category:
+                    self._names.pop(old_category, None)
+                    self._parents.pop(old_category, None)
+                self._categories[instance.pk] = category
+                self._names[category] = instance.name
+                if parent is None:
+                    self._parents.pop(category, None)
+                else:
+                    self._parents[category] = str(parent)
+                self.updates += 1
+        self.invalidate()
+
+    def _on_delete(self, instance, **kwargs):
+        if self._names is not None:
+            with self._lock:
+                category = self._categories.pop(instance.pk, None)
+                if category is not None:
+                    self._names.pop(category, None)
+                    self._parents.pop(category, None)
+                self.updates += 1
+        self.invalidate()
+
+    def connect_signals(self):
+        """
+        Gọi trong ``AppConfig.ready`` của mọi process (kể cả admin, management command) để process nào sửa External
+        cũng tăng version, kể cả khi process đó chưa từng tra danh mục.
+        """
+        if self._signals_connected:
+            return
+        post_save.connect(self._on_save, sender=External, dispatch_uid='category_index_save')
+        post_delete.connect(self._on_delete, sender=External, dispatch_uid='category_index_delete')
+        self._signals_connected = True
+
+
+category_index = CategoryIndex()
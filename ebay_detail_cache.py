@@ -0,0 +1,180 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+
+from ebay_detail_fields import product_detail_serializer
+from utils.cache_vars.product_detail import PRODUCT_DETAIL_CACHE_NAME, PRODUCT_DETAIL_CACHE_TIME
+from utils.lru import MISSING, LRUCache
+
+FRESH = 'fresh'
+STALE = 'stale'
+# Key riêng (có version) cho phần tử (fresh_until, stale_until, data): key cũ PRODUCT_DETAIL_CACHE_NAME chỉ chứa dict,
+# người đọc key cũ (hoặc code cũ khi rollback) không gặp dữ liệu khác định dạng
+PRODUCT_DETAIL_ENTRY_CACHE_NAME = 'product_detail_entry:v1:{item_id}'
+
+
+def get_auction_end_time(data):
+    """Thời điểm kết thúc (time.time()) của sản phẩm đấu giá, None nếu không phải đấu giá hoặc không có itemEndDate."""
+    if 'AUCTION' not in data.get('buyingOptions', ()):
+        return None
+    try:
+        return datetime.fromisoformat(data['itemEndDate'].replace('Z', '+00:00')).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class TierStats:
+    __slots__ = ('hits', 'stale_hits', 'misses')
+
+    def __init__(self):
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def as_dict(self):
+        return {'hits': self.hits, 'stale_hits': self.stale_hits, 'misses': self.misses}
+
+
+class ProductDetailCache:
+    """
+    Cache chi tiết sản phẩm eBay gồm 2 tầng:
+    - Tầng 1: LRU trong process, lưu dạng bytes nên mỗi lần lấy là một bản copy (người gọi có thể sửa data)
+    - Tầng 2: cache framework của django (dùng chung giữa các process)
+    - Cả 2 tầng lưu data đã mã hoá bằng ``CacheSerializer``, chỉ giữ các trường cần dùng (``ebay_detail_fields``)
+
+    Mỗi phần tử lưu (fresh_until, stale_until, data):
+    - Trước fresh_until: dữ liệu mới, dùng luôn
+    - Từ fresh_until tới stale_until: vẫn trả về dữ liệu cũ, người gọi làm mới trong background (``refresh``)
+    - Sản phẩm đấu giá chỉ được cache ngắn (tối đa ``auction_timeout`` giây, không quá thời điểm kết thúc)
+      và không dùng dữ liệu cũ. Đấu giá đã kết thúc thì không thay đổi nữa nên cache như sản phẩm thường
+    """
+
+    def __init__(self, timeout=None, stale_timeout=None, auction_timeout=None,
+                 max_entries=None, max_bytes=None, cache_alias=None, max_workers=None):
+        self.timeout = timeout or PRODUCT_DETAIL_CACHE_TIME
+        self.stale_timeout = stale_timeout or getattr(settings, 'PRODUCT_DETAIL_STALE_TIME', 10 * 60)
+        self.auction_timeout = auction_timeout or getattr(settings, 'PRODUCT_DETAIL_AUCTION_CACHE_TIME', 30)
+        self.local = LRUCache(
+            max_entries=max_entries or getattr(settings, 'PRODUCT_DETAIL_LOCAL_MAX_ENTRIES', 2048),
+            max_bytes=max_bytes or getattr(settings, 'PRODUCT_DETAIL_LOCAL_MAX_BYTES', 64 * 1024 * 1024),
+        )
+        self.cache_alias = cache_alias or getattr(settings, 'PRODUCT_DETAIL_CACHE_ALIAS', 'default')
+        self.max_workers = max_workers or getattr(settings, 'PRODUCT_DETAIL_REFRESH_WORKERS', 2)
+        self.serializer = product_detail_serializer
+        self._executor = None
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.local_stats = TierStats()
+        self.shared_stats = TierStats()
+        self.refreshes = 0
+
+    @property
+    def shared(self):
+        return caches[self.cache_alias]
+
+    def get(self, item_id):
+        """Trả về (data, FRESH / STALE), không có trong cache thì (None, None)."""
+        key = PRODUCT_DETAIL_ENTRY_CACHE_NAME.format(item_id=item_id)
+        now = time.time()
+        entry = self.local.get(key)
+        if entry is not MISSING:
+            fresh_until, stale_until, content = entry
+            state = FRESH if now < fresh_until else STALE
+            self._record(self.local_stats, state)
+            return self.serializer.loads(content), state
+        self._record(self.local_stats, None)
+
+        try:
+            entry = self.shared.get(key)
+            if entry is None:
+                # Dữ liệu do phiên bản cũ lưu ở key cũ (chỉ có data), coi như còn mới, chỉ đọc không ghi lại
+                legacy = self.shared.get(PRODUCT_DETAIL_CACHE_NAME.format(item_id=item_id))
+                if isinstance(legacy, dict):
+                    entry = (now + self.timeout, now + self.timeout, self.serializer.dumps(legacy))
+        except Exception:
+            entry = None
+        if entry is None or now >= entry[1]:
+            self._record(self.shared_stats, None)
+            return None, None
+        fresh_until, stale_until, content = entry
+        data = self.serializer.load_cached(content)
+        if data is None:
+            self._record(self.shared_stats, None)
+            return None, None
+        state = FRESH if now < fresh_until else STALE
+        self._record(self.shared_stats, state)
+        self.local.set(key, (fresh_until, stale_until, content), size=len(content), ttl=stale_until - now)
+        return data, state
+
+    def set(self, item_id, data):
+        key = PRODUCT_DETAIL_ENTRY_CACHE_NAME.format(item_id=item_id)
+        fresh_until, stale_until = self.get_expiry(data)
+        now = time.time()
+        if fresh_until <= now:
+            return
+        content = self.serializer.dumps(data)
+        self.local.set(key, (fresh_until, stale_until, content), size=len(content), ttl=stale_until - now)
+        try:
+            self.shared.set(key, (fresh_until, stale_until, content), max(1, int(stale_until - now)))
+        except Exception:
+            pass
+
+    def get_expiry(self, data):
+        """Trả về (fresh_until, stale_until) của data."""
+        now = time.time()
+        end_time = get_auction_end_time(data)
+        if end_time is not None and end_time > now:
+            fresh_until = min(now + self.auction_timeout, end_time)
+            return fresh_until, fresh_until
+        fresh_until = now + self.timeout
+        return fresh_until, fresh_until + self.stale_timeout
+
+    def refresh(self, key, fetch, *args, **kwargs):
+        """Gọi ``fetch`` trong background để làm mới key (VD: item_id), mỗi key chỉ có một lần làm mới chạy cùng lúc."""
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix='product-detail-refresh'
+                )
+
+        def run():
+            try:
+                fetch(*args, **kwargs)
+                self.refreshes += 1
+            except Exception:
+                pass
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+                connections.close_all()
+
+        self._executor.submit(run)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'local': dict(self.local.stats(), **self.local_stats.as_dict()),
+                'shared': self.shared_stats.as_dict(),
+                'refreshes': self.refreshes,
+                'refreshing': len(self._refreshing),
+            }
+
+    def _record(self, tier_stats, state):
+        with self._lock:
+            if state == FRESH:
+                tier_stats.hits += 1
+            elif state == STALE:
+                tier_stats.stale_hits += 1
+            else:
+                tier_stats.misses += 1
+
+
+product_detail_cache = ProductDetailCache()
@@ -0,0 +1,25 @@
+from django.conf import settings
+
+from utils.cache_serializer import CacheSerializer
+
+# Các trường của chi tiết sản phẩm (Browse API getItem) được lưu vào cache, đổi bằng setting PRODUCT_DETAIL_CACHE_FIELDS
+# Bỏ các trường không dùng tới, lớn nhất là ``taxes`` (thuế theo từng bang / nước, khoảng 1/3 số byte khi pickle)
+PRODUCT_DETAIL_FIELDS = (
+    'itemId', 'legacyItemId', 'title', 'shortDescription', 'description', 'itemWebUrl',
+    'price', 'currentBidPrice', 'marketingPrice', 'bidCount', 'minimumPriceToBid',
+    'buyingOptions', 'itemEndDate', 'lotSize', 'quantityLimitPerBuyer', 'estimatedAvailabilities',
+    'categoryId', 'categoryPath', 'condition', 'conditionId', 'conditionDescription',
+    'image', 'additionalImages', 'brand', 'color', 'localizedAspects', 'primaryProductReviewRating',
+    'seller', 'itemLocation', 'shippingOptions', 'shipToLocations', 'returnTerms', 'authenticityGuarantee',
+)
+
+# Chi tiết lớn hơn số byte này (thường do ``description`` HTML dài) được nén zlib, đổi bằng setting cùng tên.
+# Theo benchmarks/bench_cache_serializer.py: chi tiết ~21 KB nén còn ~2.4 KB, tốn thêm ~85 us khi ghi, ~40 us khi đọc.
+# Chi tiết thông thường (~9 KB) không nén: chỉ giảm ~6 KB mà mỗi lần đọc (kể cả từ LRU trong process) tốn thêm ~30 us
+PRODUCT_DETAIL_COMPRESS_THRESHOLD = 16 * 1024
+
+# Chi tiết sản phẩm lưu trong cache: chỉ các trường trên, nén khi lớn hơn PRODUCT_DETAIL_COMPRESS_THRESHOLD byte
+product_detail_serializer = CacheSerializer(
+    fields=dict.fromkeys(getattr(settings, 'PRODUCT_DETAIL_CACHE_FIELDS', PRODUCT_DETAIL_FIELDS)),
+    compress_threshold=getattr(settings, 'PRODUCT_DETAIL_COMPRESS_THRESHOLD', PRODUCT_DETAIL_COMPRESS_THRESHOLD),
+)
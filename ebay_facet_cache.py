@@ -0,0 +1,73 @@
+import hashlib
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+
+from utils.cache_serializer import CacheSerializer
+from utils.lru import MISSING, LRUCache
+
+EBAY_FACET_CACHE_NAME = 'ebay_facets:{digest}'
+
+
+def make_facet_cache_key(category_ids, filter, aspect_filter):
+    digest = hashlib.sha1(f'{category_ids}\n{filter}\n{aspect_filter}'.encode('utf-8')).hexdigest()
+    return EBAY_FACET_CACHE_NAME.format(digest=digest)
+
+
+class FacetCache:
+    """
+    Cache refinement (categoryDistributions, aspectDistributions, currentCategoryId) đã xử lý của eBay search
+    theo (category_ids, filter, aspect_filter), dùng cho xem danh mục (có category_ids, không có q).
+    - Các trang sau của cùng danh mục chỉ lấy MATCHING_ITEMS từ eBay và dùng lại refinement trong cache
+    - Cache 2 tầng: LRU trong process và cache của django, lưu dạng ``CacheSerializer`` nên mỗi lần lấy là một bản copy
+    """
+
+    def __init__(self, timeout=None, max_entries=None, cache_alias=None):
+        self.timeout = timeout or getattr(settings, 'EBAY_FACET_CACHE_TIME', 15 * 60)
+        self.local = LRUCache(
+            max_entries=max_entries or getattr(settings, 'EBAY_FACET_CACHE_MAX_ENTRIES', 1024),
+            default_ttl=self.timeout,
+        )
+        self.cache_alias = cache_alias or getattr(settings, 'EBAY_FACET_CACHE_ALIAS', 'default')
+        self.serializer = CacheSerializer()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def shared(self):
+        return caches[self.cache_alias]
+
+    def get(self, key):
+        """Refinement đã cache, không có thì None."""
+        content = self.local.get(key)
+        if content is MISSING:
+            try:
+                content = self.shared.get(key)
+            except Exception:
+                content = None
+            if content is not None:
+                self.local.set(key, content)
+        facets = self.serializer.load_cached(content) if content is not None else None
+        with self._lock:
+            if facets is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return facets
+
+    def set(self, key, facets):
+        content = self.serializer.dumps(facets)
+        self.local.set(key, content)
+        try:
+            self.shared.set(key, content, self.timeout)
+        except Exception:
+            pass
+
+    def stats(self):
+        with self._lock:
+            return dict(self.local.stats(), hits=self.hits, misses=self.misses)
+
+
+facet_cache = FacetCache()
@@ -1,23 +1,51 @@
+import copy
+
 import requests
 
 from django.conf import settings
+from django.db import connections
 
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 
+from category_index import category_index
 from ebay.utils import (
     handle_data,
     handle_categories_distributions,
     handle_aspects_distributions,
     ebay_search_result
 )
-from external.models import External
-from key_product.models import KeyProduct
+from ebay_facet_cache import facet_cache, make_facet_cache_key
+from ebay_filter import FilterCompiler, FilterSyntaxError
+from keyword_recorder import keyword_recorder
 from product.throttle import SearchAPIRateThrottle
 from product.utils import handle_params_local_product_search
+from translation import translate_search_keyword
 from utils.functional import is_google_bot
+from utils.singleflight import SingleFlight
+from utils.speculation import Speculation
+
+# Kết quả search có thể bị sửa sau khi trả về nên các request dùng chung sẽ nhận bản copy
+ebay_search_single_flight = SingleFlight(copy_result=copy.deepcopy)
+
+# Search song song từ khoá đã dịch và từ khoá gốc (bật bằng setting EBAY_SEARCH_SPECULATIVE)
+ebay_search_speculation = Speculation(
+    max_workers=getattr(settings, 'EBAY_SEARCH_SPECULATIVE_WORKERS', 8),
+    thread_name_prefix='ebay-search-speculation',
+    on_done=connections.close_all
+)
+
+_filter_compiler = None
+
+
+def get_filter_compiler():
+    # Tạo khi dùng lần đầu, bảng từ viết tắt được chép vào dict để tra cứu nhanh
+    global _filter_compiler
+    if _filter_compiler is None:
+        _filter_compiler = FilterCompiler(get_key_filter, value_of_filter_condition_attribute)
+    return _filter_compiler
 
 
 @api_view(['GET'])
@@ -48,28 +76,10 @@ def search_api(request):
                                 }
                                 return Response(errors, status=status.HTTP_400_BAD_REQUEST)
             else:
-                # nếu có param `clientId` sẽ kiểm tra từ khóa tìm từ client đó có chưa,
-                # nếu chưa sẽ lưu lại client + từ khóa đó
+                # nếu có param `clientId` sẽ lưu lại client + từ khóa đó (bỏ ẩn nếu đã có),
+                # từ khoá được ghi vào DB trong background (xem keyword_recorder)
                 if 'HTTP_CLIENTID' in request.META and request.query_params['q'] != '':
-                    try:
-                        key_search = KeyProduct.objects.get(
-                            name__exact=request.query_params['q'].lower(
-                            ).strip(),
-                            client_id=request.META['HTTP_CLIENTID']
-                        )
-                        if key_search.hidden:
-                            key_search.hidden = False
-                            key_search.save()
-                    except KeyProduct.DoesNotExist:
-                        try:
-                            key_search = KeyProduct.objects.create(
-                                client_id=request.META['HTTP_CLIENTID'],
-                                name=request.query_params['q'].lower().strip(),
-                                limit=1
-                            )
-                            key_search.save()
-                        except Exception:
-                            pass
+                    keyword_recorder.record(request.META['HTTP_CLIENTID'], request.query_params['q'])
 
             response = ebay_search_result(request.query_params)
         if 'errors' in response:
@@ -99,28 +109,31 @@ def search_api(request):
             return Response(data, status=status.HTTP_200_OK)
 
         data['items'] = handle_data(response)
-        categories = handle_categories_distributions(
-            response, request.query_params)
-        aspects = handle_aspects_distributions(response)
-
-        if 'refinement' in response:
-            data['refinement'] = {}
-            if 'dominantCategoryId' in response['refinement']:
-                data['refinement']['currentCategoryId'] = response['refinement']['dominantCategoryId']
-            data['refinement'].update({'categoryDistributions': categories})
-            data['refinement'].update({'aspectDistributions': aspects})
+        if 'facets' in response:
+            # Refinement lấy từ cache của danh mục (eBay chỉ trả về MATCHING_ITEMS)
+            data['refinement'] = response['facets']
         else:
-            data['refinement'] = {}
-            data['refinement']['categoryDistributions'] = categories
-            data['refinement']['aspectDistributions'] = aspects
+            categories = handle_categories_distributions(
+                response, request.query_params)
+            aspects = handle_aspects_distributions(response)
+
+            if 'refinement' in response:
+                data['refinement'] = {}
+                if 'dominantCategoryId' in response['refinement']:
+                    data['refinement']['currentCategoryId'] = response['refinement']['dominantCategoryId']
+                data['refinement'].update({'categoryDistributions': categories})
+                data['refinement'].update({'aspectDistributions': aspects})
+                if 'facet_key' in response:
+                    facet_cache.set(response['facet_key'], data['refinement'])
+            else:
+                data['refinement'] = {}
+                data['refinement']['categoryDistributions'] = categories
+                data['refinement']['aspectDistributions'] = aspects
 
         if 'q' not in request.query_params and 'category_ids' in request.query_params:
-            try:
-                cat = External.objects.get(
-                    category=request.query_params['category_ids'])
-                data['category_name'] = cat.name
-            except External.DoesNotExist:
-                pass
+            category_name = category_index.get_name(request.query_params['category_ids'])
+            if category_name is not None:
+                data['category_name'] = category_name
 
         if 'errors' in response:
             return Response(response, status=status.HTTP_400_BAD_REQUEST)
@@ -141,6 +154,25 @@ def search_api(request):
         return Response(data, status=status.HTTP_200_OK)
 
 
+def is_acceptable_search_result(products_parse):
+    # Có lỗi thì trả về lỗi, không search lại bằng từ khoá gốc
+    return 'errors' in products_parse or 'itemSummaries' in products_parse
+
+
+def fetch_ebay_search(ebay_search_endpoint, request=None):
+    """
+    Gọi eBay search và parse kết quả.
+    Các request cùng endpoint tới cùng lúc chỉ gọi sang eBay một lần (single-flight).
+    """
+    key = (ebay_search_endpoint, request is not None and is_google_bot(request))
+    return ebay_search_single_flight.do(key, _fetch_ebay_search, ebay_search_endpoint, request=request)
+
+
+def _fetch_ebay_search(ebay_search_endpoint, request=None):
+    products = hub_product(ebay_search_endpoint, request=request)
+    return json.loads(products.content)
+
+
 def ebay_search_result(xabay_params, **kwargs):
     request = kwargs.get('request')
     # check condition: q
@@ -153,6 +185,7 @@ def ebay_search_result(xabay_params, **kwargs):
 
     q = ''
     keyword_from = keyword_to = trans_from_lang = None
+    translated = False
     if 'q' in xabay_params and xabay_params['q']:
         keyword_from = xabay_params['q']
         query_search = urllib.parse.unquote(xabay_params['q'])
@@ -185,6 +218,7 @@ def ebay_search_result(xabay_params, **kwargs):
                 q = 'q=' + xabay_params['q']
             else:
                 q = 'q=' + keyword_to
+                translated = keyword_to.strip().lower() != xabay_params['q'].strip().lower()
     # check condition: gtin
     # Trường này cho phép bạn tìm kiếm theo Số thương phẩm toàn cầu của mặt hàng được xác định bởi
     # https://www.gtin.info. Bạn chỉ có thể tìm kiếm theo UPC (Mã sản phẩm chung).
@@ -238,76 +272,13 @@ def ebay_search_result(xabay_params, **kwargs):
     # Trường này hỗ trợ các bộ lọc trường dữ liệu, có thể được sử dụng để giới hạn / tùy chỉnh tập kết quả.
     # VD: search?q=shirt&filter=price:[10..50],priceCurrency:USD
     # mặc định sẽ lọc theo tình trạng mua: mua ngay, đấu giá và trả giá
-    filter = '&filter=buyingOptions:{FIXED_PRICE|AUCTION|BEST_OFFER},'
-    if 'filter' in xabay_params:
-
-        # Nếu có lọc theo buyingOtions thì bỏ giá trị mặc định và lấy giá trị hiện tại
-        if 'bO' in xabay_params['filter']:
-            filter = '&filter='
-
-        # Tách từng điều kiện theo dấu ',' để check từ khóa truyền lên là gì
-        # VD: &filter=p:[10..20],pC:USD => filter_conditions = ['p:[10..20]', 'pC:USD']
-        filter_conditions = xabay_params['filter'].split(',')
-
-        # đối với mỗi phần tử trong list filter_conditions tách nó thành 1 list 2 phần tu để so sánh tiếp
-        # vd: 'p:[10..20]' => ['p', '[10..20]'], 'pC:USD' => ['pC', 'USD']
-        for obj_filter in filter_conditions:
-            keys = obj_filter.split(':')
-
-            # lay gia tri day du. VD: p ~ price, pC ~ priceCurrency, bO ~ buyingOptions,...
-            key = get_key_filter(keys[0])
-            if key == 'sellers':
-                filter += key + ':' + keys[1] + ','
-            elif key == 'conditionIds':
-                filter += key + ':' + keys[1] + ','
-
-            # Nếu điều kiện là một object từ viết tắt thì sẽ lấy từng phần tử trong đó đi so sánh
-            # với danh sách từ viết tắt. Nếu map thì lấy giá trị của từ viết tắt đó, không thì không lấy
-
-            # check điều kiện lọc là 1 list
-            # Nếu điều kiện là một list thì giữ nguyên
-            if keys[1][0] == '[' and keys[1][-1] == ']':
-                value_param = key + ':' + keys[1] + ','
-            # check điều kiện lọc là 1 obj
-            elif keys[1][0] == '{' and keys[1][-1] == '}':
-
-                # tạo một mảng rỗng để khi lấy được giá trị của từ viết tắt sẽ đẩy vào mảng này
-                arr = []
-                value_list = keys[1][1:-1].split('|')
-                if key in value_of_filter_condition_attribute.keys():
-                    for value in value_list:
-                        for k, v in value_of_filter_condition_attribute[key].items():
-                            if value == k:
-                                arr.append(v)
-                # nếu mảng giá trị trên không có, sẽ lấy giá trị buyingOptions mặc định là tất cả
-                # ngược lại sẽ lấy theo các giá trị trong mảng
-                if not arr:
-                    if keys[0] == 'bO':
-                        value_param = 'buyingOptions:{FIXED_PRICE|AUCTION|BEST_OFFER},'
-                    else:
-                        value_param = ''
-                elif len(arr) == 1:
-                    value_param = key + ':{' + arr[0] + '},'
-                elif len(arr) == 2:
-                    value_param = key + ':{' + arr[0] + '|' + arr[1] + '},'
-                else:
-                    value_param = key + \
-                        ':{' + arr[0] + '|' + arr[1] + '|' + arr[2] + '},'
-
-            # Check điều kiện lọc là 1 chuỗi
-            # Nếu đúng thì xem chuỗi đó có trong danh sách từ viết tắt ko
-            # Nếu không có trong danh sách viết tắt thì giữ nguyên chuỗi
-            # Ngược lại sẽ lấy giá trị của từ viết tắt đó
-            else:
-                if key not in value_of_filter_condition_attribute.keys():
-                    pass
-                else:
-                    for k, v in value_of_filter_condition_attribute[key].items():
-                        if k == keys[1]:
-                            keys[1] = v
-                value_param = key + ':' + keys[1] + ','
-
-            filter += value_param
+    # Chuỗi filter viết tắt được đổi sang filter của eBay bằng ``ebay_filter.FilterCompiler``
+    # (từ viết tắt: p ~ price, pC ~ priceCurrency, bO ~ buyingOptions,...), kết quả được cache theo chuỗi đầu vào.
+    # Filter sai cú pháp thì bỏ qua, chỉ lọc theo buyingOptions mặc định
+    try:
+        filter = '&filter=' + get_filter_compiler().compile(xabay_params.get('filter'))
+    except FilterSyntaxError:
+        filter = '&filter=' + get_filter_compiler().compile('')
     # print(filter)
 
     # check condition: sort
@@ -362,25 +333,46 @@ def ebay_search_result(xabay_params, **kwargs):
     if 'epid' in xabay_params:
         epid = '&epid=' + xabay_params['epid']
 
+    # Xem danh mục (có category_ids, không có q): refinement của danh mục ít thay đổi giữa các trang,
+    # nếu đã có trong cache thì chỉ lấy MATCHING_ITEMS, refinement lấy từ cache (xem search_api)
+    facets = facet_key = None
+    if 'q' not in xabay_params and 'category_ids' in xabay_params and 'fieldgroups' not in xabay_params:
+        facet_key = make_facet_cache_key(xabay_params['category_ids'], filter, aspect_filter)
+        facets = facet_cache.get(facet_key)
+        if facets is not None:
+            fieldgroups = '&fieldgroups=MATCHING_ITEMS'
+
     ebay_search_endpoint = settings.EBAY_ENVIRON + '/buy/browse/v1/item_summary/search?' + q + gtin \
         + charity_ids + fieldgroups + compatibility_filter \
         + auto_correct + category_ids + filter + sort \
         + limit + offset + aspect_filter + epid
+    # Từ khoá đã dịch không có kết quả thì search lại bằng từ khoá gốc
+    raw_search_endpoint = None
+    if 'q' in xabay_params:
+        raw_search_endpoint = settings.EBAY_ENVIRON + '/buy/browse/v1/item_summary/search?q=' + xabay_params['q'] \
+            + gtin + charity_ids + fieldgroups + compatibility_filter \
+            + auto_correct + category_ids + filter + sort \
+            + limit + offset + aspect_filter + epid
     # print(ebay_search_endpoint)
-    products = hub_product(ebay_search_endpoint, request=request)
-    products_parse = json.loads(products.content)
-
-    if 'errors' not in products_parse:
-        if 'itemSummaries' not in products_parse and 'q' in xabay_params:
-            ebay_search_endpoint = settings.EBAY_ENVIRON + '/buy/browse/v1/item_summary/search?q=' + xabay_params['q'] \
-                + gtin + charity_ids + fieldgroups + compatibility_filter \
-                + auto_correct + category_ids + filter + sort \
-                + limit + offset + aspect_filter + epid
-            products = hub_product(ebay_search_endpoint, request=request)
-            products_parse = json.loads(products.content)
+    if translated and getattr(settings, 'EBAY_SEARCH_SPECULATIVE', False):
+        # Gửi song song cả 2 request, vẫn ưu tiên kết quả của từ khoá đã dịch
+        products_parse = ebay_search_speculation.run(
+            lambda: fetch_ebay_search(ebay_search_endpoint, request=request),
+            lambda: fetch_ebay_search(raw_search_endpoint, request=request),
+            is_acceptable_search_result
+        )
+    else:
+        products_parse = fetch_ebay_search(ebay_search_endpoint, request=request)
+        if not is_acceptable_search_result(products_parse) and raw_search_endpoint is not None:
+            products_parse = fetch_ebay_search(raw_search_endpoint, request=request)
     # else:
     #     print(products_parse)
 
+    if 'errors' not in products_parse:
+        if facets is not None:
+            products_parse['facets'] = facets
+        elif facet_key is not None:
+            products_parse['facet_key'] = facet_key
     products_parse['keyword_from'] = keyword_from
     products_parse['keyword_to'] = keyword_to
     products_parse['trans_from_lang'] = trans_from_lang
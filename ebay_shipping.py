@@ -0,0 +1,163 @@
+import xml.etree.ElementTree as ElementTree
+from decimal import Decimal
+
+from utils.cache_serializer import CacheSerializer
+
+# Chỉ giữ những trường ``handle_from_ship_data_after_get`` đọc tới, None là trường lá (lấy text / attribute)
+SHIPPING_OPTION_FIELDS = {
+    'ShippingServiceName': None,
+    'ShippingServiceCost': None,
+    'ShippingServiceAdditionalCost': None,
+    'ShippingServicePriority': None,
+    'EstimatedDeliveryMinTime': None,
+    'EstimatedDeliveryMaxTime': None,
+}
+SHIPPING_COST_SUMMARY_FIELDS = {
+    'ShippingServiceName': None,
+    'ShippingServiceCost': None,
+    'ListedShippingServiceCost': None,
+    'ShippingType': None,
+    'EstimatedDeliveryMinTime': None,
+    'EstimatedDeliveryMaxTime': None,
+}
+GET_SHIPPING_COSTS_FIELDS = {
+    'Ack': None,
+    'Errors': {
+        'ShortMessage': None,
+        'LongMessage': None,
+        'ErrorCode': None,
+        'SeverityCode': None,
+    },
+    'ShippingDetails': {
+        'ShippingServiceOption': SHIPPING_OPTION_FIELDS,
+        'InternationalShippingServiceOption': SHIPPING_OPTION_FIELDS,
+    },
+    'ShippingCostSummary': SHIPPING_COST_SUMMARY_FIELDS,
+}
+
+# Dữ liệu ship lưu trong cache, ``parse_get_shipping_costs`` đã chỉ giữ các trường trên nên không cần lọc lại
+shipping_data_serializer = CacheSerializer()
+
+
+def _local_name(tag):
+    # Bỏ namespace: {urn:ebay:apis:eBLBaseComponents}Ack -> Ack
+    return tag.rpartition('}')[2]
+
+
+def _leaf_to_value(element):
+    text = element.text.strip() if element.text else ''
+    if not element.attrib:
+        return text or None
+    value = {'@' + name: attribute for name, attribute in element.attrib.items()}
+    if text:
+        value['#text'] = text
+    return value
+
+
+def _element_to_dict(element, fields):
+    """
+    Đổi element sang dict cùng dạng với ``xmltodict`` (``@currencyID``, ``#text``, 1 phần tử là dict,
+    nhiều phần tử cùng tên là list) nhưng chỉ với các trường có trong ``fields``.
+    """
+    result = {}
+    for child in element:
+        name = _local_name(child.tag)
+        if name not in fields:
+            continue
+        child_fields = fields[name]
+        value = _leaf_to_value(child) if child_fields is None else _element_to_dict(child, child_fields)
+        if name in result:
+            if isinstance(result[name], list):
+                result[name].append(value)
+            else:
+                result[name] = [result[name], value]
+        else:
+            result[name] = value
+    return result
+
+
+def parse_get_shipping_costs(content):
+    """
+    Đọc response XML của GetShippingCosts (Shopping API) trong một lần parse,
+    thay cho ``xmltodict.parse`` + ``json.dumps`` + ``json.loads``.
+    - content: bytes hoặc str của response
+    - Trả về dict dạng ``{'GetShippingCostsResponse': {...}}`` giống ``xmltodict`` nhưng chỉ có các trường trong
+      ``GET_SHIPPING_COSTS_FIELDS``, nên các hàm xử lý ship hiện tại và dữ liệu đã cache vẫn dùng được
+    - Parse cả cây rồi mới lọc, không đọc theo sự kiện: response chỉ vài KB, cây do C dựng nhanh hơn gọi callback
+      Python cho từng element. Trên fixture 3 KB (benchmarks/bench_ebay_shipping_xml.py): cả cây ~110-155 us,
+      iterparse + ``clear`` ~210-230 us, ``XMLParser(target=...)`` ~225-235 us; bộ nhớ tối đa 34 KB,
+      36 KB và 25 KB
+    """
+    root = ElementTree.fromstring(content)
+    return {_local_name(root.tag): _element_to_dict(root, GET_SHIPPING_COSTS_FIELDS)}
+
+
+class ShippingOption:
+    """
+    Một option ship (ShippingServiceOption, InternationalShippingServiceOption hoặc ShippingCostSummary)
+    đã được đọc sẵn: giá là Decimal (chính xác, dùng để chọn option rẻ nhất, trả về
+    và so sánh với ListedShippingServiceCost), ``is_eligible`` là option có được tính là ship hay không.
+    """
+    __slots__ = ('name', 'cost', 'currency', 'min_delivery', 'max_delivery')
+
+    EXCLUDED_SERVICES = frozenset(('Local Pickup', 'Freight'))
+
+    def __init__(self, name, cost, currency, min_delivery=None, max_delivery=None):
+        self.name = name
+        self.cost = cost
+        self.currency = currency
+        self.min_delivery = min_delivery
+        self.max_delivery = max_delivery
+
+    @staticmethod
+    def parse_amount(amount):
+        """``{'@currencyID': 'USD', '#text': '4.99'}`` -> ('USD', Decimal('4.99')), thiếu giá trị nào thì là None."""
+        if not isinstance(amount, dict):
+            return None, None
+        text = amount.get('#text')
+        return amount.get('@currencyID'), Decimal(text) if text is not None else None
+
+    @classmethod
+    def from_dict(cls, obj):
+        currency, cost = cls.parse_amount(obj.get('ShippingServiceCost'))
+        return cls(
+            obj.get('ShippingServiceName'), cost, currency,
+            obj.get('EstimatedDeliveryMinTime'), obj.get('EstimatedDeliveryMaxTime'),
+        )
+
+    @property
+    def is_eligible(self):
+        # Không tính Local Pickup và Freight là option ship
+        return self.name is not None and self.name not in self.EXCLUDED_SERVICES
+
+    def to_ship_obj(self):
+        """Object ship theo dạng ``shippingOptions`` của Browse API."""
+        ship_obj = {'shippingServiceCode': self.name, 'shippingCost': {}}
+        if self.cost is not None:
+            ship_obj['shippingCost']['currency'] = self.currency
+            ship_obj['shippingCost']['value'] = str(self.cost)
+        if self.min_delivery is not None and self.max_delivery is not None:
+            ship_obj['minEstimatedDeliveryDate'] = self.min_delivery
+            ship_obj['maxEstimatedDeliveryDate'] = self.max_delivery
+        return ship_obj
+
+    def __repr__(self):
+        return f'<ShippingOption {self.name!r} {self.cost} {self.currency}>'
+
+
+def select_cheapest_option(shipping_options, currency='USD'):
+    """
+    Chọn option rẻ nhất có giá theo ``currency`` trong một lần duyệt, bỏ qua Local Pickup và Freight.
+    - shipping_options: list option dạng dict (ShippingServiceOption / InternationalShippingServiceOption)
+    - Mỗi option được đọc thành ``ShippingOption``, so sánh giá Decimal, nhiều option cùng giá thì lấy option đứng trước
+    - Option thiếu tên, giá hoặc đơn vị tiền tệ thì bỏ qua
+    - Không có option nào phù hợp thì trả về None
+    """
+    cheapest = None
+    for obj in shipping_options:
+        option = ShippingOption.from_dict(obj)
+        if option.currency != currency or option.cost is None or not option.is_eligible:
+            continue
+        if cheapest is None or option.cost < cheapest.cost:
+            cheapest = option
+    return cheapest
@@ -0,0 +1,248 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models.signals import post_delete, post_save
+
+from ebay.hub import refesh_auth_token
+from user_api.models import UserApi
+
+EBAY_APP_TOKEN_CACHE_NAME = 'ebay_app_token_{app_id}'
+EBAY_APP_TOKEN_LOCK_CACHE_NAME = 'ebay_app_token_lock_{app_id}'
+# Version của các UserApi, tăng khi UserApi thay đổi để các process khác nạp lại app
+EBAY_APP_VERSION_CACHE_NAME = 'ebay_app_version'
+
+
+class AppToken:
+    """Token hiện tại của một UserApi, expires_at là thời điểm hết hạn (time.time())."""
+    __slots__ = ('token', 'expires_at', 'checked_at')
+
+    def __init__(self, token, expires_at, checked_at=0.0):
+        self.token = token
+        self.expires_at = expires_at
+        self.checked_at = checked_at
+
+
+class EbayTokenManager:
+    """
+    Quản lý app (UserApi) và access token dùng để gọi eBay API.
+    - App được giữ trong bộ nhớ, không query DB mỗi lần gọi API. UserApi thay đổi thì tăng version trong cache,
+      các process thấy version khác (kiểm tra mỗi ``check_interval`` giây) thì nạp lại app từ DB
+    - Token dùng chung giữa các thread qua bộ nhớ và giữa các process qua cache
+      (chỉ kiểm tra lại cache sau mỗi ``check_interval`` giây)
+    - Token sắp hết hạn (còn ít hơn ``refresh_margin`` giây) được làm mới trong background
+    - Token lấy từ DB (chưa có trong cache) không biết được làm mới lúc nào nên coi như còn hạn ``lifetime`` giây
+      như trước đây (chỉ làm mới khi eBay trả về "Invalid token."), thời điểm hết hạn được ghi vào cache
+      để các process dùng chung, process mới start không phải làm mới token
+    - Mỗi app chỉ có một lần làm mới chạy cùng lúc: khoá thread trong process và khoá ``cache.add`` giữa các process.
+      Process không lấy được khoá sẽ chờ token mới xuất hiện trong cache tối đa ``wait_timeout`` giây
+    """
+
+    def __init__(self, lifetime=None, refresh_margin=None, check_interval=None, lock_timeout=None,
+                 wait_timeout=None):
+        self.lifetime = lifetime or getattr(settings, 'EBAY_TOKEN_LIFETIME', 2 * 60 * 60)
+        self.refresh_margin = refresh_margin or getattr(settings, 'EBAY_TOKEN_REFRESH_MARGIN', 5 * 60)
+        self.check_interval = check_interval or getattr(settings, 'EBAY_TOKEN_CHECK_INTERVAL', 5)
+        self.lock_timeout = lock_timeout or getattr(settings, 'EBAY_TOKEN_LOCK_TIMEOUT', 30)
+        # Thời gian request chờ process khác làm mới token, nhỏ hơn nhiều so với timeout của request
+        self.wait_timeout = wait_timeout or getattr(settings, 'EBAY_TOKEN_WAIT_TIMEOUT', 3)
+        self._apps = {}
+        self._tokens = {}
+        self._locks = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._signals_connected = False
+        self._version = None
+        self._version_checked_at = 0.0
+        self.refreshes = 0
+        self.background_refreshes = 0
+
+    def get_app(self, is_bot_request=False):
+        self._check_version()
+        app = self._apps.get(is_bot_request)
+        if app is None:
+            app = self._apps[is_bot_request] = UserApi.objects.get(default=True, is_app_for_bot=is_bot_request)
+        return app
+
+    def get_token(self, app):
+        """Token hiện tại của app, nếu sắp hết hạn thì làm mới trong background và vẫn trả về token hiện tại."""
+        now = time.time()
+        app_token = self._tokens.get(app.pk)
+        if app_token is None or now - app_token.checked_at >= self.check_interval:
+            app_token = self._load_token(app, now)
+        if app_token.expires_at - now < self.refresh_margin:
+            self._refresh_in_background(app)
+        return app_token.token
+
+    def get_credentials(self, is_bot_request=False):
+        app = self.get_app(is_bot_request)
+        return app, self.get_token(app)
+
+    def refresh(self, app, stale_token=None):
+        """
+        Làm mới token của app (VD: khi eBay trả về "Invalid token.").
+        - stale_token: token vừa bị từ chối, nếu token hiện tại đã khác thì có thread / process khác làm mới rồi
+        - Trả về token mới, None nếu không làm mới được
+        """
+        with self._get_lock(app.pk):
+            now = time.time()
+            app_token = self._load_token(app, now)
+            if stale_token is not None and app_token.token != stale_token:
+                return app_token.token
+            # Làm mới trong background: process / thread khác có thể đã làm mới xong
+            if stale_token is None and app_token.expires_at - now >= self.refresh_margin:
+                return app_token.token
+
+            lock_name = EBAY_APP_TOKEN_LOCK_CACHE_NAME.format(app_id=app.pk)
+            if not self._add_lock(lock_name):
+                return self._wait_for_token(app, app_token.token)
+            try:
+                new_access_token = refesh_auth_token(app)
+                if new_access_token is None:
+                    return None
+                app.token = new_access_token
+                app.save()
+                self._store_token(app, AppToken(new_access_token, time.time() + self.lifetime))
+                self.refreshes += 1
+                return new_access_token
+            finally:
+                try:
+                    cache.delete(lock_name)
+                except Exception:
+                    pass
+
+    def invalidate(self, **kwargs):
+        # UserApi thay đổi thì nạp lại app và token từ DB ở lần gọi sau, các process khác thấy version mới cũng nạp lại
+        try:
+            cache.add(EBAY_APP_VERSION_CACHE_NAME, 0, None)
+            version = cache.incr(EBAY_APP_VERSION_CACHE_NAME)
+        except Exception:
+            version = None
+        with self._lock:
+            self._apps.clear()
+            self._tokens.clear()
+            self._version = version
+
+    def stats(self):
+        return {
+            'refreshes': self.refreshes,
+            'background_refreshes': self.background_refreshes,
+            'refreshing': len(self._refreshing),
+        }
+
+    def _check_version(self):
+        now = time.monotonic()
+        if now - self._version_checked_at < self.check_interval:
+            return
+        self._version_checked_at = now
+        try:
+            version = cache.get(EBAY_APP_VERSION_CACHE_NAME)
+        except Exception:
+            return
+        if version != self._version:
+            with self._lock:
+                self._apps.clear()
+                self._tokens.clear()
+                self._version = version
+
+    def _load_token(self, app, now):
+        try:
+            shared = cache.get(EBAY_APP_TOKEN_CACHE_NAME.format(app_id=app.pk))
+        except Exception:
+            shared = None
+        app_token = self._tokens.get(app.pk)
+        if shared is not None:
+            token, expires_at = shared
+            if app_token is None or app_token.token != token:
+                app.token = token
+            app_token = AppToken(token, expires_at, now)
+        elif app_token is None:
+            # Token lấy từ DB không biết được làm mới lúc nào nên coi như còn hạn ``lifetime`` giây,
+            # ghi vào cache (process ghi trước được giữ) để các process khác dùng cùng thời điểm hết hạn
+            app_token = AppToken(app.token, now + self.lifetime, now)
+            self._add_token(app, app_token)
+        else:
+            app_token.checked_at = now
+        self._tokens[app.pk] = app_token
+        return app_token
+
+    def _store_token(self, app, app_token):
+        app_token.checked_at = time.time()
+        self._tokens[app.pk] = app_token
+        try:
+            cache.set(
+                EBAY_APP_TOKEN_CACHE_NAME.format(app_id=app.pk),
+                (app_token.token, app_token.expires_at),
+                max(1, int(app_token.expires_at - time.time()))
+            )
+        except Exception:
+            pass
+
+    def _add_token(self, app, app_token):
+        try:
+            cache.add(
+                EBAY_APP_TOKEN_CACHE_NAME.format(app_id=app.pk),
+                (app_token.token, app_token.expires_at),
+                max(1, int(app_token.expires_at - time.time()))
+            )
+        except Exception:
+            pass
+
+    def _refresh_in_background(self, app):
+        with self._lock:
+            if app.pk in self._refreshing:
+                return
+            self._refreshing.add(app.pk)
+
+        def run():
+            try:
+                self.refresh(app)
+                self.background_refreshes += 1
+            except Exception:
+                pass
+            finally:
+                with self._lock:
+                    self._refreshing.discard(app.pk)
+                connections.close_all()
+
+        threading.Thread(target=run, name=f'ebay-token-refresh-{app.pk}', daemon=True).start()
+
+    def _wait_for_token(self, app, current_token):
+        # Process khác đang làm mới token, chờ token mới được ghi vào cache
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.1)
+            app_token = self._load_token(app, time.time())
+            if app_token.token != current_token:
+                return app_token.token
+        return None
+
+    def _add_lock(self, lock_name):
+        try:
+            return cache.add(lock_name, 1, self.lock_timeout)
+        except Exception:
+            # Không dùng được cache thì chỉ khoá trong process
+            return True
+
+    def _get_lock(self, app_id):
+        with self._lock:
+            lock = self._locks.get(app_id)
+            if lock is None:
+                lock = self._locks[app_id] = threading.Lock()
+            return lock
+
+    def connect_signals(self):
+        """
+        Gọi trong ``AppConfig.ready`` của mọi process (kể cả admin, management command) để process nào sửa UserApi
+        cũng tăng version, kể cả khi process đó chưa từng gọi eBay.
+        """
+        if self._signals_connected:
+            return
+        post_save.connect(self.invalidate, sender=UserApi, dispatch_uid='ebay_token_manager_save')
+        post_delete.connect(self.invalidate, sender=UserApi, dispatch_uid='ebay_token_manager_delete')
+        self._signals_connected = True
+
+
+ebay_token_manager = EbayTokenManager()
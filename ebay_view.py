@@ -1,27 +1,40 @@
+import copy
 import json
 import re
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
 import unidecode
-import xmltodict
 from django.conf import settings
 from django.core.cache import cache
+from django.db import connections, transaction
 
-from ebay.hub import hub_product, refesh_auth_token
+from ebay.hub import hub_product
 from ebay.utils import is_item_in_american
+from ebay_detail_cache import STALE, product_detail_cache
+from ebay_shipping import (
+    ShippingOption,
+    parse_get_shipping_costs,
+    select_cheapest_option,
+    shipping_data_serializer
+)
+from ebay_token import ebay_token_manager
 from product.models import Product
 from xanhluc.tasks import debug
-from translators.views import translator as t
-from user_api.models import UserApi
+from translation import translation
 from utils.cache_vars.get_shipping_data import (
     ITEM_SHIPPING_DATA_TIME_CACHE,
     ITEM_SHIPPING_DATA_CACHE_NAME
 )
-from utils.cache_vars.product_detail import (
-    PRODUCT_DETAIL_CACHE_NAME,
-    PRODUCT_DETAIL_CACHE_TIME
-)
+from utils.cache_vars.product_detail import PRODUCT_DETAIL_CACHE_NAME
+from utils.singleflight import SingleFlight
+
+# Encoder dùng lại cho mọi sản phẩm: không kiểm tra vòng lặp tham chiếu, không có khoảng trắng thừa
+_json_encoder = json.JSONEncoder(check_circular=False, separators=(',', ':'))
+
+# Chi tiết sản phẩm bị sửa (thêm shippingOptions, ...) sau khi lấy nên các request dùng chung nhận bản copy
+product_detail_single_flight = SingleFlight(copy_result=copy.deepcopy)
 
 
 def conver_url(url_link):
@@ -29,39 +42,46 @@ def conver_url(url_link):
     return re.sub(r'[\W_]+', '-', text)
 
 
+def get_shipping_data_cache_name(item_id, country_code, postal_code=''):
+    return ITEM_SHIPPING_DATA_CACHE_NAME.format(
+        item_id=item_id, country_code=country_code, postal_code=postal_code
+    )
+
+
 def request_ebay_api_get_shipping_data(item_id, quantity, is_bot_request, **kwargs):
     """
     - Hàm request qua eBay API để lấy thông tin ship
     - Dùng trong trường hợp API sản phẩm không trả về thông tin ship hoặc có nhưng itemLocation không phải US
     """
-
-    def execute(_url, _data, _headers):
-        response = requests.post(_url, data=_data, headers=_headers)
-        parse = xmltodict.parse(response.text)
-        dumps = json.dumps(parse)
-        result = json.loads(dumps)
-        return result
-
     country_code = kwargs.get('country_code')
     postal_code = kwargs.get('postal_code', '')
     # nếu có thông tin ship trong cache thì lấy và trả về luôn, ko cần request qua eBay
-    shipping_data_cache_name = ITEM_SHIPPING_DATA_CACHE_NAME.format(
-        item_id=item_id, country_code=country_code, postal_code=postal_code
-    )
+    shipping_data_cache_name = get_shipping_data_cache_name(item_id, country_code, postal_code)
     try:
-        shipping_data = cache.get(shipping_data_cache_name)
+        shipping_data = shipping_data_serializer.load_cached(cache.get(shipping_data_cache_name))
     except Exception:
         shipping_data = None
 
     if shipping_data is not None:
         return shipping_data
 
-    app = UserApi.objects.get(default=True, is_app_for_bot=is_bot_request)
+    app = ebay_token_manager.get_app(is_bot_request)
+    return _request_shipping_data_from_ebay(
+        app, item_id, quantity, is_bot_request, country_code, postal_code, shipping_data_cache_name
+    )
 
+
+def _request_shipping_data_from_ebay(app, item_id, quantity, is_bot_request, country_code, postal_code,
+                                     shipping_data_cache_name):
+    def execute(_url, _data, _headers):
+        response = requests.post(_url, data=_data, headers=_headers)
+        return parse_get_shipping_costs(response.content)
+
+    token = ebay_token_manager.get_token(app)
     item_legacy_id = item_id.split('|')[1]
     url = 'https://open.api.ebay.com/shopping'
     headers = {
-        "X-EBAY-API-IAF-TOKEN": "Bearer " + app.token,
+        "X-EBAY-API-IAF-TOKEN": "Bearer " + token,
         "X-EBAY-API-SITE-ID": "0",
         "X-EBAY-API-CALL-NAME": "GetShippingCosts",
         "X-EBAY-API-VERSION": "863",
@@ -84,18 +104,19 @@ def request_ebay_api_get_shipping_data(item_id, quantity, is_bot_request, **kwar
             and 'Ack' in shipping_data['GetShippingCostsResponse'] \
             and shipping_data['GetShippingCostsResponse']['Ack'] == 'Failure' \
             and shipping_data['GetShippingCostsResponse']['Errors']['ShortMessage'] == 'Invalid token.':
-        new_access_token = refesh_auth_token(app)
+        # Nhiều request cùng bị "Invalid token." thì chỉ một request làm mới token, các request khác dùng lại
+        new_access_token = ebay_token_manager.refresh(app, stale_token=token)
         if new_access_token is not None:
-            app.token = new_access_token
-            app.save()
-            headers['X-EBAY-API-IAF-TOKEN'] = "Bearer " + app.token
+            headers['X-EBAY-API-IAF-TOKEN'] = "Bearer " + new_access_token
             shipping_data = execute(url, data, headers)
 
     elif 'GetShippingCostsResponse' in shipping_data \
             and 'Ack' in shipping_data['GetShippingCostsResponse'] \
             and shipping_data['GetShippingCostsResponse']['Ack'] == 'Success':
         try:
-            cache.set(shipping_data_cache_name, shipping_data, ITEM_SHIPPING_DATA_TIME_CACHE)
+            cache.set(
+                shipping_data_cache_name, shipping_data_serializer.dumps(shipping_data), ITEM_SHIPPING_DATA_TIME_CACHE
+            )
         except Exception:
             pass
     else:
@@ -104,6 +125,63 @@ def request_ebay_api_get_shipping_data(item_id, quantity, is_bot_request, **kwar
     return shipping_data
 
 
+def request_ebay_api_get_shipping_data_bulk(shipping_requests, is_bot_request=False, max_workers=None):
+    """
+    - Lấy thông tin ship của nhiều sản phẩm cùng lúc (VD: các sản phẩm ngoài US trong một trang kết quả search)
+    - shipping_requests: list các (item_id, quantity, country_code, postal_code)
+    - Lấy những sản phẩm đã có trong cache trước bằng một lần ``cache.get_many``,
+      các sản phẩm còn lại gọi GetShippingCosts song song, tối đa ``EBAY_SHIPPING_CONCURRENCY`` request cùng lúc
+    - Kết quả trả về theo đúng thứ tự của shipping_requests.
+      Request nào bị lỗi thì lỗi được raise lại sau khi các request khác đã xong (giống khi gọi từng sản phẩm)
+    """
+    shipping_requests = [
+        (item_id, quantity, country_code, postal_code or '')
+        for item_id, quantity, country_code, postal_code in shipping_requests
+    ]
+    cache_names = [
+        get_shipping_data_cache_name(item_id, country_code, postal_code)
+        for item_id, quantity, country_code, postal_code in shipping_requests
+    ]
+    try:
+        cached = cache.get_many(set(cache_names))
+    except Exception:
+        cached = {}
+
+    results = [shipping_data_serializer.load_cached(cached.get(cache_name)) for cache_name in cache_names]
+    # Cùng một sản phẩm xuất hiện nhiều lần thì chỉ request một lần
+    missing = {}
+    for index, shipping_request in enumerate(shipping_requests):
+        if results[index] is None:
+            missing.setdefault(shipping_request, []).append(index)
+    if not missing:
+        return results
+
+    app = ebay_token_manager.get_app(is_bot_request)
+    if max_workers is None:
+        max_workers = getattr(settings, 'EBAY_SHIPPING_CONCURRENCY', 8)
+
+    def fetch(shipping_request, cache_name):
+        item_id, quantity, country_code, postal_code = shipping_request
+        try:
+            return _request_shipping_data_from_ebay(
+                app, item_id, quantity, is_bot_request, country_code, postal_code, cache_name
+            )
+        finally:
+            # Kết nối DB mở trong thread (khi lưu token mới) phải đóng lại
+            connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(missing))) as executor:
+        futures = {
+            shipping_request: executor.submit(fetch, shipping_request, cache_names[indexes[0]])
+            for shipping_request, indexes in missing.items()
+        }
+    for shipping_request, indexes in missing.items():
+        shipping_data = futures[shipping_request].result()
+        for index in indexes:
+            results[index] = shipping_data if index == indexes[0] else copy.deepcopy(shipping_data)
+    return results
+
+
 def handle_from_ship_data_in_item_data(current_shipping_data):
     """
     - Hàm này dùng trong trường hợp ``data_item`` có trường ``shippingOptions`` và sẽ ship về kho default
@@ -133,9 +211,12 @@ def handle_from_ship_data_after_get(data_item, shipping_data_after_retrieving, *
     """
     - Hàm này dùng trong trường hợp cần request qua eBay API để lấy thông tin ship
     - Hàm sẽ xử lý lấy ra object ship có giá trị nhỏ nhất
+    - ShippingServiceOption thường là các ship nội địa (vd DE -> DE, JP -> JP),
+      InternationalShippingServiceOption là các ship quốc tế (vd JP -> US, KR -> US) khi seller không ship nội địa.
+      Cả 2 loại được xử lý giống nhau bằng ``ShippingOption`` và ``select_cheapest_option``
     """
 
-    def internal_execute(data_item, min_ship_obj=None):
+    def internal_execute(data_item, min_ship_option=None):
         # Hàm này chỉ được thực thi trong khuôn khổ hàm cha để tránh việc lặp lại code
         if 'estimatedAvailabilities' not in data_item:
             data_item['estimatedAvailabilities'] = [{
@@ -144,30 +225,20 @@ def handle_from_ship_data_after_get(data_item, shipping_data_after_retrieving, *
         else:
             if 'deliveryOptions' not in data_item['estimatedAvailabilities'][0]:
                 data_item['estimatedAvailabilities'][0]['deliveryOptions'] = ['SELLER_ARRANGED_LOCAL_PICKUP']
-                if min_ship_obj is not None:
-                    if 'ShippingServiceName' in min_ship_obj and \
-                            min_ship_obj['ShippingServiceName'] not in ['Local Pickup', 'Freight']:
-                        data_item['estimatedAvailabilities'][0]['deliveryOptions'] = ['SHIP_TO_HOME']
+                if min_ship_option is not None and min_ship_option.is_eligible:
+                    data_item['estimatedAvailabilities'][0]['deliveryOptions'] = ['SHIP_TO_HOME']
             else:
-                if min_ship_obj is None and 'SELLER_ARRANGED_LOCAL_PICKUP' \
+                if min_ship_option is None and 'SELLER_ARRANGED_LOCAL_PICKUP' \
                         not in data_item['estimatedAvailabilities'][0]['deliveryOptions']:
                     data_item['estimatedAvailabilities'][0]['deliveryOptions'].append('SELLER_ARRANGED_LOCAL_PICKUP')
 
-        _obj_ship_of_item = {}
-        if min_ship_obj is not None:
-            _obj_ship_of_item['shippingServiceCode'] = min_ship_obj['ShippingServiceName']
-            _obj_ship_of_item['shippingCost'] = {}
-            if 'ShippingServiceCost' in min_ship_obj:
-                _obj_ship_of_item['shippingCost']['currency'] = min_ship_obj['ShippingServiceCost']['@currencyID']
-                _obj_ship_of_item['shippingCost']['value'] = min_ship_obj['ShippingServiceCost']['#text']
-            if 'EstimatedDeliveryMinTime' and 'EstimatedDeliveryMaxTime' in min_ship_obj:
-                _obj_ship_of_item['minEstimatedDeliveryDate'] = min_ship_obj['EstimatedDeliveryMinTime']
-                _obj_ship_of_item['maxEstimatedDeliveryDate'] = min_ship_obj['EstimatedDeliveryMaxTime']
+        if min_ship_option is not None:
+            _obj_ship_of_item = min_ship_option.to_ship_obj()
         else:
-            _obj_ship_of_item['shippingServiceCode'] = 'Local Pickup'
-            _obj_ship_of_item['shippingCost'] = {}
-            _obj_ship_of_item['shippingCost']['currency'] = 'USD'
-            _obj_ship_of_item['shippingCost']['value'] = '0.00'
+            _obj_ship_of_item = {
+                'shippingServiceCode': 'Local Pickup',
+                'shippingCost': {'currency': 'USD', 'value': '0.00'},
+            }
 
         if 'shippingOptions' in data_item:
             if _obj_ship_of_item not in data_item['shippingOptions']:
@@ -176,149 +247,48 @@ def handle_from_ship_data_after_get(data_item, shipping_data_after_retrieving, *
             data_item['shippingOptions'] = [_obj_ship_of_item]
         return _obj_ship_of_item
 
-    if shipping_data_after_retrieving['GetShippingCostsResponse']['Ack'] == 'Success':
-        if 'ShippingDetails' in shipping_data_after_retrieving['GetShippingCostsResponse']:
-            # option này thường là các ship nội địa (vd DE -> DE, JP -> JP)
-            shipping_details = shipping_data_after_retrieving['GetShippingCostsResponse']['ShippingDetails']
-            last_shipping_detail = shipping_data_after_retrieving['GetShippingCostsResponse']['ShippingCostSummary']
-            if 'ShippingServiceOption' in shipping_details:
-                shipping_options = shipping_details['ShippingServiceOption']
-                if isinstance(shipping_options, dict):
-                    minimum_shipping_obj = shipping_options
-                    if 'ShippingServiceCost' in minimum_shipping_obj:
-                        if minimum_shipping_obj['ShippingServiceCost']['@currencyID'] != 'USD':
-                            minimum_shipping_obj['ShippingServiceCost']['@currencyID'] \
-                                = last_shipping_detail['ShippingServiceCost']['@currencyID']
-                            minimum_shipping_obj['ShippingServiceCost']['#text'] \
-                                = last_shipping_detail['ShippingServiceCost']['#text']
-                    if 'ShippingServiceName' in minimum_shipping_obj:
-                        if minimum_shipping_obj['ShippingServiceName'] not in ['Local Pickup', 'Freight']:
-                            obj_ship_of_item = internal_execute(data_item, minimum_shipping_obj)
-                        else:
-                            obj_ship_of_item = internal_execute(data_item)
-                    else:
-                        obj_ship_of_item = internal_execute(data_item)
-                    return obj_ship_of_item
-                elif isinstance(shipping_options, list):
-                    # trường hợp các ship option eBay trả về là theo giá EUR
-                    # nên cần kiểm tra xem có option nào trả về theo giá USD ko
-                    # nếu có thì gán option đó là option mặc định, sau đó kiểm tra lại vs các option khác \
-                    # xem có option nào tốt hơn không (chỉ kiểm tra với option cùng đơn vị tiền tệ)
-                    flag = False
-                    minimum_shipping_obj = None
-                    for obj in shipping_options:
-                        if 'ShippingServiceCost' in obj:
-                            if '@currencyID' not in obj['ShippingServiceCost']:
-                                continue
-                            else:
-                                if obj['ShippingServiceCost']['@currencyID'] == 'USD':
-                                    if obj['ShippingServiceName'] not in ['Local Pickup', 'Freight']:
-                                        flag = True
-                                        minimum_shipping_obj = obj
-                                        break
-                    if flag:
-                        us_ship_price = float(minimum_shipping_obj['ShippingServiceCost']['#text'])
-                        for obj in shipping_options:
-                            if obj['ShippingServiceName'] not in ['Local Pickup', 'Freight'] \
-                                    and obj['ShippingServiceCost']['@currencyID'] == 'USD':
-                                if us_ship_price > float(obj['ShippingServiceCost']['#text']):
-                                    us_ship_price = float(obj['ShippingServiceCost']['#text'])
-                                    minimum_shipping_obj = obj
-                        obj_ship_of_item = internal_execute(data_item, minimum_shipping_obj)
-                        return obj_ship_of_item
-                    # trường hợp tất cả các ship option eBay trả về đều có đơn vị tiền tệ không là đơn vị USD
-                    # thì ta sẽ lấy option `ShippingCostSummary`, option này sẽ có giá ship bằng USD được convert \
-                    # từ đơn vị tiền tệ kia. Tuy nhiên, option này có thể sẽ không bao gồm ngày giao dự kiến.\
-                    # Muốn lấy được cả ngày dự kiến nữa, phải kiểm tra ngược lại với các option trên, option nào \
-                    # cùng giá sẽ lấy ngày dự kiến theo option đó.
-                    else:
-                        minimum_shipping_obj = last_shipping_detail
-                        if 'EstimatedDeliveryMinTime' not in minimum_shipping_obj \
-                                and 'EstimatedDeliveryMaxTime' not in minimum_shipping_obj:
-                            if 'ListedShippingServiceCost' in minimum_shipping_obj:
-                                for obj in shipping_options:
-                                    if obj['ShippingServiceCost']['@currencyID'] \
-                                            == minimum_shipping_obj['ListedShippingServiceCost']['@currencyID'] \
-                                            and obj['ShippingServiceCost']['#text'] \
-                                            == minimum_shipping_obj['ListedShippingServiceCost']['#text']:
-                                        if 'EstimatedDeliveryMinTime' in obj:
-                                            minimum_shipping_obj['EstimatedDeliveryMinTime'] \
-                                                = obj['EstimatedDeliveryMinTime']
-                                        if 'EstimatedDeliveryMaxTime' in obj:
-                                            minimum_shipping_obj['EstimatedDeliveryMaxTime'] \
-                                                = obj['EstimatedDeliveryMaxTime']
-                                        break
-                        obj_ship_of_item = internal_execute(data_item, minimum_shipping_obj)
-                        return obj_ship_of_item
-            # vì một số sản phẩm seller sẽ không ship nội địa nên sẽ cho về kho US
-            # nên option này thường là các ship quốc tế (vd JP -> US, KR -> US)
-            elif 'InternationalShippingServiceOption' in shipping_details:
-                internal_ship_options = shipping_details['InternationalShippingServiceOption']
-                if isinstance(internal_ship_options, dict):
-                    minimum_shipping_obj = internal_ship_options
-                    if 'ShippingServiceCost' in minimum_shipping_obj:
-                        if minimum_shipping_obj['ShippingServiceCost']['@currencyID'] != 'USD':
-                            minimum_shipping_obj['ShippingServiceCost']['@currencyID'] \
-                                = last_shipping_detail['ShippingServiceCost']['@currencyID']
-                            minimum_shipping_obj['ShippingServiceCost']['#text'] \
-                                = last_shipping_detail['ShippingServiceCost']['#text']
-                    if 'ShippingServiceName' in minimum_shipping_obj:
-                        if minimum_shipping_obj['ShippingServiceName'] not in ['Local Pickup', 'Freight']:
-                            obj_ship_of_item = internal_execute(data_item, minimum_shipping_obj)
-                        else:
-                            obj_ship_of_item = internal_execute(data_item)
-                    else:
-                        obj_ship_of_item = internal_execute(data_item)
-                    return obj_ship_of_item
-                elif isinstance(internal_ship_options, list):
-                    flag = False
-                    minimum_shipping_obj = None
-                    for obj in internal_ship_options:
-                        if 'ShippingServiceCost' in obj:
-                            if '@currencyID' not in obj['ShippingServiceCost']:
-                                continue
-                            elif obj['ShippingServiceCost']['@currencyID'] == 'USD':
-                                if obj['ShippingServiceName'] not in ['Local Pickup', 'Freight']:
-                                    flag = True
-                                    minimum_shipping_obj = obj
-                                    break
-                    if flag:
-                        us_ship_price = float(minimum_shipping_obj['ShippingServiceCost']['#text'])
-                        for obj in internal_ship_options:
-                            if obj['ShippingServiceName'] not in ['Local Pickup', 'Freight']:
-                                if us_ship_price > float(obj['ShippingServiceCost']['#text']):
-                                    us_ship_price = float(obj['ShippingServiceCost']['#text'])
-                                    minimum_shipping_obj = obj
-                        obj_ship_of_item = internal_execute(data_item, minimum_shipping_obj)
-                        return obj_ship_of_item
-                    else:
-                        minimum_shipping_obj = last_shipping_detail
-                        if 'EstimatedDeliveryMinTime' not in minimum_shipping_obj \
-                                and 'EstimatedDeliveryMaxTime' not in minimum_shipping_obj:
-                            if 'ListedShippingServiceCost' in minimum_shipping_obj:
-                                for obj in internal_ship_options:
-                                    if obj['ShippingServiceCost']['@currencyID'] \
-                                            == minimum_shipping_obj['ListedShippingServiceCost']['@currencyID'] \
-                                            and obj['ShippingServiceCost']['#text'] \
-                                            == minimum_shipping_obj['ListedShippingServiceCost']['#text']:
-                                        if 'EstimatedDeliveryMinTime' in obj:
-                                            minimum_shipping_obj['EstimatedDeliveryMinTime'] \
-                                                = obj['EstimatedDeliveryMinTime']
-                                        if 'EstimatedDeliveryMaxTime' in obj:
-                                            minimum_shipping_obj['EstimatedDeliveryMaxTime'] \
-                                                = obj['EstimatedDeliveryMaxTime']
-                                        break
-                        obj_ship_of_item = internal_execute(data_item, minimum_shipping_obj)
-                        return obj_ship_of_item
-            else:
-                obj_ship_of_item = internal_execute(data_item)
-                return obj_ship_of_item
-        else:
-            obj_ship_of_item = internal_execute(data_item)
-            return obj_ship_of_item
+    response = shipping_data_after_retrieving['GetShippingCostsResponse']
+    if response['Ack'] != 'Success' or 'ShippingDetails' not in response:
+        return internal_execute(data_item)
+
+    shipping_details = response['ShippingDetails']
+    if 'ShippingServiceOption' in shipping_details:
+        shipping_options = shipping_details['ShippingServiceOption']
+    elif 'InternationalShippingServiceOption' in shipping_details:
+        shipping_options = shipping_details['InternationalShippingServiceOption']
     else:
-        obj_ship_of_item = internal_execute(data_item)
-        return obj_ship_of_item
+        return internal_execute(data_item)
+    last_shipping_detail = response['ShippingCostSummary']
+
+    if isinstance(shipping_options, dict):
+        # Chỉ có 1 option, nếu giá không theo USD thì lấy giá USD đã được convert trong `ShippingCostSummary`
+        minimum_shipping_option = ShippingOption.from_dict(shipping_options)
+        if minimum_shipping_option.currency is not None and minimum_shipping_option.currency != 'USD':
+            minimum_shipping_option.currency, minimum_shipping_option.cost = \
+                ShippingOption.parse_amount(last_shipping_detail['ShippingServiceCost'])
+        if minimum_shipping_option.is_eligible:
+            return internal_execute(data_item, minimum_shipping_option)
+        return internal_execute(data_item)
+
+    # Các ship option eBay trả về có thể theo giá EUR, ... nên chỉ so sánh các option theo giá USD
+    minimum_shipping_option = select_cheapest_option(shipping_options)
+    if minimum_shipping_option is None:
+        # trường hợp tất cả các ship option eBay trả về đều có đơn vị tiền tệ không là đơn vị USD
+        # thì ta sẽ lấy option `ShippingCostSummary`, option này sẽ có giá ship bằng USD được convert \
+        # từ đơn vị tiền tệ kia. Tuy nhiên, option này có thể sẽ không bao gồm ngày giao dự kiến.\
+        # Muốn lấy được cả ngày dự kiến nữa, phải kiểm tra ngược lại với các option trên, option nào \
+        # cùng giá sẽ lấy ngày dự kiến theo option đó.
+        minimum_shipping_option = ShippingOption.from_dict(last_shipping_detail)
+        if minimum_shipping_option.min_delivery is None and minimum_shipping_option.max_delivery is None \
+                and 'ListedShippingServiceCost' in last_shipping_detail:
+            listed_currency, listed_cost = \
+                ShippingOption.parse_amount(last_shipping_detail['ListedShippingServiceCost'])
+            for obj in shipping_options:
+                if ShippingOption.parse_amount(obj.get('ShippingServiceCost')) == (listed_currency, listed_cost):
+                    minimum_shipping_option.min_delivery = obj.get('EstimatedDeliveryMinTime')
+                    minimum_shipping_option.max_delivery = obj.get('EstimatedDeliveryMaxTime')
+                    break
+    return internal_execute(data_item, minimum_shipping_option)
 
 
 def is_local_pickup_or_freight_item(obj_shipping):
@@ -347,6 +317,30 @@ def get_obj_ship_of_item(data_item, item_quantity, is_bot_request=False, **kwarg
     return obj_ship_of_item
 
 
+def get_obj_ship_of_items(data_items, item_quantity, is_bot_request=False, **kwargs):
+    """
+    - Giống ``get_obj_ship_of_item`` cho cả trang kết quả, trả về list object ship theo thứ tự data_items
+    - Các sản phẩm cần gọi GetShippingCosts được lấy cùng lúc qua ``request_ebay_api_get_shipping_data_bulk``
+    """
+    country_code = kwargs.get('country_code')
+    postal_code = kwargs.get('postal_code')
+    objs_ship = [None] * len(data_items)
+    need_request = []
+    for index, data_item in enumerate(data_items):
+        if is_item_in_american(data_item) and 'shippingOptions' in data_item:
+            objs_ship[index] = handle_from_ship_data_in_item_data(data_item['shippingOptions'])
+        else:
+            need_request.append(index)
+
+    shipping_data_list = request_ebay_api_get_shipping_data_bulk(
+        [(data_items[index]['itemId'], item_quantity, country_code, postal_code) for index in need_request],
+        is_bot_request
+    )
+    for index, shipping_data_after_retrieving in zip(need_request, shipping_data_list):
+        objs_ship[index] = handle_from_ship_data_after_get(data_items[index], shipping_data_after_retrieving)
+    return objs_ship
+
+
 def get_the_smallest_usa_ship_price(obj_ship):
     try:
         try:
@@ -376,155 +370,179 @@ def translate_products_title(products):
     """
     Hàm này có nhiệm vụ dịch tiêu đề của từng object.
     Tham số đầu vào là 1 danh sách các object - là các sản phẩm của eBay.
+    - Tiêu đề được dịch qua ``translation`` (có cache, các batch được dịch song song)
+    - Tiêu đề chưa dịch được trong thời gian cho phép (TRANSLATION_TIMEOUT) thì giữ nguyên
     """
-    products_translated = []
-    for i in range(0, len(products), 50):
-        items_list = products[i:i+50]
-        title_dict = {}
-        for index, item in enumerate(items_list):
-            if '"' in item['title']:
-                item['title'] = item['title'].replace('"', ' inch')
-            title_dict[index] = item['title']
-        paragraph = json.dumps(title_dict)
+    titles = translation.translate_many([item['title'] for item in products], dest='vi')
+    for item, title in zip(products, titles):
+        item['title'] = title
+    return products
+
+
+def dumps_json(obj):
+    """JSON cho các cột lưu data của sản phẩm."""
+    return _json_encoder.encode(obj)
+
+
+def build_product(item, google_merchant_pk, create_date=None):
+    # get image list of item
+    if 'additionalImages' in item:
+        image = item['additionalImages']
+    else:
+        if 'image' in item:
+            image = [{"imageUrl": item['image']['imageUrl']}]
+        else:
+            image = [{"imageUrl": ""}]
+
+    price, percent, price_sales = get_product_prices(item)
+
+    try:
+        category_id = item['categoryId']
+    except KeyError:
         try:
-            vi_paragraph = t.translate(paragraph, dest='vi').__dict__()['text']
-            vi_title_dict = {}
-            try:
-                vi_title_dict = json.loads(vi_paragraph)
-            except json.decoder.JSONDecodeError:
-                if '\\ ' in vi_paragraph:
-                    vi_paragraph = vi_paragraph.replace('\\ ', '\\')
-                if ' \\' in vi_paragraph:
-                    vi_paragraph = vi_paragraph.replace(' \\', '\\')
-                try:
-                    vi_title_dict = json.loads(vi_paragraph)
-                except json.decoder.JSONDecodeError:
-                    pass
-            try:
-                for key, value in vi_title_dict.items():
-                    if ' ' in key:
-                        vi_title_dict[key.strip()] = vi_title_dict.pop(key)
-            except RuntimeError:
-                for key, value in vi_title_dict.items():
-                    if ' ' in key:
-                        vi_title_dict[key.strip()] = vi_title_dict.pop(key)
-        except:
-            vi_title_dict = json.loads(paragraph)
-
-        for index, item in enumerate(items_list):
-            try:
-                item['title'] = vi_title_dict[str(index)]
-            except KeyError:
-                pass
-            products_translated.append(item)
-    return products_translated
+            category_id = item['categories'][0]['categoryId']
+        except IndexError:
+            category_id = 0
+
+    return Product(
+        itemId=item['itemId'],
+        title=item['title'],
+        image=dumps_json(image),
+        price=price,
+        type=0,
+        percent=percent,
+        price_sales=price_sales,
+        external_id=category_id,
+        data=dumps_json(item),
+        description=item['shortDescription'] if 'shortDescription' in item else '',
+        og_image=item['image']['imageUrl'] if 'image' in item else '',
+        create_date=create_date if create_date is not None else time.time(),
+        google_merchant=google_merchant_pk
+    )
+
+
+class IngestStats:
+    """Thời gian (giây) của từng bước và số trang / sản phẩm đã xử lý trong ``ingest_products``."""
+    STAGES = ('fetch', 'translate', 'build', 'write')
+
+    def __init__(self):
+        self.timings = dict.fromkeys(self.STAGES, 0.0)
+        self.pages = 0
+        self.items = 0
+        self.batches = 0
+
+    def as_dict(self):
+        return {
+            'timings': dict(self.timings),
+            'pages': self.pages,
+            'items': self.items,
+            'batches': self.batches,
+        }
+
+
+def ingest_products(pages, google_merchant_pk, batch_size=None, translate=True):
+    """
+    Lưu sản phẩm theo dạng stream, bộ nhớ không tăng theo số sản phẩm:
+    - pages: iterable (thường là generator) các trang sản phẩm eBay, mỗi trang là một list item,
+      chỉ lấy trang tiếp theo khi đã xử lý xong trang trước nên mỗi lúc chỉ giữ một trang và một lô
+    - Mỗi trang được dịch tiêu đề, tạo Product rồi ``bulk_create(ignore_conflicts=True)`` theo từng lô ``batch_size``
+    - Trả về ``IngestStats`` với thời gian của từng bước
+    """
+    if batch_size is None:
+        batch_size = getattr(settings, 'PRODUCT_INGEST_BATCH_SIZE', 500)
+    stats = IngestStats()
+    batch = []
+
+    def flush():
+        started_at = time.perf_counter()
+        Product.objects.bulk_create(batch, ignore_conflicts=True)
+        stats.timings['write'] += time.perf_counter() - started_at
+        stats.batches += 1
+        batch.clear()
+
+    iterator = iter(pages)
+    while True:
+        started_at = time.perf_counter()
+        try:
+            page = next(iterator)
+        except StopIteration:
+            break
+        stats.timings['fetch'] += time.perf_counter() - started_at
+        stats.pages += 1
+
+        if translate:
+            started_at = time.perf_counter()
+            page = translate_products_title(page)
+            stats.timings['translate'] += time.perf_counter() - started_at
+
+        started_at = time.perf_counter()
+        now = time.time()
+        for item in page:
+            batch.append(build_product(item, google_merchant_pk, now))
+            stats.items += 1
+            if len(batch) >= batch_size:
+                stats.timings['build'] += time.perf_counter() - started_at
+                flush()
+                started_at = time.perf_counter()
+        stats.timings['build'] += time.perf_counter() - started_at
+        # Bỏ tham chiếu tới trang đã xử lý để bộ nhớ được giải phóng ngay
+        del page
+    if batch:
+        flush()
+    return stats
 
 
 def add_product_colum(objData, google_merchant_pk):
-    # s=time.time()
-    # items = translate_products_title(objData)
-    items = objData
-    # print('translate time ', time.time() - s)
-    products = []
-    # s = time.time()
-    for item in items:
-        # a.append(item['itemId'])
-        title = item['title']
+    """Lưu một danh sách sản phẩm, dùng ``ingest_products`` với một trang duy nhất."""
+    return ingest_products([objData], google_merchant_pk)
 
-        # get image list of item
-        if 'additionalImages' in item:
-            image = item['additionalImages']
-        else:
-            if 'image' in item:
-                image = [{"imageUrl": item['image']['imageUrl']}]
-            else:
-                image = [{"imageUrl": ""}]
 
-        if 'price' in item:
-            price = float(item['price']['value'])
+def get_product_prices(json_parse_item):
+    """Trả về (price, percent, price_sales) của sản phẩm eBay."""
+    if 'price' in json_parse_item:
+        price = float(json_parse_item['price']['value'])
+    else:
+        if 'currentBidPrice' in json_parse_item:
+            price = float(json_parse_item['currentBidPrice']['value'])
         else:
-            if 'currentBidPrice' in item:
-                price = float(item['currentBidPrice']['value'])
-            else:
-                price = 0
-
-        # get percent
-        if 'marketingPrice' in item:
-            if 'discountPercentage' in item['marketingPrice']:
-                percent = item['marketingPrice']['discountPercentage']
-            else:
-                percent = 0
-            if 'originalPrice' in item['marketingPrice']:
-                price_sales = item['marketingPrice']['originalPrice']['value']
-            else:
-                price_sales = price * 100 / (100 - float(percent))
+            price = 0
+    # get percent
+    if 'marketingPrice' in json_parse_item:
+        if 'discountPercentage' in json_parse_item['marketingPrice']:
+            percent = json_parse_item['marketingPrice']['discountPercentage']
         else:
             percent = 0
+        if 'originalPrice' in json_parse_item['marketingPrice']:
+            price_sales = json_parse_item['marketingPrice']['originalPrice']['value']
+        else:
             price_sales = price * 100 / (100 - float(percent))
+    else:
+        percent = 0
+        price_sales = price * 100 / (100 - float(percent))
+    return price, percent, price_sales
+
+
+def add_product_all(objData, category_id, bulk=None, chunk_size=None):
+    """
+    Lưu các sản phẩm của một danh mục, sản phẩm đã có thì cập nhật giá, thời gian, danh mục và data.
+    - Mặc định lưu lần lượt từng sản phẩm như trước, tiêu đề lưu nguyên (không dịch)
+    - bulk=True (mặc định theo PRODUCT_BULK_UPSERT): dùng ``bulk_upsert_products``, ít query hơn nhiều
+      và tiêu đề sản phẩm mới được dịch sang tiếng Việt
+    """
+    if bulk is None:
+        bulk = getattr(settings, 'PRODUCT_BULK_UPSERT', False)
+    if bulk:
+        bulk_upsert_products(objData, category_id, chunk_size=chunk_size)
+        return
 
-        try:
-            category_id = item['categoryId']
-        except KeyError:
-            try:
-                category_id = item['categories'][0]['categoryId']
-            except IndexError:
-                category_id = 0
-
-        products.append(Product(
-            itemId=item['itemId'],
-            title=title,
-            image=json.dumps(image),
-            price=price,
-            type=0,
-            percent=percent,
-            price_sales=price_sales,
-            external_id=category_id,
-            data=json.dumps(item),
-            description=item['shortDescription'] if 'shortDescription' in item else '',
-            og_image=item['image']['imageUrl'] if 'image' in item else '',
-            create_date=time.time(),
-            google_merchant=google_merchant_pk
-        ))
-    # print('handle data time ', time.time() - s)
-    # s=time.time()
-    Product.objects.bulk_create(products, ignore_conflicts=True)
-    # print('save data time ', time.time() - s)
-    # print("Lưu sản phẩm xuống database xong")
-
-
-def add_product_all(objData, category_id):
     for json_parse_item in objData:
-        # translate title
-        try:
-            vi_title = t.translate(json_parse_item['title'], dest='vi').__dict__()['text']
-        except AttributeError:
-            vi_title = json_parse_item['title']
         # get image list of item
         if 'additionalImages' in json_parse_item:
             image = json_parse_item['additionalImages']
         else:
             image = [{"imageUrl": json_parse_item['image']['imageUrl']}]
 
-        if 'price' in json_parse_item:
-            price = float(json_parse_item['price']['value'])
-        else:
-            if 'currentBidPrice' in json_parse_item:
-                price = float(json_parse_item['currentBidPrice']['value'])
-            else:
-                price = 0
-        # get percent
-        if 'marketingPrice' in json_parse_item:
-            if 'discountPercentage' in json_parse_item['marketingPrice']:
-                percent = json_parse_item['marketingPrice']['discountPercentage']
-            else:
-                percent = 0
-            if 'originalPrice' in json_parse_item['marketingPrice']:
-                price_sales = json_parse_item['marketingPrice']['originalPrice']['value']
-            else:
-                price_sales = price * 100 / (100 - float(percent))
-        else:
-            percent = 0
-            price_sales = price * 100 / (100 - float(percent))
+        price, percent, price_sales = get_product_prices(json_parse_item)
 
         try:
             check_item_exist = Product.objects.get(itemId=json_parse_item['itemId'])
@@ -549,30 +567,104 @@ def add_product_all(objData, category_id):
                 create_date=time.time()
             )
             obj_product.save()
-    print("addAll")
+
+
+def bulk_upsert_products(objData, category_id, chunk_size=None):
+    """
+    Thêm / cập nhật sản phẩm theo lô thay vì 2-3 query cho mỗi sản phẩm:
+    - Bước 1: lấy các sản phẩm đã có bằng một query ``itemId IN (...)``
+    - Bước 2: dịch tiêu đề của các sản phẩm mới qua ``translation`` (có cache, dịch song song theo batch),
+      sản phẩm đã có không cập nhật tiêu đề nên không cần dịch (giống khi lưu lần lượt)
+    - Bước 3: ``bulk_update`` sản phẩm đã có, ``bulk_create`` sản phẩm mới, mỗi lần ``chunk_size`` sản phẩm,
+      tất cả trong một transaction. Sản phẩm mới bị process khác thêm trước (trùng itemId) thì bỏ qua
+    Sản phẩm trùng itemId trong objData thì lấy sản phẩm đứng sau (giống khi lưu lần lượt).
+    Trả về (số sản phẩm cập nhật, số sản phẩm thêm mới).
+    """
+    if chunk_size is None:
+        chunk_size = getattr(settings, 'PRODUCT_BULK_CHUNK_SIZE', 500)
+    items = {json_parse_item['itemId']: json_parse_item for json_parse_item in objData}
+    if not items:
+        return 0, 0
+
+    existing_products = {
+        product.itemId: product
+        for product in Product.objects.filter(itemId__in=list(items)).only('pk', 'itemId')
+    }
+    # Dịch ngoài transaction để không giữ transaction trong lúc chờ dịch
+    new_item_ids = [item_id for item_id in items if item_id not in existing_products]
+    titles = dict(zip(
+        new_item_ids, translation.translate_many([items[item_id]['title'] for item_id in new_item_ids], dest='vi')
+    ))
+
+    now = time.time()
+    with transaction.atomic():
+        products_to_update = []
+        products_to_create = []
+        for item_id, json_parse_item in items.items():
+            price, percent, price_sales = get_product_prices(json_parse_item)
+            product = existing_products.get(item_id)
+            if product is not None:
+                product.price = price
+                product.create_date = now
+                product.external_id = category_id
+                product.data = json.dumps(json_parse_item)
+                products_to_update.append(product)
+                continue
+
+            if 'additionalImages' in json_parse_item:
+                image = json_parse_item['additionalImages']
+            else:
+                image = [{"imageUrl": json_parse_item['image']['imageUrl']}]
+            products_to_create.append(Product(
+                itemId=item_id,
+                title=titles[item_id],
+                image=json.dumps(image),
+                price=price,
+                type=0,
+                percent=percent,
+                price_sales=price_sales,
+                external_id=category_id,
+                data=json.dumps(json_parse_item),
+                description=json_parse_item['shortDescription'] if 'shortDescription' in json_parse_item else '',
+                og_image=json_parse_item['image']['imageUrl'],
+                create_date=now
+            ))
+
+        Product.objects.bulk_update(
+            products_to_update, ['price', 'create_date', 'external_id', 'data'], batch_size=chunk_size
+        )
+        Product.objects.bulk_create(products_to_create, batch_size=chunk_size, ignore_conflicts=True)
+    return len(products_to_update), len(products_to_create)
 
 
 def get_detail(item_id, **kwargs):
+    """
+    Lấy chi tiết sản phẩm qua ``product_detail_cache`` (LRU trong process + cache dùng chung).
+    Dữ liệu đã cũ nhưng còn trong thời gian cho phép thì trả về luôn và làm mới trong background.
+    """
     request = kwargs.get('request')
     product_detail_cache_name = PRODUCT_DETAIL_CACHE_NAME.format(item_id=item_id)
-    data = cache.get(product_detail_cache_name)
-    if not data:
-        resp = hub_product(f'{settings.EBAY_ENVIRON}/buy/browse/v1/item/{item_id}', request=request)
-        data = json.loads(resp.content)
-        # nếu không phải là sản phẩm đấu giá thì lưu cache
-        if 'buyingOptions' in data:
-            if 'AUCTION' not in data['buyingOptions']:
-                cache.set(product_detail_cache_name, data, PRODUCT_DETAIL_CACHE_TIME)
+    data, state = product_detail_cache.get(item_id)
+    if state == STALE:
+        product_detail_cache.refresh(item_id, _fetch_detail, item_id, request=request)
+    if data is None:
+        # Khi cache hết hạn, chỉ một request gọi sang eBay, các request khác chờ và dùng chung kết quả
+        data = product_detail_single_flight.do(product_detail_cache_name, _fetch_detail, item_id, request=request)
     return data
 
 
-def get_detail_not_from_cache(item_id, **kwargs):
-    request = kwargs.get('request')
+def _fetch_detail(item_id, request=None):
     resp = hub_product(f'{settings.EBAY_ENVIRON}/buy/browse/v1/item/{item_id}', request=request)
     data = json.loads(resp.content)
-    # nếu không phải là sản phẩm đấu giá thì lưu cache
+    # sản phẩm đấu giá chỉ được cache ngắn, theo thời gian kết thúc đấu giá (xem ``ProductDetailCache``)
     if 'buyingOptions' in data:
-        if 'AUCTION' not in data['buyingOptions']:
-            product_detail_cache_name = PRODUCT_DETAIL_CACHE_NAME.format(item_id=item_id)
-            cache.set(product_detail_cache_name, data, PRODUCT_DETAIL_CACHE_TIME)
+        # Trả về đúng các trường được lưu vào cache, lần gọi sau lấy từ cache cũng nhận được dữ liệu như vậy
+        data = product_detail_cache.serializer.prune(data)
+        product_detail_cache.set(item_id, data)
     return data
+
+
+def get_detail_not_from_cache(item_id, **kwargs):
+    request = kwargs.get('request')
+    product_detail_cache_name = PRODUCT_DETAIL_CACHE_NAME.format(item_id=item_id)
+    return product_detail_single_flight.do(product_detail_cache_name, _fetch_detail, item_id, request=request)
@@ -1,3 +1,166 @@
+import threading
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+
+# Version của bảng phí lưu trong cache để các process khác biết khi bảng phí thay đổi
+FEE_RULE_INDEX_VERSION_CACHE_NAME = 'fee_rule_index_version'
+# Số giây giữa 2 lần kiểm tra version, trong khoảng này tính phí không cần truy cập cache hay DB
+FEE_RULE_INDEX_CHECK_INTERVAL = 5
+
+
+class FeeRuleIndex:
+    """
+    Bảng phí (AttributeValue) và thuế (Warehouse) được nạp sẵn vào bộ nhớ, tìm bằng dict thay vì query DB.
+    - rules: (code, value, country_code, partner) -> (type, fee, minimum), giữ dòng đầu tiên như ``qs[0]``.
+      fee giữ nguyên Decimal của AttributeValue (``fee_engine`` đổi sang số nguyên không qua float)
+    - price_rules: (code, country_code, partner) -> rule, dùng cho param ``price`` (không lọc theo value)
+    - Giá trị mặc định (country_code rỗng) được tính trước:
+      (code, value, partner) trước, không có thì (code, value rỗng, partner)
+    - ``get_rule`` trả về fee dạng float như ``get_fee`` cũ (``float(qs[0].fee)``), đổi một lần khi nạp
+    """
+
+    def __init__(self, warehouses, attribute_values):
+        warehouse_taxes = {}
+        self.default_tax = None
+        for warehouse in warehouses:
+            warehouse_taxes.setdefault(warehouse.country_code, []).append(warehouse.tax)
+            if warehouse.country_code == 'US' and warehouse.state == 'OR':
+                self.default_tax = warehouse.tax
+        # Mã quốc gia có nhiều WareHouse thì cũng lấy WareHouse default như ``MultipleObjectsReturned``
+        self.warehouse_tax = {
+            country_code: taxes[0] for country_code, taxes in warehouse_taxes.items() if len(taxes) == 1
+        }
+
+        self.rules = {}
+        self.price_rules = {}
+        for attribute_value in attribute_values:
+            rule = (attribute_value.type, attribute_value.fee, attribute_value.minimum)
+            code, value = attribute_value.code, str(attribute_value.value)
+            country_code, partner = attribute_value.country_code, attribute_value.partner
+            self.rules.setdefault((code, value, country_code, partner), rule)
+            self.price_rules.setdefault((code, country_code, partner), rule)
+
+        self.default_rules = {}
+        self.default_rules_by_code = {}
+        for (code, value, country_code, partner), rule in self.rules.items():
+            if country_code == '':
+                if value == '':
+                    self.default_rules_by_code[(code, partner)] = rule
+                else:
+                    self.default_rules[(code, value, partner)] = rule
+
+        self._float_rules = self._to_float(self.rules)
+        self._float_price_rules = self._to_float(self.price_rules)
+        self._float_default_rules = self._to_float(self.default_rules)
+        self._float_default_rules_by_code = self._to_float(self.default_rules_by_code)
+
+    @staticmethod
+    def _to_float(rules):
+        return {key: (fee_type, float(fee), minimum) for key, (fee_type, fee, minimum) in rules.items()}
+
+    def get_tax(self, country_code):
+        if country_code in self.warehouse_tax:
+            return self.warehouse_tax[country_code]
+        if self.default_tax is None:
+            # Giống ``Warehouse.objects.get(country_code='US', state='OR')`` khi không có WareHouse default
+            raise Warehouse.DoesNotExist('Warehouse matching query does not exist.')
+        return self.default_tax
+
+    def get_rule(self, code, value, country_code, partner):
+        if code == 'price':
+            rule = self._float_price_rules.get((code, country_code, partner))
+        else:
+            rule = self._float_rules.get((code, str(value), country_code, partner))
+        if rule is None:
+            rule = self.get_default_rule(code, value, partner)
+        return rule
+
+    def get_default_rule(self, code, value, partner):
+        rule = self._float_default_rules.get((code, str(value), partner))
+        if rule is None:
+            rule = self._float_default_rules_by_code.get((code, partner), (None, None, None))
+        return rule
+
+    @classmethod
+    def load(cls):
+        return cls(Warehouse.objects.all(), AttributeValue.objects.all())
+
+
+_fee_rule_index = None
+_fee_rule_index_version = None
+_fee_rule_index_checked_at = 0
+_fee_rule_index_lock = threading.Lock()
+
+
+def get_fee_rule_index():
+    """
+    Trả về bảng phí đã nạp sẵn, chỉ nạp lại khi AttributeValue / Warehouse thay đổi.
+    Process nào lưu thay đổi thì tăng version trong cache, các process khác thấy version khác sẽ nạp lại.
+    """
+    global _fee_rule_index, _fee_rule_index_version, _fee_rule_index_checked_at
+    now = time.monotonic()
+    if _fee_rule_index is not None and now - _fee_rule_index_checked_at < FEE_RULE_INDEX_CHECK_INTERVAL:
+        return _fee_rule_index
+    with _fee_rule_index_lock:
+        try:
+            version = cache.get(FEE_RULE_INDEX_VERSION_CACHE_NAME)
+        except Exception:
+            # Không đọc được cache thì dùng tiếp bảng phí hiện tại, kiểm tra lại sau FEE_RULE_INDEX_CHECK_INTERVAL
+            version = _fee_rule_index_version
+        if _fee_rule_index is None or version != _fee_rule_index_version:
+            _fee_rule_index = FeeRuleIndex.load()
+            _fee_rule_index_version = version
+        _fee_rule_index_checked_at = now
+        return _fee_rule_index
+
+
+def invalidate_fee_rule_index(**kwargs):
+    global _fee_rule_index
+    _fee_rule_index = None
+    try:
+        cache.set(FEE_RULE_INDEX_VERSION_CACHE_NAME, time.time_ns(), None)
+    except Exception:
+        pass
+
+
+# Tên model của bảng phí, dùng khi không có setting FEE_RULE_MODELS
+FEE_RULE_MODEL_NAMES = ('AttributeValue', 'Warehouse')
+
+
+def get_fee_rule_models():
+    """
+    Model của bảng phí: theo setting FEE_RULE_MODELS (list 'app_label.ModelName'),
+    không có setting thì các model trong app registry có tên trong ``FEE_RULE_MODEL_NAMES``.
+    """
+    labels = getattr(settings, 'FEE_RULE_MODELS', None)
+    if labels is not None:
+        return [apps.get_model(label) for label in labels]
+    return [model for model in apps.get_models() if model.__name__ in FEE_RULE_MODEL_NAMES]
+
+
+def _on_fee_rule_model_changed(sender, **kwargs):
+    invalidate_fee_rule_index()
+
+
+def connect_fee_rule_index_signals():
+    """
+    Gọi trong ``AppConfig.ready`` của mọi process (kể cả admin, management command) để process nào sửa
+    AttributeValue / Warehouse cũng tăng version, kể cả khi process đó chưa từng tính phí.
+    Signal chỉ được kết nối với các model của bảng phí (``get_fee_rule_models``), lưu model khác không tốn gì thêm.
+    """
+    for model in get_fee_rule_models():
+        post_save.connect(
+            _on_fee_rule_model_changed, sender=model, dispatch_uid=f'fee_rule_index_save:{model._meta.label}'
+        )
+        post_delete.connect(
+            _on_fee_rule_model_changed, sender=model, dispatch_uid=f'fee_rule_index_delete:{model._meta.label}'
+        )
+
+
 def get_fee(price, usa_ship_price, country_code, partner, **kwargs):
     """
     - Lấy mã quốc gia truyền vào đi tìm trông bảng WareHouse, nếu không có thì lấy default WareHouse
@@ -8,30 +171,20 @@ def get_fee(price, usa_ship_price, country_code, partner, **kwargs):
       Nếu không tìm thấy thì thử lại với param đó + value là rỗng + mã quốc gia là rỗng + mã đối tác.
       Nếu vẫn không tìm thấy thì trả về None để xét lỗi.
     - Nếu tìm thấy giá trị cần tìm thì kiểm tra kiểu giá phải tính là percent hay fixed để cộng lại cho phù hợp.
+    - Bảng WareHouse và bảng phí được lấy từ ``FeeRuleIndex`` đã nạp sẵn nên không query DB.
     """
     fixed = 0
     percent = 0
-    try:
-        warehouse = Warehouse.objects.get(country_code=country_code)
-    except Warehouse.DoesNotExist:
-        warehouse = Warehouse.objects.get(country_code='US', state='OR')
-    except Warehouse.MultipleObjectsReturned:
-        warehouse = Warehouse.objects.get(country_code='US', state='OR')
+    fee_rule_index = get_fee_rule_index()
     # get tax
-    tax_percent = warehouse.tax
+    tax_percent = fee_rule_index.get_tax(country_code)
 
     # Giá đã bao gồm phí vận chuyển Mỹ và thuế Mỹ
     base_price = price * (1 + (tax_percent / 100)) + usa_ship_price
 
     params = kwargs['params']
     for att_code, att_value in params.items():
-        qs = AttributeValue.objects.filter(code=att_code, value=att_value, country_code=country_code, partner=partner)
-        if att_code == 'price':
-            qs = AttributeValue.objects.filter(code=att_code, country_code=country_code, partner=partner)
-        if not qs.exists():
-            fee_type, fee_value, minimum = get_default_fee_value(att_code, att_value, partner)
-        else:
-            fee_type, fee_value, minimum = qs[0].type, float(qs[0].fee), qs[0].minimum
+        fee_type, fee_value, minimum = fee_rule_index.get_rule(att_code, att_value, country_code, partner)
 
         if fee_type is None and fee_value is None:
             return None, None
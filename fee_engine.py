@@ -0,0 +1,162 @@
+import threading
+from decimal import ROUND_HALF_UP, Decimal
+from types import MappingProxyType
+
+from django.core.exceptions import ObjectDoesNotExist
+
+from fee import get_fee_rule_index
+
+# Tiền và phần trăm đều được đổi sang số nguyên với 4 chữ số thập phân (12.99 -> 129900, 2.5% -> 25000)
+SCALE = 10_000
+SCALE_EXPONENT = -4
+HUNDRED = 100 * SCALE
+
+
+class TaxNotFound(ObjectDoesNotExist):
+    """
+    Quốc gia không có WareHouse (hoặc có nhiều WareHouse) và không có WareHouse default (US / OR).
+    Cùng lớp cha với ``Warehouse.DoesNotExist`` mà ``fee.get_fee`` raise trong trường hợp này.
+    """
+
+
+def to_fixed(value):
+    """Đổi giá trị (int, float, str, Decimal) sang số nguyên đã nhân ``SCALE``."""
+    if isinstance(value, int):
+        return value * SCALE
+    if isinstance(value, float):
+        # float của giá tiền chỉ có vài chữ số thập phân nên làm tròn là đúng
+        return round(value * SCALE)
+    return int((Decimal(value) * SCALE).to_integral_value(ROUND_HALF_UP))
+
+
+def from_fixed(value):
+    return Decimal(value).scaleb(SCALE_EXPONENT)
+
+
+class FeeSnapshot:
+    """
+    Ảnh chụp (không đổi được) của bảng thuế WareHouse và bảng phí, tiền và phần trăm lưu dạng số nguyên.
+    Được tạo lại từ ``FeeRuleIndex`` mỗi khi bảng phí được nạp lại (khi AttributeValue / Warehouse thay đổi).
+    - rule: (is_percent, fee, minimum) với fee, minimum đã nhân ``SCALE``, minimum None nếu không có
+    """
+    __slots__ = ('fee_rule_index', 'warehouse_tax', 'default_tax', 'rules', 'price_rules',
+                 'default_rules', 'default_rules_by_code', '_pricing_functions')
+
+    def __init__(self, fee_rule_index):
+        self.fee_rule_index = fee_rule_index
+        self.warehouse_tax = MappingProxyType({
+            country_code: to_fixed(tax) for country_code, tax in fee_rule_index.warehouse_tax.items()
+        })
+        self.default_tax = to_fixed(fee_rule_index.default_tax) if fee_rule_index.default_tax is not None else None
+        self.rules = self._convert(fee_rule_index.rules)
+        self.price_rules = self._convert(fee_rule_index.price_rules)
+        self.default_rules = self._convert(fee_rule_index.default_rules)
+        self.default_rules_by_code = self._convert(fee_rule_index.default_rules_by_code)
+        self._pricing_functions = {}
+
+    @staticmethod
+    def _convert(rules):
+        return MappingProxyType({
+            key: (fee_type == 'PERCENT', to_fixed(fee_value), to_fixed(minimum) if minimum is not None else None)
+            for key, (fee_type, fee_value, minimum) in rules.items()
+        })
+
+    def get_pricing_function(self, country_code, partner):
+        """
+        Trả về hàm tính phí đã biên dịch sẵn cho (country_code, partner), dùng lại được cho cả request:
+            price_item = snapshot.get_pricing_function('VN', partner)
+            tax, fixed, percent = price_item(price, usa_ship_price, params)
+        Kết quả là Decimal, giống ``fee.get_fee`` nhưng tính chính xác (không sai số float).
+        Không tìm được phí thì trả về (None, None) như ``get_fee``.
+        Không tìm được thuế (không có WareHouse của quốc gia, không có WareHouse default) thì raise ``TaxNotFound``.
+        """
+        key = (country_code, partner)
+        function = self._pricing_functions.get(key)
+        if function is None:
+            function = self._pricing_functions[key] = self._compile(country_code, partner)
+        return function
+
+    def _compile(self, country_code, partner):
+        tax = self.warehouse_tax.get(country_code, self.default_tax)
+        if tax is None:
+            raise TaxNotFound(f'No warehouse for country {country_code!r} and no default warehouse (US / OR)')
+        tax_decimal = from_fixed(tax)
+        price_factor = HUNDRED + tax
+        # base_price * fee / 100 >= minimum  <=>  base * fee >= minimum * THRESHOLD_FACTOR (base đã nhân HUNDRED)
+        threshold_factor = HUNDRED * HUNDRED
+        rules = self.rules
+        price_rule = self.price_rules.get(('price', country_code, partner))
+        default_rules = self.default_rules
+        default_rules_by_code = self.default_rules_by_code
+        # Phí đã tìm của từng (code, value), chỉ tìm lại khi gặp (code, value) mới
+        resolved = {}
+        # Tổng phí chỉ có ít giá trị khác nhau nên giữ lại Decimal đã tạo
+        decimals = {}
+
+        def resolve(att_code, att_value):
+            if att_code == 'price' and price_rule is not None:
+                return price_rule
+            value = str(att_value)
+            rule = None
+            if att_code != 'price':
+                rule = rules.get((att_code, value, country_code, partner))
+            if rule is None:
+                rule = default_rules.get((att_code, value, partner))
+            if rule is None:
+                rule = default_rules_by_code.get((att_code, partner))
+            return rule
+
+        def price_item(price, usa_ship_price, params):
+            fixed = 0
+            percent = 0
+            base = (
+                (round(price * SCALE) if type(price) is float else to_fixed(price)) * price_factor
+                + (round(usa_ship_price * SCALE) if type(usa_ship_price) is float else to_fixed(usa_ship_price))
+                * HUNDRED
+            )
+            for att_code, att_value in params.items():
+                key = (att_code, None if att_code == 'price' and price_rule is not None else att_value)
+                try:
+                    rule = resolved[key]
+                except KeyError:
+                    rule = resolved[key] = resolve(att_code, att_value)
+                if rule is None:
+                    return None, None
+                is_percent, fee_value, minimum = rule
+                if is_percent:
+                    if minimum is not None and base * fee_value < minimum * threshold_factor:
+                        fixed += minimum
+                    else:
+                        percent += fee_value
+                else:
+                    fixed += fee_value
+            try:
+                return tax_decimal, decimals[fixed], decimals[percent]
+            except KeyError:
+                for value in (fixed, percent):
+                    if value not in decimals:
+                        decimals[value] = from_fixed(value)
+                return tax_decimal, decimals[fixed], decimals[percent]
+
+        return price_item
+
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def get_fee_snapshot():
+    """Snapshot hiện tại, tạo lại khi ``get_fee_rule_index`` trả về bảng phí mới."""
+    global _snapshot
+    fee_rule_index = get_fee_rule_index()
+    snapshot = _snapshot
+    if snapshot is None or snapshot.fee_rule_index is not fee_rule_index:
+        with _snapshot_lock:
+            if _snapshot is None or _snapshot.fee_rule_index is not fee_rule_index:
+                _snapshot = FeeSnapshot(fee_rule_index)
+            snapshot = _snapshot
+    return snapshot
+
+
+def get_pricing_function(country_code, partner):
+    return get_fee_snapshot().get_pricing_function(country_code, partner)
@@ -0,0 +1,156 @@
+import atexit
+import threading
+
+from django.conf import settings
+from django.db import connections
+
+from key_product.models import KeyProduct
+from utils.lru import MISSING, LRUCache
+
+
+def normalize_keyword(keyword):
+    return keyword.lower().strip()
+
+
+class KeywordRecorder:
+    """
+    Ghi lại từ khoá search của client (KeyProduct) theo kiểu write-behind, request search không phải ghi DB.
+    - ``record`` chỉ thêm (client_id, từ khoá) vào buffer trong bộ nhớ, từ khoá trùng chỉ giữ một lần
+    - Từ khoá đã ghi trong ``dedup_window`` giây gần đây thì bỏ qua (kể cả khi client vừa ẩn từ khoá đó)
+    - Thread nền ghi buffer vào DB mỗi ``flush_interval`` giây hoặc khi buffer đủ ``batch_size``:
+      từ khoá đã có mà đang ẩn thì bỏ ẩn, chưa có thì tạo mới (bulk)
+    - Buffer đầy (``max_pending``) thì bỏ từ khoá mới, ghi DB lỗi thì giữ lại để ghi lần sau
+    - Khi process dừng bình thường (atexit) thì ghi nốt buffer
+    """
+
+    def __init__(self, flush_interval=None, batch_size=None, max_pending=None, dedup_window=None):
+        self.flush_interval = flush_interval or getattr(settings, 'KEYWORD_RECORDER_FLUSH_INTERVAL', 5)
+        self.batch_size = batch_size or getattr(settings, 'KEYWORD_RECORDER_BATCH_SIZE', 500)
+        self.max_pending = max_pending or getattr(settings, 'KEYWORD_RECORDER_MAX_PENDING', 10000)
+        self.dedup_window = dedup_window or getattr(settings, 'KEYWORD_RECORDER_DEDUP_WINDOW', 60)
+        self.recent = LRUCache(max_entries=self.max_pending, default_ttl=self.dedup_window)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = None
+        self._atexit_registered = False
+        self.recorded = 0
+        self.dropped = 0
+        self.created = 0
+        self.unhidden = 0
+        self.flushes = 0
+        self.failures = 0
+
+    def record(self, client_id, keyword):
+        name = normalize_keyword(keyword)
+        if not client_id or not name:
+            return
+        key = (client_id, name)
+        if self.recent.get(key) is not MISSING:
+            return
+        with self._lock:
+            if key in self._pending:
+                return
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return
+            self._pending[key] = None
+            self.recorded += 1
+            pending = len(self._pending)
+        self._ensure_started()
+        if pending >= self.batch_size:
+            self._wakeup.set()
+
+    def flush(self):
+        """Ghi buffer vào DB, trả về số từ khoá đã ghi."""
+        with self._flush_lock:
+            with self._lock:
+                keys, self._pending = list(self._pending), {}
+            if not keys:
+                return 0
+            try:
+                created, unhidden = self._write(keys)
+            except Exception:
+                with self._lock:
+                    self.failures += 1
+                    # Giữ lại để ghi lần sau, buffer đầy thì bỏ bớt
+                    for key in keys[:max(0, self.max_pending - len(self._pending))]:
+                        self._pending.setdefault(key, None)
+                return 0
+            for key in keys:
+                self.recent.set(key, True)
+            with self._lock:
+                self.created += created
+                self.unhidden += unhidden
+                self.flushes += 1
+            return len(keys)
+
+    def close(self):
+        self._stopped = True
+        self._wakeup.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pending': len(self._pending),
+                'recorded': self.recorded,
+                'dropped': self.dropped,
+                'created': self.created,
+                'unhidden': self.unhidden,
+                'flushes': self.flushes,
+                'failures': self.failures,
+            }
+
+    def _write(self, keys):
+        client_ids = {client_id for client_id, _ in keys}
+        names = {name for _, name in keys}
+        wanted = set(keys)
+        existing = {}
+        for pk, client_id, name, hidden in KeyProduct.objects.filter(
+            client_id__in=client_ids, name__in=names
+        ).values_list('pk', 'client_id', 'name', 'hidden'):
+            if (client_id, name) in wanted:
+                existing.setdefault((client_id, name), []).append((pk, hidden))
+
+        hidden_pks = [pk for rows in existing.values() for pk, hidden in rows if hidden]
+        if hidden_pks:
+            KeyProduct.objects.filter(pk__in=hidden_pks).update(hidden=False)
+        new_objects = [
+            KeyProduct(client_id=client_id, name=name, limit=1)
+            for client_id, name in keys if (client_id, name) not in existing
+        ]
+        if new_objects:
+            KeyProduct.objects.bulk_create(new_objects, batch_size=self.batch_size, ignore_conflicts=True)
+        return len(new_objects), len(hidden_pks)
+
+    def _ensure_started(self):
+        # Thread không còn chạy (chưa start hoặc process vừa fork) thì start lại
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            return
+        with self._lock:
+            if self._stopped or (self._thread is not None and self._thread.is_alive()):
+                return
+            self._thread = threading.Thread(target=self._run, name='keyword-recorder', daemon=True)
+            self._thread.start()
+            if not self._atexit_registered:
+                atexit.register(self.close)
+                self._atexit_registered = True
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            finally:
+                connections.close_all()
+
+
+keyword_recorder = KeywordRecorder()
@@ -0,0 +1,20 @@
+from django.apps import AppConfig, apps
+
+
+class RakutenApiConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'rakutenApi'
+
+    def ready(self):
+        # Kết nối signal làm mới các bảng nạp sẵn trong bộ nhớ ở mọi process (web, admin, management command),
+        # kể cả process chưa từng đọc các bảng đó
+        from fee import connect_fee_rule_index_signals
+        connect_fee_rule_index_signals()
+
+        if apps.is_installed('external'):
+            from category_index import category_index
+            category_index.connect_signals()
+
+        if apps.is_installed('user_api'):
+            from ebay_token import ebay_token_manager
+            ebay_token_manager.connect_signals()
@@ -37,7 +37,8 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    'rest_framework'
+    'rest_framework',
+    'rakutenApi',
 ]
 
 MIDDLEWARE = [
@@ -122,3 +123,43 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Rakuten API
+# Connection pool dùng chung cho các request gọi sang Rakuten (apps/rakuten/client.py)
+
+RAKUTEN_CONNECT_TIMEOUT = 3.05
+
+RAKUTEN_READ_TIMEOUT = 10
+
+RAKUTEN_POOL_CONNECTIONS = 4
+
+RAKUTEN_POOL_MAXSIZE = 20
+
+RAKUTEN_ASYNC_MAX_CONNECTIONS = 200
+
+RAKUTEN_ASYNC_CONNECTIONS_PER_CLIENT = 4
+
+# Cache response của Rakuten (apps/rakuten/cache.py)
+
+RAKUTEN_CACHE_TIMEOUT = 300
+
+RAKUTEN_CACHE_MAX_ENTRIES = 1024
+
+RAKUTEN_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+# Lấy chi tiết nhiều sản phẩm cùng lúc (RakutenBatchDetailAPIView)
+
+RAKUTEN_BATCH_CONCURRENCY = 8
+
+RAKUTEN_BATCH_MAX_IDS = 50
+
+# Giới hạn request theo applicationId (apps/rakuten/ratelimit.py)
+# Rakuten cho phép khoảng 1 request/giây cho mỗi applicationId, mặc định tắt giới hạn (None).
+# Bật bằng RAKUTEN_RATE_LIMIT_PER_SECOND = 1 (tính theo từng applicationId, nên dùng kèm nhiều applicationId)
+# RAKUTEN_APPLICATION_IDS = ['id1', 'id2'] để xoay vòng nhiều applicationId
+
+RAKUTEN_RATE_LIMIT_PER_SECOND = None
+
+RAKUTEN_RATE_LIMIT_BURST = 1
+
+RAKUTEN_INITIAL_CONCURRENCY = 10
@@ -16,6 +16,19 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path
 
+from apps.rakuten.api.views import (
+    async_rakuten_detail_view,
+    async_rakuten_search_view,
+    rakuten_batch_detail_api_view,
+    rakuten_detail_api_view,
+    rakuten_search_api_view
+)
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/rakuten/search/', rakuten_search_api_view),
+    path('api/rakuten/product/<str:slug>', rakuten_detail_api_view),
+    path('api/rakuten/products/', rakuten_batch_detail_api_view),
+    path('api/rakuten/async/search/', async_rakuten_search_view),
+    path('api/rakuten/async/product/<str:slug>', async_rakuten_detail_view),
 ]
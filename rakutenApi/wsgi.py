@@ -9,8 +9,18 @@ https://docs.djangoproject.com/en/4.1/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'rakutenApi.settings')
 
 application = get_wsgi_application()
+
+# Nạp chỉ mục danh mục trước khi fork worker (gunicorn --preload) để các worker dùng chung bộ nhớ
+if getattr(settings, 'CATEGORY_INDEX_PRELOAD', False):
+    from django.db import connections
+
+    from category_index import category_index
+    category_index.preload()
+    # Không để các worker dùng chung connection DB mở trong process cha
+    connections.close_all()
@@ -0,0 +1,84 @@
+import json
+import os
+import pickle
+import time
+
+from django.test import TestCase
+
+from ebay_detail_fields import PRODUCT_DETAIL_COMPRESS_THRESHOLD, PRODUCT_DETAIL_FIELDS, product_detail_serializer
+from utils.cache_serializer import CODEC_NONE, CODEC_ZLIB, CacheSerializer, prune
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'fixtures')
+
+
+def best_time(fn, number=200, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / number
+
+
+class TestCacheSerializer(TestCase):
+    def setUp(self):
+        with open(os.path.join(FIXTURES_DIR, 'item_detail.json'), encoding='utf-8') as f:
+            self.detail = json.load(f)
+
+    def test_round_trip(self):
+        serializer = CacheSerializer()
+        value = {'a': [1, 2.5, None, True], 'b': {'c': 'Tiếng Việt'}, 'd': ''}
+        self.assertEqual(serializer.loads(serializer.dumps(value)), value)
+
+    def test_round_trip_compressed(self):
+        serializer = CacheSerializer(compress_threshold=0)
+        self.assertEqual(serializer.loads(serializer.dumps(self.detail)), self.detail)
+
+    def test_prune(self):
+        value = {'a': [{'x': 1, 'y': 2}, {'x': 3}], 'b': 1, 'c': {'z': 1}}
+        self.assertEqual(prune(value, {'a': {'x': None}, 'c': None}), {'a': [{'x': 1}, {'x': 3}], 'c': {'z': 1}})
+
+    def test_load_cached(self):
+        serializer = CacheSerializer()
+        # Dữ liệu phiên bản cũ (dict) trả về nguyên, dữ liệu hỏng / khác phiên bản coi như không có
+        self.assertEqual(serializer.load_cached({'a': 1}), {'a': 1})
+        self.assertIsNone(serializer.load_cached(b'CS'))
+        self.assertIsNone(serializer.load_cached(b'CS\x01\x00' + b'\xe3\x00'))
+        self.assertIsNone(serializer.load_cached(serializer.dumps({'a': 1})[:-2]))
+
+    def test_product_detail_pruned(self):
+        data = product_detail_serializer.loads(product_detail_serializer.dumps(self.detail))
+        self.assertEqual(data, {name: self.detail[name] for name in PRODUCT_DETAIL_FIELDS if name in self.detail})
+        self.assertNotIn('taxes', data)
+        self.assertIn('buyingOptions', data)
+
+    def test_product_detail_miss_same_as_hit(self):
+        # Lần đầu (lấy từ eBay, trả về ``prune``) và các lần sau (đọc từ cache) cùng một dữ liệu
+        detail = dict(self.detail, primaryItemGroup={'itemGroupId': '1', 'itemGroupType': 'SELLER_DEFINED_VARIATIONS'})
+        miss = product_detail_serializer.prune(detail)
+        hit = product_detail_serializer.load_cached(product_detail_serializer.dumps(miss))
+        self.assertEqual(miss, hit)
+        self.assertNotIn('taxes', miss)
+        self.assertNotIn('primaryItemGroup', miss)
+
+    def test_product_detail_size(self):
+        full = len(pickle.dumps(self.detail, pickle.HIGHEST_PROTOCOL))
+        self.assertLess(len(product_detail_serializer.dumps(self.detail)), full * 0.8)
+        self.assertLess(len(CacheSerializer(compress_threshold=0).dumps(self.detail)), full * 0.5)
+
+    def test_product_detail_compressed_when_large(self):
+        # Chi tiết thông thường không nén, description dài thì nén (byte thứ 4 của header là codec)
+        self.assertEqual(product_detail_serializer.dumps(self.detail)[3], CODEC_NONE)
+        large = dict(self.detail, description=self.detail['description'] * 4)
+        content = product_detail_serializer.dumps(large)
+        self.assertEqual(content[3], CODEC_ZLIB)
+        self.assertLess(len(content), PRODUCT_DETAIL_COMPRESS_THRESHOLD)
+        self.assertEqual(product_detail_serializer.loads(content), product_detail_serializer.prune(large))
+
+    def test_product_detail_latency(self):
+        # Không chậm hơn pickle cả dict (cách cũ), để dư nhiều vì máy chạy test có thể bận
+        full = best_time(lambda: pickle.loads(pickle.dumps(self.detail, pickle.HIGHEST_PROTOCOL)))
+        compact = best_time(lambda: product_detail_serializer.loads(product_detail_serializer.dumps(self.detail)))
+        self.assertLess(compact, full * 2)
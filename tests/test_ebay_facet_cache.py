@@ -0,0 +1,32 @@
+from django.test import TestCase
+
+from ebay_facet_cache import FacetCache, make_facet_cache_key
+
+
+class TestFacetCache(TestCase):
+    def setUp(self):
+        self.facet_cache = FacetCache(timeout=60, max_entries=4, cache_alias='default')
+        self.key = make_facet_cache_key('1234', 'price:[10..50]', 'categoryId:1234')
+
+    def tearDown(self):
+        self.facet_cache.shared.delete(self.key)
+
+    def test_key_depends_on_all_parts(self):
+        self.assertNotEqual(self.key, make_facet_cache_key('1234', 'price:[10..50]', ''))
+        self.assertEqual(self.key, make_facet_cache_key('1234', 'price:[10..50]', 'categoryId:1234'))
+
+    def test_get_returns_copy(self):
+        facets = {'categoryDistributions': [{'categoryId': '1234', 'matchCount': 10}]}
+        self.assertIsNone(self.facet_cache.get(self.key))
+        self.facet_cache.set(self.key, facets)
+        cached = self.facet_cache.get(self.key)
+        self.assertEqual(cached, facets)
+        cached['categoryDistributions'].clear()
+        self.assertEqual(self.facet_cache.get(self.key), facets)
+        stats = self.facet_cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (2, 1))
+
+    def test_shared_cache_fills_local(self):
+        facets = {'currentCategoryId': '1234'}
+        FacetCache(timeout=60, cache_alias='default').set(self.key, facets)
+        self.assertEqual(self.facet_cache.get(self.key), facets)
@@ -0,0 +1,79 @@
+import random
+
+from django.test import TestCase
+
+from ebay_filter import FilterCompiler, FilterSyntaxError, parse
+
+
+class TestFilterCompiler(TestCase):
+    keys = {'p': 'price', 'pC': 'priceCurrency', 'bO': 'buyingOptions', 'c': 'conditions', 's': 'sellers'}
+    values = {
+        'buyingOptions': {'f': 'FIXED_PRICE', 'a': 'AUCTION', 'b': 'BEST_OFFER'},
+        'conditions': {'n': 'NEW', 'u': 'USED'},
+    }
+
+    def setUp(self):
+        self.compiler = FilterCompiler(self.keys, self.values)
+
+    def test_compile(self):
+        self.assertEqual(
+            self.compiler.compile('p:[10..20],bO:{a|f},pC:USD'),
+            'buyingOptions:{AUCTION|FIXED_PRICE},price:[10..20],priceCurrency:USD'
+        )
+        self.assertEqual(
+            self.compiler.compile('c:n,s:{shop_a|shop_b},'),
+            'buyingOptions:{AUCTION|BEST_OFFER|FIXED_PRICE},conditions:NEW,sellers:{shop_a|shop_b}'
+        )
+        # Không có giá trị nào hợp lệ: bO lấy mặc định, điều kiện khác bị bỏ
+        self.assertEqual(self.compiler.compile('bO:{x},c:{x}'), self.compiler.compile(''))
+
+    def test_canonical_and_memoized(self):
+        compiled = self.compiler.compile('pC:USD,bO:{f|a},p:[..20]')
+        self.assertEqual(compiled, self.compiler.compile('p:[..20], bO:{a|f} ,pC:USD'))
+        self.assertIs(compiled, self.compiler.compile('pC:USD,bO:{f|a},p:[..20]'))
+
+    def test_syntax_error(self):
+        for text in ('p', 'p:[10..20', 'bO:{a|f', 'p:', ':USD', 'p:[1..2]x'):
+            with self.assertRaises(FilterSyntaxError):
+                self.compiler.compile(text)
+
+    def test_same_as_parse(self):
+        # Kết quả tách nhanh theo ',' (và kết quả từng điều kiện đã giữ lại) giống kết quả qua ``parse``
+        rng = random.Random(2)
+        conditions = ['p:[1..2]', ' pC : USD ', 'bO:{ a | f }', 'bO:{x}', 'c:{n||u}', 's:{b| a}', 'p:[1,2]', 'q:v']
+        for _ in range(1000):
+            text = ','.join(rng.choice(conditions) for _ in range(rng.randint(1, 4)))
+            self.assertEqual(self.compiler.compile(text), self.compiler.render(parse(text)))
+        self.assertEqual(self.compiler.compile('p:[1,2]'), 'buyingOptions:{AUCTION|BEST_OFFER|FIXED_PRICE},price:[1,2]')
+
+    def test_fuzz(self):
+        rng = random.Random(0)
+        alphabet = 'pCbOcsnuaf:,[]{}|.. 1Z-'
+        for _ in range(5000):
+            text = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 20)))
+            try:
+                compiled = self.compiler.compile(text)
+            except FilterSyntaxError:
+                continue
+            self.assertIn('buyingOptions:{', compiled)
+
+    def test_fuzz_round_trip(self):
+        # Chuỗi đã đổi (tên đầy đủ) đổi lại lần nữa vẫn cho cùng kết quả
+        rng = random.Random(1)
+        full = FilterCompiler(
+            {value: value for value in self.keys.values()},
+            {key: {value: value for value in values.values()} for key, values in self.values.items()}
+        )
+        for _ in range(1000):
+            conditions = []
+            for abbreviation in rng.sample(sorted(self.keys), rng.randint(0, len(self.keys))):
+                key = self.keys[abbreviation]
+                if key in self.values:
+                    items = rng.sample(sorted(self.values[key]), rng.randint(1, len(self.values[key])))
+                    conditions.append(f'{abbreviation}:{{{"|".join(items)}}}')
+                elif key == 'price':
+                    conditions.append(f'{abbreviation}:[{rng.randint(0, 9)}..{rng.randint(10, 99)}]')
+                else:
+                    conditions.append(f'{abbreviation}:{rng.choice(("USD", "EUR", "{x|y}"))}')
+            compiled = self.compiler.compile(','.join(conditions))
+            self.assertEqual(full.compile(compiled), compiled)
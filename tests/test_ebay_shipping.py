@@ -0,0 +1,68 @@
+from decimal import Decimal
+from pathlib import Path
+
+from django.test import TestCase
+
+from ebay_shipping import ShippingOption, parse_get_shipping_costs, select_cheapest_option
+
+FIXTURES_DIR = Path(__file__).resolve().parent.parent / 'benchmarks' / 'fixtures'
+
+
+def load_fixture(name):
+    return parse_get_shipping_costs((FIXTURES_DIR / f'get_shipping_costs_{name}.xml').read_bytes())
+
+
+class TestParseGetShippingCosts(TestCase):
+    def test_domestic(self):
+        response = load_fixture('domestic')['GetShippingCostsResponse']
+        self.assertEqual(response['Ack'], 'Success')
+        options = response['ShippingDetails']['ShippingServiceOption']
+        self.assertEqual(len(options), 4)
+        self.assertEqual(options[0]['ShippingServiceCost'], {'@currencyID': 'USD', '#text': '4.99'})
+        self.assertEqual(options[0]['EstimatedDeliveryMinTime'], '2022-09-24T07:00:00.000Z')
+        # Chỉ giữ các trường được dùng
+        self.assertNotIn('Timestamp', response)
+        self.assertNotIn('ShippingTimeMin', options[0])
+
+    def test_international(self):
+        response = load_fixture('international')['GetShippingCostsResponse']
+        options = response['ShippingDetails']['InternationalShippingServiceOption']
+        self.assertEqual([option['ShippingServiceCost']['@currencyID'] for option in options], ['EUR', 'EUR'])
+        self.assertEqual(
+            response['ShippingCostSummary']['ShippingServiceCost'], {'@currencyID': 'USD', '#text': '17.63'}
+        )
+
+    def test_failure(self):
+        response = load_fixture('invalid_token')['GetShippingCostsResponse']
+        self.assertEqual(response['Ack'], 'Failure')
+        self.assertNotIn('ShippingDetails', response)
+
+
+class TestSelectCheapestOption(TestCase):
+    def test_domestic_skips_local_pickup(self):
+        options = load_fixture('domestic')['GetShippingCostsResponse']['ShippingDetails']['ShippingServiceOption']
+        cheapest = select_cheapest_option(options)
+        self.assertEqual(cheapest.name, 'USPS First Class Package')
+        self.assertEqual((cheapest.currency, cheapest.cost), ('USD', Decimal('4.99')))
+        self.assertEqual(cheapest.to_ship_obj(), {
+            'shippingServiceCode': 'USPS First Class Package',
+            'shippingCost': {'currency': 'USD', 'value': '4.99'},
+            'minEstimatedDeliveryDate': '2022-09-24T07:00:00.000Z',
+            'maxEstimatedDeliveryDate': '2022-09-28T07:00:00.000Z',
+        })
+
+    def test_no_usd_option(self):
+        response = load_fixture('international')['GetShippingCostsResponse']
+        self.assertIsNone(select_cheapest_option(response['ShippingDetails']['InternationalShippingServiceOption']))
+        summary = ShippingOption.from_dict(response['ShippingCostSummary'])
+        self.assertEqual((summary.currency, summary.cost), ('USD', Decimal('17.63')))
+
+    def test_first_of_equal_prices_and_incomplete_options(self):
+        options = [
+            {'ShippingServiceName': 'No cost'},
+            {'ShippingServiceName': 'Freight', 'ShippingServiceCost': {'@currencyID': 'USD', '#text': '1.00'}},
+            {'ShippingServiceName': 'A', 'ShippingServiceCost': {'@currencyID': 'USD', '#text': '5.0'}},
+            {'ShippingServiceName': 'B', 'ShippingServiceCost': {'@currencyID': 'USD', '#text': '5.00'}},
+        ]
+        self.assertEqual(select_cheapest_option(options).name, 'A')
+        self.assertIsNone(select_cheapest_option([]))
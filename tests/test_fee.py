@@ -0,0 +1,144 @@
+import time
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
+
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models.signals import post_delete, post_save
+from django.test import TestCase, override_settings
+
+import fee
+
+
+def make_attribute_value(code, value, country_code, type, fee_value, minimum=None, partner='ebay'):
+    return SimpleNamespace(
+        code=code, value=value, country_code=country_code, partner=partner,
+        type=type, fee=Decimal(fee_value), minimum=minimum,
+    )
+
+
+class FeeRuleIndexTestCase(TestCase):
+    def setUp(self):
+        warehouses = [
+            SimpleNamespace(country_code='US', state='OR', tax=0),
+            SimpleNamespace(country_code='VN', state='', tax=10),
+        ]
+        attribute_values = [
+            make_attribute_value('category', '1', 'VN', 'PERCENT', '5', minimum=20),
+            make_attribute_value('category', '2', 'VN', 'PERCENT', '8'),
+            make_attribute_value('category', '', '', 'FIXED', '3'),
+            make_attribute_value('condition', '1000', '', 'FIXED', '1.5'),
+            make_attribute_value('price', '', 'VN', 'PERCENT', '2', minimum=10),
+        ]
+        self.old_index = fee._fee_rule_index, fee._fee_rule_index_checked_at
+        fee._fee_rule_index = fee.FeeRuleIndex(warehouses, attribute_values)
+        fee._fee_rule_index_checked_at = time.monotonic()
+
+    def tearDown(self):
+        fee._fee_rule_index, fee._fee_rule_index_checked_at = self.old_index
+
+
+class TestGetFee(FeeRuleIndexTestCase):
+    def test_percent_minimum(self):
+        # 5% của 110 < minimum 20 nên tính minimum, 5% của 1100 >= 20 nên tính phần trăm
+        self.assertEqual(fee.get_fee(100.0, 0, 'VN', 'ebay', params={'category': '1'}), (10, 20, 0))
+        self.assertEqual(fee.get_fee(1000.0, 0, 'VN', 'ebay', params={'category': '1'}), (10, 0, 5.0))
+
+    def test_default_rules_and_missing(self):
+        self.assertEqual(fee.get_fee(100.0, 0, 'VN', 'ebay', params={'category': '3', 'condition': '1000'}),
+                         (10, 4.5, 0))
+        self.assertEqual(fee.get_fee(100.0, 0, 'VN', 'ebay', params={'condition': '7000'}), (None, None))
+
+
+class TestFeeEngine(FeeRuleIndexTestCase):
+    def test_rules_keep_decimal(self):
+        fee_rule_index = fee.get_fee_rule_index()
+        self.assertEqual(fee_rule_index.rules[('condition', '1000', '', 'ebay')][1], Decimal('1.5'))
+        # get_fee vẫn tính bằng float như trước
+        self.assertEqual(fee_rule_index.get_rule('condition', '1000', 'VN', 'ebay'), ('FIXED', 1.5, None))
+
+    def test_pricing_function_exact(self):
+        import fee_engine
+
+        price_item = fee_engine.get_pricing_function('VN', 'ebay')
+        tax, fixed, percent = price_item(1000.0, 0, {'category': '1', 'condition': '1000', 'price': 1000.0})
+        self.assertEqual((tax, fixed, percent), (Decimal('10'), Decimal('1.5'), Decimal('7')))
+        expected = fee.get_fee(1000.0, 0, 'VN', 'ebay', params={'category': '1', 'condition': '1000', 'price': 1000.0})
+        self.assertEqual(expected, (10, 1.5, 7.0))
+        self.assertEqual(price_item(10.0, 0, {'condition': '7000'}), (None, None))
+
+    def test_pricing_function_no_default_tax(self):
+        import fee_engine
+
+        fee._fee_rule_index = fee.FeeRuleIndex(
+            [SimpleNamespace(country_code='VN', state='', tax=10)],
+            [make_attribute_value('condition', '1000', '', 'FIXED', '1.5')],
+        )
+        price_item = fee_engine.get_pricing_function('VN', 'ebay')
+        self.assertEqual(price_item(10.0, 0, {'condition': '1000'}), (Decimal('10'), Decimal('1.5'), Decimal('0')))
+        # Giống ``get_fee``: không có WareHouse của quốc gia và không có WareHouse default thì raise DoesNotExist
+        with self.assertRaises(ObjectDoesNotExist):
+            fee_engine.get_pricing_function('JP', 'ebay')
+
+
+class TestFeeRuleIndexInvalidation(FeeRuleIndexTestCase):
+    def setUp(self):
+        super().setUp()
+        self.old_version = fee._fee_rule_index_version
+        self.load_patcher = mock.patch.object(fee.FeeRuleIndex, 'load', side_effect=lambda: fee.FeeRuleIndex([], []))
+        self.load = self.load_patcher.start()
+
+    def tearDown(self):
+        self.load_patcher.stop()
+        cache.delete(fee.FEE_RULE_INDEX_VERSION_CACHE_NAME)
+        fee._fee_rule_index_version = self.old_version
+        super().tearDown()
+
+    def test_no_reload_before_check_interval(self):
+        fee_rule_index = fee.get_fee_rule_index()
+        cache.set(fee.FEE_RULE_INDEX_VERSION_CACHE_NAME, 'other-process', None)
+        self.assertIs(fee.get_fee_rule_index(), fee_rule_index)
+        self.load.assert_not_called()
+
+    def test_invalidate_reloads(self):
+        fee_rule_index = fee.get_fee_rule_index()
+        fee.invalidate_fee_rule_index()
+        self.assertIsNone(fee._fee_rule_index)
+        self.assertIsNot(fee.get_fee_rule_index(), fee_rule_index)
+        self.assertEqual(self.load.call_count, 1)
+        # Đã nạp theo version mới thì không nạp lại nữa
+        fee._fee_rule_index_checked_at = 0
+        fee.get_fee_rule_index()
+        self.assertEqual(self.load.call_count, 1)
+
+    def test_other_process_version_reloads_after_check_interval(self):
+        fee_rule_index = fee.get_fee_rule_index()
+        cache.set(fee.FEE_RULE_INDEX_VERSION_CACHE_NAME, 'other-process', None)
+        fee._fee_rule_index_checked_at = time.monotonic() - fee.FEE_RULE_INDEX_CHECK_INTERVAL
+        self.assertIsNot(fee.get_fee_rule_index(), fee_rule_index)
+        self.assertEqual(self.load.call_count, 1)
+        self.assertEqual(fee._fee_rule_index_version, 'other-process')
+
+    def test_cache_error_keeps_index(self):
+        fee_rule_index = fee.get_fee_rule_index()
+        fee._fee_rule_index_checked_at = 0
+        with mock.patch.object(fee.cache, 'get', side_effect=ConnectionError('cache down')):
+            self.assertIs(fee.get_fee_rule_index(), fee_rule_index)
+        self.load.assert_not_called()
+
+    @override_settings(FEE_RULE_MODELS=['auth.Group'])
+    def test_signal_only_for_fee_rule_models(self):
+        fee.connect_fee_rule_index_signals()
+        self.addCleanup(post_save.disconnect, sender=Group, dispatch_uid='fee_rule_index_save:auth.Group')
+        self.addCleanup(post_delete.disconnect, sender=Group, dispatch_uid='fee_rule_index_delete:auth.Group')
+        fee_rule_index = fee.get_fee_rule_index()
+
+        Permission.objects.first().save()
+        self.assertIs(fee._fee_rule_index, fee_rule_index)
+        self.assertIsNone(cache.get(fee.FEE_RULE_INDEX_VERSION_CACHE_NAME))
+
+        Group.objects.create(name='fee')
+        self.assertIsNone(fee._fee_rule_index)
+        self.assertIsNotNone(cache.get(fee.FEE_RULE_INDEX_VERSION_CACHE_NAME))
@@ -0,0 +1,86 @@
+import asyncio
+
+from django.test import TestCase
+
+from utils.singleflight import SingleFlight
+
+
+class TestSingleFlightAsync(TestCase):
+    def test_shares_one_call(self):
+        single_flight = SingleFlight()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return 'result'
+
+        async def main():
+            return await asyncio.gather(*[single_flight.do_async('key', fetch) for _ in range(5)])
+
+        self.assertEqual(asyncio.run(main()), ['result'] * 5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(single_flight.stats(), {'leaders': 1, 'shared': 4})
+
+    def test_cancelled_leader_does_not_cancel_waiters(self):
+        single_flight = SingleFlight()
+
+        async def main():
+            event = asyncio.Event()
+
+            async def fetch():
+                await event.wait()
+                return 'result'
+
+            leader = asyncio.ensure_future(single_flight.do_async('key', fetch))
+            await asyncio.sleep(0)
+            waiter = asyncio.ensure_future(single_flight.do_async('key', fetch))
+            await asyncio.sleep(0)
+            # Client của leader ngắt kết nối
+            leader.cancel()
+            await asyncio.sleep(0)
+            event.set()
+            with self.assertRaises(asyncio.CancelledError):
+                await leader
+            return await waiter
+
+        self.assertEqual(asyncio.run(main()), 'result')
+
+    def test_call_cancelled_when_every_caller_cancelled(self):
+        single_flight = SingleFlight()
+        cancelled = []
+
+        async def fetch():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(1)
+                raise
+
+        async def main():
+            callers = [asyncio.ensure_future(single_flight.do_async('key', fetch)) for _ in range(2)]
+            await asyncio.sleep(0)
+            for caller in callers:
+                caller.cancel()
+            await asyncio.gather(*callers, return_exceptions=True)
+            await asyncio.sleep(0)
+            # Lời gọi sau đó chạy lại hàm
+            return await single_flight.do_async('key', asyncio.sleep, 0, 'again')
+
+        self.assertEqual(asyncio.run(main()), 'again')
+        self.assertEqual(cancelled, [1])
+
+    def test_error_shared(self):
+        single_flight = SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0)
+            raise ValueError('upstream')
+
+        async def main():
+            return await asyncio.gather(
+                *[single_flight.do_async('key', fetch) for _ in range(3)], return_exceptions=True
+            )
+
+        results = asyncio.run(main())
+        self.assertEqual([type(result) for result in results], [ValueError] * 3)
@@ -0,0 +1,67 @@
+import threading
+
+from django.test import TestCase
+
+from utils.speculation import Speculation
+
+
+class TestSpeculation(TestCase):
+    def setUp(self):
+        self.speculation = Speculation(max_workers=1)
+
+    def tearDown(self):
+        self.speculation.executor.shutdown(wait=True)
+
+    def test_acceptable_primary_cancels_pending_fallback(self):
+        # Worker duy nhất đang bận nên fallback còn nằm trong hàng đợi và huỷ được
+        release = threading.Event()
+        blocker = self.speculation.executor.submit(release.wait)
+        fallback_calls = []
+        try:
+            result = self.speculation.run(lambda: 'primary', lambda: fallback_calls.append(1), lambda r: True)
+        finally:
+            release.set()
+        blocker.result()
+        self.assertEqual(result, 'primary')
+        self.assertEqual(fallback_calls, [])
+        stats = self.speculation.stats()
+        self.assertEqual((stats['wasted'], stats['cancelled'], stats['paid_off']), (1, 1, 0))
+
+    def test_unacceptable_primary_uses_fallback(self):
+        result = self.speculation.run(lambda: None, lambda: 'fallback', lambda r: r is not None)
+        self.assertEqual(result, 'fallback')
+        stats = self.speculation.stats()
+        self.assertEqual((stats['speculations'], stats['paid_off'], stats['wasted']), (1, 1, 0))
+
+    def test_fallback_error_returns_primary(self):
+        def fallback():
+            raise ValueError
+
+        result = self.speculation.run(lambda: [], fallback, lambda r: bool(r))
+        self.assertEqual(result, [])
+        self.assertEqual(self.speculation.stats()['fallback_errors'], 1)
+
+    def test_primary_error_cancels_fallback(self):
+        release = threading.Event()
+        blocker = self.speculation.executor.submit(release.wait)
+
+        def primary():
+            raise KeyError
+
+        try:
+            with self.assertRaises(KeyError):
+                self.speculation.run(primary, lambda: 'fallback', lambda r: True)
+        finally:
+            release.set()
+        blocker.result()
+        self.assertEqual(self.speculation.stats()['paid_off'], 0)
+
+    def test_on_done_called_in_worker(self):
+        done = []
+        speculation = Speculation(max_workers=1, on_done=lambda: done.append(threading.current_thread().name))
+        try:
+            speculation.run(lambda: None, lambda: 'fallback', lambda r: False)
+        finally:
+            speculation.executor.shutdown(wait=True)
+        self.assertEqual(len(done), 1)
+        self.assertTrue(done[0].startswith('speculation'))
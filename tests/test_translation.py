@@ -0,0 +1,103 @@
+import threading
+
+from django.test import TestCase
+
+from translation import StubTranslator, Translation
+from utils.lru import LRUCache
+
+
+class BlockingTranslator(StubTranslator):
+    """Translator chỉ trả kết quả khi ``release`` được set."""
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+
+    def translate(self, text, dest='en', src='auto'):
+        self.release.wait(5)
+        return super().translate(text, dest=dest, src=src)
+
+
+class TestTranslation(TestCase):
+    def make_translation(self, translator, **kwargs):
+        translation = Translation(translator=translator, cache_alias='default', **kwargs)
+        translation.local = LRUCache(max_entries=100)
+        translation.shared.clear()
+        return translation
+
+    def test_translate_many_dedup_and_cache(self):
+        translator = StubTranslator()
+        translation = self.make_translation(translator, batch_size=2)
+        result = translation.translate_many(['a', 'b', 'a', 'c'], dest='vi')
+        self.assertEqual(result, ['[vi] a', '[vi] b', '[vi] a', '[vi] c'])
+        self.assertEqual(sorted(translator.calls), ['a\nb', 'c'])
+        self.assertEqual(translation.translate_many(['c', 'b'], dest='vi'), ['[vi] c', '[vi] b'])
+        self.assertEqual(len(translator.calls), 2)
+
+    def test_untranslated_text_returned_unchanged(self):
+        translator = BlockingTranslator()
+        translation = self.make_translation(translator, max_workers=1, max_pending=1)
+        texts = ['  Apple   iPhone \n 13  ', 'Samsung\tGalaxy']
+        self.assertEqual(translation.translate_many(texts, dest='vi', timeout=0.05), texts)
+        translator.release.set()
+
+    def test_timed_out_batches_cancelled(self):
+        translator = BlockingTranslator()
+        translation = self.make_translation(translator, batch_size=1, max_workers=1, max_pending=3)
+        translation.translate_many(['a', 'b', 'c'], dest='vi', timeout=0.05)
+        # Batch đầu đang dịch, 2 batch sau chưa chạy nên bị huỷ
+        self.assertEqual(translation.stats()['cancelled'], 2)
+        translator.release.set()
+        translation.executor.shutdown(wait=True)
+        self.assertEqual(translator.calls, ['a'])
+
+    def test_pending_batches_bounded(self):
+        translator = BlockingTranslator()
+        translation = self.make_translation(translator, batch_size=1, max_workers=1, max_pending=2)
+        translation.translate_many(['a', 'b', 'c', 'd'], dest='vi', timeout=0.05)
+        self.assertEqual(translation.stats()['skipped'], 2)
+        translator.release.set()
+        # Chờ worker chạy hết các batch đang có
+        translation.executor.submit(lambda: None).result()
+        # Batch đã xong hoặc bị huỷ thì trả lại chỗ, lần sau gửi đi dịch được
+        self.assertEqual(translation.translate_many(['c', 'd'], dest='vi'), ['[vi] c', '[vi] d'])
+
+
+class FailingTranslator(StubTranslator):
+    def translate(self, text, dest='en', src='auto'):
+        super().translate(text, dest=dest, src=src)
+        raise ConnectionError('translator down')
+
+
+class TestDetectAndTranslate(TestCase):
+    def make_translation(self, translator, **kwargs):
+        translation = Translation(translator=translator, cache_alias='default', **kwargs)
+        translation.local = LRUCache(max_entries=100)
+        translation.shared.clear()
+        return translation
+
+    def test_cached(self):
+        translator = StubTranslator(src='vi')
+        translation = self.make_translation(translator)
+        self.assertEqual(translation.detect_and_translate('áo  khoác'), ('[en] áo khoác', 'vi'))
+        self.assertEqual(translation.detect_and_translate('áo khoác'), ('[en] áo khoác', 'vi'))
+        self.assertEqual(translator.calls, ['áo khoác'])
+
+    def test_translator_error_returns_keyword(self):
+        translator = FailingTranslator()
+        translation = self.make_translation(translator)
+        self.assertEqual(translation.detect_and_translate('áo khoác', src='vi'), ('áo khoác', 'vi'))
+        self.assertEqual(translation.stats()['failures'], 1)
+        # Lỗi thì không cache, lần sau dịch lại
+        translation.detect_and_translate('áo khoác', src='vi')
+        self.assertEqual(len(translator.calls), 2)
+
+    def test_timeout_returns_keyword(self):
+        translator = BlockingTranslator()
+        translation = self.make_translation(translator, max_workers=1)
+        self.assertEqual(translation.detect_and_translate('áo khoác', timeout=0.05), ('áo khoác', 'auto'))
+        translator.release.set()
+        translation.executor.submit(lambda: None).result()
+        # Dịch xong sau khi hết thời gian chờ thì kết quả vẫn được cache
+        self.assertEqual(translation.detect_and_translate('áo khoác'), ('[en] áo khoác', 'en'))
+        self.assertEqual(len(translator.calls), 1)
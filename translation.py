@@ -0,0 +1,276 @@
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from django.conf import settings
+from django.core.cache import caches
+
+from utils.lru import MISSING, LRUCache
+
+# Mỗi tiêu đề là một dòng khi gửi đi dịch, dịch xong tách lại theo dòng
+LINE_DELIMITER = '\n'
+
+
+def make_translation_cache_key(text, dest, src='auto'):
+    return 'translation:' + hashlib.sha1(f'{src}:{dest}:{text}'.encode('utf-8')).hexdigest()
+
+
+def normalize_text(text):
+    # Tiêu đề không được chứa ký tự xuống dòng vì xuống dòng là ký tự phân cách
+    return ' '.join(text.split())
+
+
+class StubTranslated:
+    """Kết quả dịch của ``StubTranslator``, giống kết quả của translator thật (có ``text``, ``src``, ``__dict__()``)."""
+    __slots__ = ('text', 'src', 'dest')
+
+    def __init__(self, text, src, dest):
+        self.text = text
+        self.src = src
+        self.dest = dest
+
+    def __dict__(self):
+        return {'text': self.text, 'src': self.src, 'dest': self.dest}
+
+
+class StubTranslator:
+    """
+    Translator giả dùng cho test và benchmark, cùng interface với ``translators.views.translator``.
+    - Kết quả là text thêm tiền tố ``[dest]`` ở mỗi dòng
+    - latency: số giây chờ mỗi lần gọi (giả lập gọi API), calls: danh sách text đã gửi đi dịch
+    """
+
+    def __init__(self, latency=0, src='en'):
+        self.latency = latency
+        self.src = src
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def translate(self, text, dest='en', src='auto'):
+        with self._lock:
+            self.calls.append(text)
+        if self.latency:
+            time.sleep(self.latency)
+        translated = LINE_DELIMITER.join(f'[{dest}] {line}' for line in text.split(LINE_DELIMITER))
+        return StubTranslated(translated, self.src if src == 'auto' else src, dest)
+
+
+class Translation:
+    """
+    Dịch text có cache, dùng cho tiêu đề sản phẩm và từ khoá search.
+    - Cache 2 tầng theo (text, ngôn ngữ đích, ngôn ngữ nguồn): LRU + TTL trong process và cache của django
+    - Text giống nhau (trong cùng trang hoặc giữa các trang) chỉ dịch một lần
+    - Text chưa có trong cache được gộp thành từng batch (mỗi text một dòng), các batch được gửi đi dịch song song
+    - Số dòng dịch về khác số dòng gửi đi thì chia đôi batch và dịch lại, tới khi còn 1 dòng
+    - timeout: thời gian chờ tối đa, text chưa dịch xong thì trả về nguyên text gốc. Batch chưa bắt đầu dịch thì bị huỷ,
+      batch đang dịch thì kết quả dịch xong sau đó vẫn được cache
+    - max_pending: số batch tối đa đang chờ / đang dịch trong cả process, đủ thì không gửi thêm (text giữ nguyên)
+      để translator chậm không làm hàng đợi dài mãi
+    """
+
+    def __init__(self, translator=None, batch_size=None, max_workers=None, timeout=None,
+                 cache_timeout=None, max_entries=None, cache_alias=None, max_pending=None):
+        self._translator = translator
+        self.batch_size = batch_size or getattr(settings, 'TRANSLATION_BATCH_SIZE', 50)
+        self.max_workers = max_workers or getattr(settings, 'TRANSLATION_MAX_WORKERS', 4)
+        self.max_pending = max_pending or getattr(settings, 'TRANSLATION_MAX_PENDING_BATCHES', self.max_workers * 2)
+        self.timeout = timeout or getattr(settings, 'TRANSLATION_TIMEOUT', 3)
+        self.cache_timeout = cache_timeout or getattr(settings, 'TRANSLATION_CACHE_TIMEOUT', 7 * 24 * 60 * 60)
+        self.local = LRUCache(
+            max_entries=max_entries or getattr(settings, 'TRANSLATION_CACHE_MAX_ENTRIES', 20000),
+            default_ttl=self.cache_timeout,
+        )
+        self.cache_alias = cache_alias or getattr(settings, 'TRANSLATION_CACHE_ALIAS', 'default')
+        self._executor = None
+        self._pending = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.failures = 0
+        self.skipped = 0
+        self.cancelled = 0
+
+    @property
+    def translator(self):
+        if self._translator is None:
+            from translators.views import translator
+            self._translator = translator
+        return self._translator
+
+    @property
+    def shared(self):
+        return caches[self.cache_alias]
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers, thread_name_prefix='translation'
+                    )
+        return self._executor
+
+    def translate(self, text, dest='vi', src='auto'):
+        return self.translate_many([text], dest=dest, src=src)[0]
+
+    def translate_many(self, texts, dest='vi', src='auto', timeout=MISSING):
+        """Dịch list text, kết quả theo đúng thứ tự của texts. Text không dịch được thì trả về nguyên text gốc."""
+        if timeout is MISSING:
+            timeout = self.timeout
+        normalized = [normalize_text(text) for text in texts]
+        translated = self._get_cached(set(normalized), dest, src)
+
+        missing = [text for text in dict.fromkeys(normalized) if text and text not in translated]
+        if missing:
+            futures = []
+            for i in range(0, len(missing), self.batch_size):
+                if not self._pending.acquire(blocking=False):
+                    with self._lock:
+                        self.skipped += len(missing) - i
+                    break
+                future = self.executor.submit(self._translate_batch, missing[i:i + self.batch_size], dest, src)
+                future.add_done_callback(self._release_pending)
+                futures.append(future)
+            done, not_done = wait(futures, timeout=timeout)
+            for future in not_done:
+                if future.cancel():
+                    with self._lock:
+                        self.cancelled += 1
+            for future in done:
+                if future.exception() is None:
+                    translated.update(future.result())
+        return [translated.get(key, text) for key, text in zip(normalized, texts)]
+
+    def detect_and_translate(self, text, dest='en', src='auto', timeout=MISSING):
+        """
+        Dịch một text, trả về (text đã dịch, ngôn ngữ nguồn). Dùng cho từ khoá search.
+        Giống ``translate_many``: translator lỗi, quá ``timeout`` hoặc đủ ``max_pending`` thì trả về (text gốc, src)
+        và không cache, để search vẫn chạy bằng từ khoá gốc.
+        """
+        if timeout is MISSING:
+            timeout = self.timeout
+        normalized = normalize_text(text)
+        key = make_translation_cache_key(normalized, dest, src) + ':src'
+        result = self.local.get(key)
+        if result is not MISSING:
+            return result
+        try:
+            result = self.shared.get(key)
+        except Exception:
+            result = None
+        if result is not None:
+            result = tuple(result)
+            self.local.set(key, result)
+            return result
+
+        if not self._pending.acquire(blocking=False):
+            with self._lock:
+                self.skipped += 1
+            return text, src
+        future = self.executor.submit(self._detect, normalized, dest, src, key)
+        future.add_done_callback(self._release_pending)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            # Đang dịch thì kết quả dịch xong sau đó vẫn được cache
+            if future.cancel():
+                with self._lock:
+                    self.cancelled += 1
+        except Exception:
+            with self._lock:
+                self.failures += 1
+        return text, src
+
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'failures': self.failures,
+            'skipped': self.skipped,
+            'cancelled': self.cancelled,
+            'local': self.local.stats(),
+        }
+
+    def _get_cached(self, texts, dest, src):
+        translated = {}
+        missing = []
+        for text in texts:
+            value = self.local.get((text, dest, src))
+            if value is MISSING:
+                missing.append(text)
+            else:
+                translated[text] = value
+        if missing:
+            keys = {make_translation_cache_key(text, dest, src): text for text in missing}
+            try:
+                found = self.shared.get_many(list(keys))
+            except Exception:
+                found = {}
+            for key, value in found.items():
+                translated[keys[key]] = value
+                self.local.set((keys[key], dest, src), value)
+        return translated
+
+    def _set_cached(self, translated, dest, src):
+        for text, value in translated.items():
+            self.local.set((text, dest, src), value)
+        try:
+            self.shared.set_many({
+                make_translation_cache_key(text, dest, src): value for text, value in translated.items()
+            }, self.cache_timeout)
+        except Exception:
+            pass
+
+    def _translate_batch(self, texts, dest, src):
+        translated = {}
+        try:
+            lines = self._request(LINE_DELIMITER.join(texts), dest, src).text.split(LINE_DELIMITER)
+        except Exception:
+            with self._lock:
+                self.failures += 1
+            return translated
+        if len(lines) == len(texts):
+            # Dòng dịch về rỗng thì coi như chưa dịch được, không cache
+            translated = {text: line.strip() for text, line in zip(texts, lines) if line.strip()}
+            self._set_cached(translated, dest, src)
+        elif len(texts) > 1:
+            # Translator gộp hoặc tách dòng, chia đôi batch để tìm dòng bị lỗi
+            middle = len(texts) // 2
+            translated.update(self._translate_batch(texts[:middle], dest, src))
+            translated.update(self._translate_batch(texts[middle:], dest, src))
+        else:
+            line = ' '.join(line.strip() for line in lines if line.strip())
+            if line:
+                translated = {texts[0]: line}
+                self._set_cached(translated, dest, src)
+        return translated
+
+    def _detect(self, text, dest, src, key):
+        response = self._request(text, dest, src)
+        result = (response.text, response.src)
+        self.local.set(key, result)
+        try:
+            self.shared.set(key, result, self.cache_timeout)
+        except Exception:
+            pass
+        return result
+
+    def _release_pending(self, future):
+        self._pending.release()
+
+    def _request(self, text, dest, src):
+        with self._lock:
+            self.requests += 1
+        return self.translator.translate(text, dest=dest, src=src)
+
+
+translation = Translation()
+
+
+def translate_search_keyword(keyword, src='auto'):
+    """
+    Dịch từ khoá search sang tiếng Anh, trả về (từ khoá đã dịch, ngôn ngữ của từ khoá). Kết quả được cache.
+    Translator lỗi hoặc quá TRANSLATION_TIMEOUT thì trả về (từ khoá gốc, src).
+    """
+    return translation.detect_and_translate(keyword, dest='en', src=src)
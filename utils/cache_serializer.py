@@ -0,0 +1,82 @@
+import pickle
+import struct
+import zlib
+
+# Header: magic, phiên bản định dạng, codec nén
+_HEADER = struct.Struct('>2sBB')
+MAGIC = b'CS'
+# 1: marshal (phụ thuộc phiên bản python), 2: pickle protocol PICKLE_PROTOCOL
+FORMAT_VERSION = 2
+# Cố định protocol thay vì HIGHEST_PROTOCOL: python mới hơn đổi protocol mặc định thì dữ liệu cũ vẫn đọc / ghi như nhau
+PICKLE_PROTOCOL = 5
+CODEC_NONE = 0
+CODEC_ZLIB = 1
+
+
+def prune(value, fields):
+    """
+    Chỉ giữ các trường có trong ``fields`` (dict tên trường -> fields con, None là giữ nguyên cả trường).
+    List thì áp dụng ``fields`` cho từng phần tử.
+    """
+    if fields is None:
+        return value
+    if isinstance(value, list):
+        return [prune(item, fields) for item in value]
+    if not isinstance(value, dict):
+        return value
+    return {name: prune(value[name], child_fields) for name, child_fields in fields.items() if name in value}
+
+
+class CacheSerializer:
+    """
+    Đổi dữ liệu (dict / list / str / số) sang bytes gọn để lưu vào cache thay cho pickle của cả dict.
+    - fields: chỉ lưu các trường này (xem ``prune``), None là lưu tất cả
+    - Mã hoá bằng pickle với protocol cố định (``PICKLE_PROTOCOL``), không phụ thuộc phiên bản python như marshal
+    - compress_threshold: dữ liệu lớn hơn số byte này được nén bằng zlib (level thấp), None là không nén.
+      Nén giảm 3-4 lần số byte nhưng tốn CPU hơn cả pickle, nên chỉ bật khi bộ nhớ cache quan trọng hơn CPU
+    - Header có phiên bản định dạng, dữ liệu khác phiên bản thì ``loads`` raise ValueError
+      (người đọc coi như không có trong cache), nên có thể đổi định dạng mà không cần xoá cache
+    """
+
+    def __init__(self, fields=None, compress_threshold=None, level=1):
+        self.fields = fields
+        self.compress_threshold = compress_threshold
+        self.level = level
+
+    def prune(self, value):
+        """Dữ liệu đúng như khi đọc lại từ cache (chỉ các trường trong ``fields``)."""
+        return prune(value, self.fields)
+
+    def dumps(self, value):
+        payload = pickle.dumps(self.prune(value), PICKLE_PROTOCOL)
+        codec = CODEC_NONE
+        if self.compress_threshold is not None and len(payload) > self.compress_threshold:
+            payload = zlib.compress(payload, self.level)
+            codec = CODEC_ZLIB
+        return _HEADER.pack(MAGIC, FORMAT_VERSION, codec) + payload
+
+    def loads(self, data):
+        try:
+            magic, version, codec = _HEADER.unpack_from(data)
+        except struct.error:
+            raise ValueError('Invalid cache payload')
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f'Unsupported cache payload version {version}')
+        payload = memoryview(data)[_HEADER.size:]
+        if codec == CODEC_ZLIB:
+            payload = zlib.decompress(payload)
+        elif codec != CODEC_NONE:
+            raise ValueError(f'Unsupported cache payload codec {codec}')
+        return pickle.loads(payload)
+
+    def load_cached(self, value):
+        """
+        Đọc giá trị lấy từ cache: bytes thì giải mã, giá trị do phiên bản cũ lưu (dict, ...) thì trả về nguyên,
+        không giải mã được thì trả về None (coi như không có trong cache).
+        """
+        if not isinstance(value, bytes):
+            return value
+        try:
+            return self.loads(value)
+        except (ValueError, EOFError, TypeError, pickle.UnpicklingError, zlib.error):
+            return None
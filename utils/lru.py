@@ -0,0 +1,95 @@
+import threading
+import time
+from collections import OrderedDict
+
+MISSING = object()
+
+
+class LRUCache:
+    """
+    Cache trong process (thread-safe) có:
+    - TTL cho từng phần tử
+    - Giới hạn số phần tử (max_entries) và tổng dung lượng (max_bytes)
+    - Khi vượt giới hạn thì bỏ phần tử ít được dùng nhất (LRU)
+
+    ``get`` trả về ``MISSING`` khi không có hoặc đã hết hạn (vì value có thể là None).
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=None, default_ttl=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=MISSING):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, size, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._pop(key)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, size=0, ttl=MISSING):
+        """
+        size: dung lượng (byte) của value, dùng để giới hạn theo max_bytes.
+        ttl: số giây tồn tại, None là không hết hạn, mặc định lấy default_ttl.
+        """
+        if ttl is MISSING:
+            ttl = self.default_ttl
+        if self.max_bytes is not None and size > self.max_bytes:
+            # Phần tử quá lớn thì không cache, tránh đẩy hết các phần tử khác ra
+            return False
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+            self._data[key] = (value, size, expires_at)
+            self.current_bytes += size
+            self._evict()
+        return True
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._data),
+                'bytes': self.current_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def _pop(self, key):
+        _, size, _ = self._data.pop(key)
+        self.current_bytes -= size
+
+    def _evict(self):
+        while len(self._data) > self.max_entries or \
+                (self.max_bytes is not None and self.current_bytes > self.max_bytes):
+            _, (_, size, _) = self._data.popitem(last=False)
+            self.current_bytes -= size
+            self.evictions += 1
@@ -0,0 +1,123 @@
+import asyncio
+import threading
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class _AsyncCall:
+    __slots__ = ('task', 'callers', 'waiting')
+
+    def __init__(self):
+        self.task = None
+        self.callers = 0
+        self.waiting = 0
+
+
+class SingleFlight:
+    """
+    Gộp các lời gọi giống nhau đang chạy cùng lúc thành một (single-flight).
+    - Lời gọi đầu tiên với một key (leader) sẽ thực thi hàm
+    - Các lời gọi cùng key tới trong lúc leader đang chạy sẽ chờ và dùng chung kết quả (hoặc lỗi) của leader
+    - ``do`` dùng cho thread, ``do_async`` dùng cho các task asyncio trong cùng event loop
+
+    copy_result: hàm copy kết quả trước khi trả cho các lời gọi chờ (VD: ``copy.deepcopy``),
+    dùng khi người gọi có thể sửa kết quả trả về.
+    """
+
+    def __init__(self, copy_result=None):
+        self.copy_result = copy_result
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._async_calls = {}
+        self.leaders = 0
+        self.shared = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+                is_leader = True
+            else:
+                call.waiters += 1
+                self.shared += 1
+                is_leader = False
+
+        if not is_leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return self._copy(call.result)
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        # Nếu có lời gọi khác đang dùng chung kết quả thì leader cũng nhận bản copy,
+        # để việc leader sửa kết quả không ảnh hưởng tới các lời gọi kia
+        if call.waiters:
+            return self._copy(call.result)
+        return call.result
+
+    async def do_async(self, key, fn, *args, **kwargs):
+        """
+        fn là một coroutine function.
+        Hàm chạy trong một task riêng, mọi lời gọi (kể cả leader) chờ task đó qua ``asyncio.shield``:
+        một lời gọi bị huỷ (VD: client ngắt kết nối) không huỷ kết quả của các lời gọi khác.
+        Task chỉ bị huỷ khi mọi lời gọi đang chờ đều đã bị huỷ.
+        """
+        loop = asyncio.get_running_loop()
+        call_key = (loop, key)
+        call = self._async_calls.get(call_key)
+        if call is None:
+            call = self._async_calls[call_key] = _AsyncCall()
+            call.task = asyncio.ensure_future(self._run_async(call_key, call, fn, *args, **kwargs))
+            self.leaders += 1
+        else:
+            self.shared += 1
+        call.callers += 1
+        call.waiting += 1
+        try:
+            result = await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            call.waiting -= 1
+            if not call.waiting and not call.task.done():
+                call.task.cancel()
+            raise
+        except BaseException:
+            call.waiting -= 1
+            raise
+        call.waiting -= 1
+        # Có nhiều lời gọi dùng chung kết quả thì mỗi lời gọi nhận một bản copy
+        if call.callers > 1:
+            return self._copy(result)
+        return result
+
+    async def _run_async(self, call_key, call, fn, *args, **kwargs):
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            if self._async_calls.get(call_key) is call:
+                del self._async_calls[call_key]
+
+    def stats(self):
+        return {'leaders': self.leaders, 'shared': self.shared}
+
+    def _copy(self, result):
+        if self.copy_result is not None:
+            return self.copy_result(result)
+        return result
@@ -0,0 +1,90 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Speculation:
+    """
+    Chạy song song lời gọi chính (primary) và lời gọi dự phòng (fallback) thay vì chỉ gọi fallback
+    sau khi primary trả về kết quả không dùng được.
+    - Luôn ưu tiên kết quả của primary: primary dùng được (``is_acceptable``) thì trả về luôn,
+      fallback chưa chạy thì bị huỷ, đang chạy thì bỏ qua kết quả
+    - Primary không dùng được thì chờ fallback (fallback lỗi thì trả về kết quả của primary)
+    - Thống kê số lần fallback có ích (paid_off) / bị bỏ (wasted) và thời gian chờ tiết kiệm được để chỉnh chính sách
+
+    on_done: hàm gọi trong worker sau mỗi lời gọi (VD: đóng kết nối DB của thread)
+    """
+
+    def __init__(self, max_workers=8, thread_name_prefix='speculation', on_done=None):
+        self.max_workers = max_workers
+        self.thread_name_prefix = thread_name_prefix
+        self.on_done = on_done
+        self._executor = None
+        self._lock = threading.Lock()
+        self.speculations = 0
+        self.paid_off = 0
+        self.wasted = 0
+        self.cancelled = 0
+        self.fallback_errors = 0
+        self.saved_seconds = 0.0
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers, thread_name_prefix=self.thread_name_prefix
+                    )
+        return self._executor
+
+    def run(self, primary, fallback, is_acceptable):
+        """primary, fallback: hàm không tham số. Trả về kết quả của primary hoặc của fallback."""
+        with self._lock:
+            self.speculations += 1
+        fallback_future = self.executor.submit(self._timed, fallback)
+        start = time.perf_counter()
+        try:
+            result = primary()
+        except BaseException:
+            fallback_future.cancel()
+            raise
+        primary_elapsed = time.perf_counter() - start
+
+        if is_acceptable(result):
+            cancelled = fallback_future.cancel()
+            with self._lock:
+                self.wasted += 1
+                self.cancelled += cancelled
+            return result
+
+        try:
+            fallback_result, fallback_elapsed = fallback_future.result()
+        except Exception:
+            with self._lock:
+                self.fallback_errors += 1
+            return result
+        with self._lock:
+            self.paid_off += 1
+            # Gọi tuần tự thì phải chờ thêm cả fallback, song song thì fallback đã chạy trong lúc chờ primary
+            self.saved_seconds += min(primary_elapsed, fallback_elapsed)
+        return fallback_result
+
+    def stats(self):
+        with self._lock:
+            return {
+                'speculations': self.speculations,
+                'paid_off': self.paid_off,
+                'wasted': self.wasted,
+                'cancelled': self.cancelled,
+                'fallback_errors': self.fallback_errors,
+                'saved_seconds': round(self.saved_seconds, 3),
+            }
+
+    def _timed(self, fn):
+        start = time.perf_counter()
+        try:
+            return fn(), time.perf_counter() - start
+        finally:
+            if self.on_done is not None:
+                self.on_done()